@@ -0,0 +1,621 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+
+import phonetic_cache
+
+from context_backend import NgramCountStore
+from fetch_engine import FAILED, FetchEngine, parse_rate_limits
+from frequency_index import FrequencyIndex
+from preprocessing import TokenTable
+from language_creativity import DEFAULT_SCORE_WEIGHT_MAP, Scores, collect_statistics, degraded_scores, group_sentences, parse_creativity_scores, resolve_missing_lookups, score_sentences
+from score_writer import ScoreWriter
+from word_cache import FrequencyClassCache
+
+# The append-only manifest of a checkpoint directory, its first line holds the settings of the run and the shard
+# of the directory and every further line a completed chunk with its (subject, variable) keys and its number of
+# sentences with degraded scores, a later line of the same chunk replaces the earlier one
+MANIFEST_FILE = "manifest.jsonl"
+
+
+def chunk_file(checkpoint_dir: str, chunk: int, suffix: str):
+    return os.path.join(checkpoint_dir, "chunk-%06d%s" % (chunk, suffix))
+
+
+# Fingerprint of the input file, a checkpoint directory is only resumed for the same input
+def file_digest(path: str):
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+# Write a file durably: to a temporary file first, which replaces the file once it is on disk
+def write_durably(path: str, content: str):
+    temporary_file = path + ".tmp"
+
+    with open(temporary_file, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temporary_file, path)
+
+
+def append_manifest(checkpoint_dir: str, entry: dict):
+    with open(os.path.join(checkpoint_dir, MANIFEST_FILE), "a") as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# Read the first line (settings and shard) and the completed chunks (by chunk number) of a checkpoint directory
+# A torn last line (the run was interrupted while appending it) is ignored, its chunk is repeated, and is cut off
+# with `repair`, so that further lines can be appended
+def read_manifest(checkpoint_dir: str, repair: bool = False):
+    path = os.path.join(checkpoint_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None, {}
+
+    run = None
+    chunks = {}
+    length = 0
+
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("torn line")
+
+                entry = json.loads(line)
+            except ValueError:
+                break
+
+            length += len(line)
+
+            if run is None:
+                run = entry
+            else:
+                chunks[entry["chunk"]] = entry
+
+    if repair and length < os.path.getsize(path):
+        os.truncate(path, length)
+
+    return run, chunks
+
+
+# The successfully resolved lookups of a chunk, failed lookups are not kept so that a resumed run retries them
+def successful_lookups(frequency_classes: dict, context_classes: dict):
+    return {
+        "word": {
+            word: frequency_class
+            for word, frequency_class in frequency_classes.items()
+            if frequency_class is not FAILED
+        },
+        "context": {
+            query: context_class
+            for query, context_class in context_classes.items()
+            if context_class is not None
+        }
+    }
+
+
+# Score the chunks of a shard that are not yet completed in the checkpoint directory, chunks with degraded scores
+# (based on failed lookups) are scored again with their failed lookups retried
+# The input is split into chunks of chunk_size sentences and chunk i belongs to shard i % shards, every chunk
+# is scored against the vocabularies of the whole cohort, so that the merged chunks equal a single run
+def run_chunks(input_file: str,
+               checkpoint_dir: str,
+               score_weight_map: dict,
+               language: str,
+               fetch_engine: FetchEngine,
+               chunk_size: int = 1000,
+               shard: int = 0,
+               shards: int = 1,
+               degraded_column: bool = False,
+               word_cache: FrequencyClassCache = None,
+               frequency_index: FrequencyIndex = None,
+               context_backend=None,
+               workers: int = 1):
+    # The sentences are in the order of a single run's output, each split into words once
+    table = TokenTable(input_file)
+    sentences = [(subject, variable, sentence)
+                 for subject, pairs in group_sentences(
+                     table.valid_sentences()).items()
+                 for variable, sentence in pairs.items()]
+    token_table = table.tokens
+    del table
+    chunks = [
+        sentences[start:start + chunk_size]
+        for start in range(0, len(sentences), chunk_size)
+    ]
+
+    output_scores = [
+        score for score in Scores
+        if score in score_weight_map or score == Scores.TOTAL_SCORE
+    ]
+
+    settings = {
+        "input_digest": file_digest(input_file),
+        "language": language,
+        "scores": {
+            score.name: list(weight_and_bonus)
+            for score, weight_and_bonus in score_weight_map.items()
+        },
+        "chunk_size": chunk_size,
+        "chunks": len(chunks),
+        "shards": shards,
+        "header": ["subject", "variable", "sentence"] +
+        [score.name for score in output_scores] +
+        (["DEGRADED_SCORES"] if degraded_column else [])
+    }
+
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    run = {"settings": settings, "shard": shard}
+
+    previous_run, completed_chunks = read_manifest(checkpoint_dir,
+                                                   repair=True)
+    if previous_run is None:
+        append_manifest(checkpoint_dir, run)
+    elif previous_run != run:
+        raise ValueError(
+            "%s holds the checkpoints of a run with other settings, input or shard"
+            % checkpoint_dir)
+
+    # The lookups of the completed chunks are not resolved again
+    frequency_classes = {}
+    context_classes = {}
+    for chunk in completed_chunks:
+        with open(chunk_file(checkpoint_dir, chunk, ".lookups.json")) as f:
+            lookups = json.load(f)
+
+        frequency_classes.update(lookups["word"])
+        context_classes.update(lookups["context"])
+
+    # The similarity scores are relative to the vocabularies of the whole cohort
+    vocabulary, _, _ = collect_statistics(sentences, {},
+                                          token_table=token_table)
+
+    for chunk, chunk_sentences in enumerate(chunks):
+        if chunk % shards != shard or (chunk in completed_chunks and
+                                       not completed_chunks[chunk].get("degraded")):
+            continue
+
+        _, word_planner, context_planner = collect_statistics(
+            chunk_sentences,
+            score_weight_map,
+            build_vocabulary=False,
+            token_table=token_table)
+
+        new_frequency_classes, new_context_classes = resolve_missing_lookups(
+            word_planner, context_planner, frequency_classes, context_classes,
+            language, fetch_engine, word_cache, frequency_index,
+            context_backend)
+
+        # Write the scores and the lookups of the chunk before it is recorded as completed
+        score_writer = ScoreWriter(chunk_file(checkpoint_dir, chunk, ".csv"),
+                                   settings["header"],
+                                   mode="replace")
+
+        degraded_sentences = 0
+        for (subject, variable,
+             sentence), sentence_scores in zip(
+                 chunk_sentences,
+                 score_sentences(chunk_sentences,
+                                 score_weight_map,
+                                 language,
+                                 frequency_classes,
+                                 context_classes,
+                                 vocabulary,
+                                 workers=workers,
+                                 token_table=token_table)):
+            row = [subject, variable, sentence
+                   ] + [sentence_scores[score] for score in output_scores]
+
+            sentence_degraded_scores = degraded_scores(
+                token_table[sentence], score_weight_map, frequency_classes,
+                context_classes)
+            if sentence_degraded_scores:
+                degraded_sentences += 1
+
+            if degraded_column:
+                row.append(";".join(
+                    score.name for score in sentence_degraded_scores))
+
+            score_writer.write(row)
+
+        score_writer.close()
+
+        lookups = successful_lookups(new_frequency_classes,
+                                     new_context_classes)
+
+        # A chunk that is scored again keeps the lookups it resolved before
+        if chunk in completed_chunks:
+            with open(chunk_file(checkpoint_dir, chunk, ".lookups.json")) as f:
+                previous_lookups = json.load(f)
+
+            for kind in lookups:
+                lookups[kind] = {**previous_lookups[kind], **lookups[kind]}
+
+        write_durably(chunk_file(checkpoint_dir, chunk, ".lookups.json"),
+                      json.dumps(lookups))
+
+        entry = {
+            "chunk":
+            chunk,
+            "keys": [[subject, variable]
+                     for subject, variable, _ in chunk_sentences],
+            "degraded":
+            degraded_sentences
+        }
+        append_manifest(checkpoint_dir, entry)
+        completed_chunks[chunk] = entry
+
+        print("chunk %d/%d: %d sentences, %d lookups resolved, %d sentences with degraded scores" %
+              (chunk + 1, len(chunks), len(chunk_sentences),
+               len(new_frequency_classes) + len(new_context_classes),
+               degraded_sentences),
+              file=sys.stderr)
+
+    degraded_chunks = [
+        chunk for chunk, entry in completed_chunks.items()
+        if entry.get("degraded")
+    ]
+    if degraded_chunks:
+        print("%d chunks have degraded scores based on failed lookups, run again to retry them" %
+              len(degraded_chunks),
+              file=sys.stderr)
+
+    return settings
+
+
+# Concatenate the completed chunks of one or more checkpoint directories (e.g., one per shard) in order
+# Returns the numbers of the missing chunks, the output file is only written if no chunk is missing
+def merge_chunks(checkpoint_dirs: list, output_file: str):
+    settings = None
+    chunk_dirs = {}
+    degraded_chunks = set()
+
+    for checkpoint_dir in checkpoint_dirs:
+        run, completed_chunks = read_manifest(checkpoint_dir)
+
+        if run is None:
+            raise ValueError("%s holds no checkpoints" % checkpoint_dir)
+
+        if settings is None:
+            settings = run["settings"]
+        elif run["settings"] != settings:
+            raise ValueError(
+                "%s holds the checkpoints of a run with other settings or input"
+                % checkpoint_dir)
+
+        for chunk, entry in completed_chunks.items():
+            chunk_dirs.setdefault(chunk, checkpoint_dir)
+
+            if entry.get("degraded"):
+                degraded_chunks.add(chunk)
+
+    missing_chunks = [
+        chunk for chunk in range(settings["chunks"]) if chunk not in chunk_dirs
+    ]
+    if missing_chunks:
+        return missing_chunks
+
+    if degraded_chunks:
+        print("warning: %d chunks have degraded scores based on failed lookups (e.g., chunk %d)" %
+              (len(degraded_chunks), min(degraded_chunks)),
+              file=sys.stderr)
+
+    # The rows are rewritten with the scores as numbers, so that the output equals the one of a single run
+    header = settings["header"]
+    score_columns = {
+        column
+        for column, name in enumerate(header)
+        if column >= 3 and name != "DEGRADED_SCORES"
+    }
+
+    score_writer = ScoreWriter(output_file, header, mode="replace")
+
+    for chunk in range(settings["chunks"]):
+        with open(chunk_file(chunk_dirs[chunk], chunk, ".csv"),
+                  "r",
+                  newline="") as f:
+            rows = csv.reader(f)
+            next(rows)
+
+            for row in rows:
+                score_writer.write([
+                    int(value) if column in score_columns else value
+                    for column, value in enumerate(row)
+                ])
+
+    score_writer.close()
+
+    return []
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="score large cohorts in checkpointed chunks that can be resumed, sharded and merged",
+        formatter_class=lambda prog: argparse.RawTextHelpFormatter(
+            prog, max_help_position=120, width=99999))
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser(
+        "run",
+        help="score the pending chunks of a shard, resuming from the checkpoints")
+    run_parser.add_argument("-i",
+                            "--input_file",
+                            metavar="INPUT_FILE",
+                            help="the input file (e.g., data/de_sentences.csv)",
+                            action="store",
+                            type=str,
+                            required=True,
+                            dest="input_file")
+    run_parser.add_argument("-c",
+                            "--checkpoint_dir",
+                            metavar="CHECKPOINT_DIR",
+                            help="the directory of the chunk checkpoints (e.g., data/de_checkpoints)",
+                            action="store",
+                            type=str,
+                            required=True,
+                            dest="checkpoint_dir")
+    run_parser.add_argument("-o",
+                            "--output_file",
+                            metavar="OUTPUT_FILE",
+                            help="the output file, written once all chunks are completed (e.g., data/de_scores.csv)",
+                            action="store",
+                            type=str,
+                            default=None,
+                            dest="output_file")
+    run_parser.add_argument("-s",
+                            "--creativity_scores",
+                            metavar="CREATIVITY_SCORES",
+                            help="the creativity scores with weightings (e.g., WORD_NOVELTY:0.6,CONTEXT_NOVELTY:0.4)",
+                            action="store",
+                            type=str,
+                            default=None,
+                            dest="creativity_scores")
+    run_parser.add_argument("-l",
+                            "--language",
+                            metavar="LANGUAGE",
+                            help="the language (e.g., DE)",
+                            action="store",
+                            type=str,
+                            default="DE",
+                            choices=["DE", "EN"],
+                            dest="language")
+    run_parser.add_argument("--chunk_size",
+                            metavar="CHUNK_SIZE",
+                            help="the number of sentences per chunk (e.g., 1000)",
+                            action="store",
+                            type=int,
+                            default=1000,
+                            dest="chunk_size")
+    run_parser.add_argument("--shard",
+                            metavar="SHARD",
+                            help="the shard of this run in [0, SHARDS), it scores the chunks i with i %% SHARDS == SHARD (e.g., 0)",
+                            action="store",
+                            type=int,
+                            default=0,
+                            dest="shard")
+    run_parser.add_argument("--shards",
+                            metavar="SHARDS",
+                            help="the number of shards the chunks are split into (e.g., 4)",
+                            action="store",
+                            type=int,
+                            default=1,
+                            dest="shards")
+    run_parser.add_argument("--degraded_column",
+                            help="add a DEGRADED_SCORES column with the scores that are based on failed lookups",
+                            action="store_true",
+                            dest="degraded_column")
+    run_parser.add_argument("--cache_file",
+                            metavar="CACHE_FILE",
+                            help="the persistent cache file for WORD_NOVELTY lookups (e.g., data/word_cache.sqlite)",
+                            action="store",
+                            type=str,
+                            default=None,
+                            dest="cache_file")
+    run_parser.add_argument("--cache_ttl",
+                            metavar="CACHE_TTL",
+                            help="the time-to-live of cached WORD_NOVELTY lookups in days (e.g., 30)",
+                            action="store",
+                            type=float,
+                            default=None,
+                            dest="cache_ttl")
+    run_parser.add_argument("--cache_size",
+                            metavar="CACHE_SIZE",
+                            help="the maximum number of cached WORD_NOVELTY lookups (e.g., 1000000)",
+                            action="store",
+                            type=int,
+                            default=1000000,
+                            dest="cache_size")
+    run_parser.add_argument("--offline",
+                            help="answer WORD_NOVELTY lookups from the cache file only",
+                            action="store_true",
+                            dest="offline")
+    run_parser.add_argument("--frequency_index",
+                            metavar="FREQUENCY_INDEX",
+                            help="the local frequency class index that answers all WORD_NOVELTY lookups (e.g., data/deu_news_2012_1M.index)",
+                            action="store",
+                            type=str,
+                            default=None,
+                            dest="frequency_index")
+    run_parser.add_argument("--context_counts",
+                            metavar="CONTEXT_COUNTS",
+                            help="the local pair count store that answers all CONTEXT_NOVELTY lookups instead of scaleserp.com (e.g., data/deu_news_2012_1M.pairs)",
+                            action="store",
+                            type=str,
+                            default=None,
+                            dest="context_counts")
+    run_parser.add_argument("--context_upper_bound",
+                            metavar="CONTEXT_UPPER_BOUND",
+                            help="the number of occurrences in the pair count store up to which a word pair is most novel (e.g., 1)",
+                            action="store",
+                            type=int,
+                            default=1,
+                            dest="context_upper_bound")
+    run_parser.add_argument("--fetch_workers",
+                            metavar="FETCH_WORKERS",
+                            help="the number of concurrent WORD_NOVELTY and CONTEXT_NOVELTY lookups (e.g., 8)",
+                            action="store",
+                            type=int,
+                            default=8,
+                            dest="fetch_workers")
+    run_parser.add_argument("--rate_limits",
+                            metavar="RATE_LIMITS",
+                            help="the maximum requests per second per API host (e.g., api.scaleserp.com:5,api.corpora.uni-leipzig.de:20)",
+                            action="store",
+                            type=str,
+                            default=None,
+                            dest="rate_limits")
+    run_parser.add_argument("--timeout",
+                            metavar="TIMEOUT",
+                            help="the timeout of WORD_NOVELTY and CONTEXT_NOVELTY requests in seconds (e.g., 30)",
+                            action="store",
+                            type=float,
+                            default=30.0,
+                            dest="timeout")
+    run_parser.add_argument("--max_retries",
+                            metavar="MAX_RETRIES",
+                            help="the maximum number of retries of failed WORD_NOVELTY and CONTEXT_NOVELTY requests (e.g., 3)",
+                            action="store",
+                            type=int,
+                            default=3,
+                            dest="max_retries")
+    run_parser.add_argument("--workers",
+                            metavar="WORKERS",
+                            help="the number of processes that compute the scores in parallel (e.g., 4)",
+                            action="store",
+                            type=int,
+                            default=1,
+                            dest="workers")
+    run_parser.add_argument("--phonetic_cache_size",
+                            metavar="PHONETIC_CACHE_SIZE",
+                            help="the maximum number of memoized phonetic encodings and distances (e.g., 100000)",
+                            action="store",
+                            type=int,
+                            default=100000,
+                            dest="phonetic_cache_size")
+
+    merge_parser = subparsers.add_parser(
+        "merge", help="merge the chunks of one or more checkpoint directories")
+    merge_parser.add_argument("-o",
+                              "--output_file",
+                              metavar="OUTPUT_FILE",
+                              help="the output file (e.g., data/de_scores.csv)",
+                              action="store",
+                              type=str,
+                              required=True,
+                              dest="output_file")
+    merge_parser.add_argument("checkpoint_dirs",
+                              metavar="CHECKPOINT_DIR",
+                              help="the checkpoint directories, e.g. one per shard (e.g., data/de_checkpoints)",
+                              nargs="+")
+
+    arguments = parser.parse_args()
+
+    if arguments.command == "merge":
+        try:
+            missing_chunks = merge_chunks(arguments.checkpoint_dirs,
+                                          arguments.output_file)
+        except ValueError as e:
+            parser.error(str(e))
+
+        if missing_chunks:
+            print("%d chunks are missing (e.g., chunk %d)" %
+                  (len(missing_chunks), missing_chunks[0]),
+                  file=sys.stderr)
+            sys.exit(1)
+
+        sys.exit(0)
+
+    if not 0 <= arguments.shard < arguments.shards:
+        parser.error("--shard must be in [0, SHARDS)")
+
+    if arguments.chunk_size < 1:
+        parser.error("--chunk_size must be positive")
+
+    if arguments.offline and not arguments.cache_file:
+        parser.error("--offline requires --cache_file")
+
+    if arguments.frequency_index and arguments.cache_file:
+        parser.error("--frequency_index cannot be combined with --cache_file")
+
+    word_cache = None
+    if arguments.cache_file:
+        word_cache = FrequencyClassCache(
+            arguments.cache_file,
+            ttl=arguments.cache_ttl * 86400
+            if arguments.cache_ttl is not None else None,
+            max_entries=arguments.cache_size,
+            offline=arguments.offline)
+
+    frequency_index = None
+    if arguments.frequency_index:
+        frequency_index = FrequencyIndex(arguments.frequency_index)
+
+    context_backend = None
+    if arguments.context_counts:
+        context_backend = NgramCountStore(
+            arguments.context_counts,
+            upper_bound=arguments.context_upper_bound)
+
+    phonetic_cache.configure_phonetic_caches(arguments.phonetic_cache_size)
+
+    fetch_engine = FetchEngine(
+        max_workers=arguments.fetch_workers,
+        host_rates=parse_rate_limits(arguments.rate_limits)
+        if arguments.rate_limits else None,
+        timeout=arguments.timeout,
+        max_retries=arguments.max_retries)
+
+    score_weight_map = DEFAULT_SCORE_WEIGHT_MAP
+    if arguments.creativity_scores:
+        score_weight_map = parse_creativity_scores(arguments.creativity_scores)
+
+    try:
+        run_chunks(arguments.input_file,
+                   arguments.checkpoint_dir,
+                   score_weight_map,
+                   arguments.language,
+                   fetch_engine,
+                   chunk_size=arguments.chunk_size,
+                   shard=arguments.shard,
+                   shards=arguments.shards,
+                   degraded_column=arguments.degraded_column,
+                   word_cache=word_cache,
+                   frequency_index=frequency_index,
+                   context_backend=context_backend,
+                   workers=arguments.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        fetch_engine.close()
+
+        if word_cache is not None:
+            word_cache.close()
+        if frequency_index is not None:
+            frequency_index.close()
+        if context_backend is not None:
+            context_backend.close()
+
+    # Once all chunks are completed (e.g., by the only shard), merge them into the output file
+    if arguments.output_file:
+        missing_chunks = merge_chunks([arguments.checkpoint_dir],
+                                      arguments.output_file)
+
+        if missing_chunks:
+            print("%d chunks are not completed yet, merge the shards with `merge`" %
+                  len(missing_chunks),
+                  file=sys.stderr)
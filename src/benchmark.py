@@ -0,0 +1,310 @@
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+import language_creativity
+
+from language_creativity import Scores
+from mock_api import MockApiServer
+from preprocessing import TokenTable
+
+# Four letter words (variables) and syllables of the synthetic cohorts
+BENCHMARK_VARIABLES = {
+    "DE": ["ERDE", "LUST", "SOFA", "HAUS", "BROT", "MOND", "WALD", "ROSE"],
+    "EN": ["ROOF", "ELSE", "SALT", "FOAL", "BEAR", "MILK", "STAR", "WIND"]
+}
+
+BENCHMARK_SYLLABLES = {
+    "DE": [
+        "ber", "ein", "ge", "lich", "schen", "ung", "ter", "hau", "mei", "rös",
+        "zu", "ken", "stra", "wal", "dun", "fel", "tig", "ach"
+    ],
+    "EN": [
+        "ther", "ing", "al", "tion", "er", "ly", "con", "ment", "ble", "ous",
+        "ack", "ight", "ster", "ow", "pre", "ful"
+    ]
+}
+
+
+# Generate a synthetic cohort in the format of data/de_sentences.csv
+# Every sentence has four words that start with the letters of its variable, reuse_rate is the probability
+# that a word is drawn from the words already used for its first letter instead of a new word
+def generate_cohort(output_file: str,
+                    language: str,
+                    subjects: int,
+                    variables: int,
+                    reuse_rate: float,
+                    seed: int = 0):
+    generator = random.Random(seed)
+
+    syllables = BENCHMARK_SYLLABLES[language]
+    words_by_letter = {}
+    used_words = set()
+
+    def word_for(letter):
+        letter_words = words_by_letter.setdefault(letter, [])
+
+        if letter_words and generator.random() < reuse_rate:
+            return generator.choice(letter_words)
+
+        while True:
+            word = letter.lower() + "".join(
+                generator.choice(syllables)
+                for _ in range(generator.randint(1, 3)))
+
+            if word not in used_words:
+                break
+
+        used_words.add(word)
+        letter_words.append(word)
+
+        return word
+
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f, delimiter=";", quoting=csv.QUOTE_ALL)
+        writer.writerow(["subject", "variable", "sentence", "rating"])
+
+        for subject in range(subjects):
+            for variable in BENCHMARK_VARIABLES[language][:variables]:
+                sentence = " ".join(word_for(letter) for letter in variable)
+                writer.writerow(
+                    ["S%07d" % subject, variable,
+                     sentence.capitalize(), ""])
+
+
+# Send all WORD_NOVELTY and CONTEXT_NOVELTY requests of the scorer to the mock API server
+def use_mock_api(url: str):
+    context_novelty_api_de = language_creativity.CONTEXT_NOVELTY_API_DE
+    context_novelty_api_en = language_creativity.CONTEXT_NOVELTY_API_EN
+
+    language_creativity.WORD_NOVELTY_API_DE = "%s/ws/words/%s/word/" % (
+        url, language_creativity.WORD_NOVELTY_CORPUS_DE)
+    language_creativity.WORD_NOVELTY_API_EN = "%s/ws/words/%s/word/" % (
+        url, language_creativity.WORD_NOVELTY_CORPUS_EN)
+    language_creativity.CONTEXT_NOVELTY_API_DE = lambda q: context_novelty_api_de(
+        q).replace("https://api.scaleserp.com", url)
+    language_creativity.CONTEXT_NOVELTY_API_EN = lambda q: context_novelty_api_en(
+        q).replace("https://api.scaleserp.com", url)
+
+
+# Score the input file stage by stage and measure the time spent per score category
+def run_benchmark(input_file: str, language: str, fetch_workers: int):
+    timings = {}
+
+    def timed(name, function):
+        start = time.perf_counter()
+        result = function()
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+        return result
+
+    score_weight_map = language_creativity.DEFAULT_SCORE_WEIGHT_MAP
+
+    # Like the command line interface, the input file is split into words once by the preprocessing stage
+    table = timed("READ", lambda: TokenTable(input_file))
+    sentences = list(table.valid_sentences())
+    stripped_sentences = [table.tokens[sentence] for _, _, sentence in sentences]
+
+    vocabulary, word_planner, context_planner = timed(
+        "COLLECT", lambda: language_creativity.collect_statistics(
+            sentences, score_weight_map, token_table=table.tokens))
+
+    fetch_engine = language_creativity.FetchEngine(max_workers=fetch_workers)
+    empty_planner = language_creativity.RequestPlanner()
+
+    # The lookups are part of the WORD_NOVELTY and CONTEXT_NOVELTY categories
+    frequency_classes, _ = timed(
+        Scores.WORD_NOVELTY.name, lambda: language_creativity.resolve_lookups(
+            word_planner, empty_planner, language, fetch_engine))
+    _, context_classes = timed(
+        Scores.CONTEXT_NOVELTY.name, lambda: language_creativity.
+        resolve_lookups(empty_planner, context_planner, language, fetch_engine))
+
+    fetch_engine.close()
+
+    timed(
+        Scores.WORD_NOVELTY.name, lambda: [
+            language_creativity.word_novelty_score(stripped_sentence,
+                                                   frequency_classes)
+            for stripped_sentence in stripped_sentences
+        ])
+    timed(
+        Scores.CONTEXT_NOVELTY.name, lambda: [
+            language_creativity.context_novelty_score(stripped_sentence,
+                                                      context_classes)
+            for stripped_sentence in stripped_sentences
+        ])
+    timed(
+        Scores.PARTICIPANT_SIMILARITY.name, lambda: [
+            language_creativity.similarity_score(
+                stripped_sentence, vocabulary.subject_vocabulary[subject],
+                vocabulary.min_subject_occurence, vocabulary.
+                max_subject_occurence) for (subject, _, _), stripped_sentence
+            in zip(sentences, stripped_sentences)
+        ])
+    timed(
+        Scores.SENTENCE_SIMILARITY.name, lambda: [
+            language_creativity.similarity_score(
+                stripped_sentence, vocabulary.variable_vocabulary[variable],
+                vocabulary.min_variable_occurence, vocabulary.
+                max_variable_occurence) for (_, variable, _), stripped_sentence
+            in zip(sentences, stripped_sentences)
+        ])
+
+    # The phonetic representations are shared by the RHYTHMIC_SCORE and PHONETIC_SCORE
+    phonetic_results = timed(
+        Scores.RHYTHMIC_SCORE.name, lambda: [
+            language_creativity.phonetic_representation(sentence, language)
+            for _, _, sentence in sentences
+        ])
+    timed(
+        Scores.RHYTHMIC_SCORE.name, lambda: [
+            language_creativity.rhythmic_score(phonetic_result, language)
+            for phonetic_result in phonetic_results
+        ])
+    timed(
+        Scores.PHONETIC_SCORE.name, lambda: [
+            language_creativity.phonetic_score(phonetic_result)
+            for phonetic_result in phonetic_results
+        ])
+
+    return {
+        "sentences": len(sentences),
+        "timings": timings,
+        "lookups": {
+            Scores.WORD_NOVELTY.name: {
+                "requested": word_planner.requested(),
+                "saved": word_planner.saved()
+            },
+            Scores.CONTEXT_NOVELTY.name: {
+                "requested": context_planner.requested(),
+                "saved": context_planner.saved()
+            }
+        }
+    }
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="benchmark language creativity scoring on synthetic cohorts",
+        formatter_class=lambda prog: argparse.RawTextHelpFormatter(
+            prog, max_help_position=120, width=99999))
+
+    parser.add_argument("-l",
+                        "--language",
+                        metavar="LANGUAGE",
+                        help="the language (e.g., DE)",
+                        action="store",
+                        type=str,
+                        default="DE",
+                        choices=["DE", "EN"],
+                        dest="language")
+    parser.add_argument("--subjects",
+                        metavar="SUBJECTS",
+                        help="the number of synthetic participants (e.g., 1000)",
+                        action="store",
+                        type=int,
+                        default=1000,
+                        dest="subjects")
+    parser.add_argument("--variables",
+                        metavar="VARIABLES",
+                        help="the number of four letter words per participant (e.g., 2)",
+                        action="store",
+                        type=int,
+                        default=2,
+                        choices=range(1, 9),
+                        dest="variables")
+    parser.add_argument("--reuse_rate",
+                        metavar="REUSE_RATE",
+                        help="the probability that a word is reused instead of a new word (e.g., 0.9)",
+                        action="store",
+                        type=float,
+                        default=0.9,
+                        dest="reuse_rate")
+    parser.add_argument("--latency",
+                        metavar="LATENCY",
+                        help="the latency of the mock API server in milliseconds (e.g., 50)",
+                        action="store",
+                        type=float,
+                        default=0.0,
+                        dest="latency")
+    parser.add_argument("--fetch_workers",
+                        metavar="FETCH_WORKERS",
+                        help="the number of concurrent WORD_NOVELTY and CONTEXT_NOVELTY lookups (e.g., 8)",
+                        action="store",
+                        type=int,
+                        default=8,
+                        dest="fetch_workers")
+    parser.add_argument("--seed",
+                        metavar="SEED",
+                        help="the seed of the synthetic cohort (e.g., 0)",
+                        action="store",
+                        type=int,
+                        default=0,
+                        dest="seed")
+    parser.add_argument("--input_file",
+                        metavar="INPUT_FILE",
+                        help="the file the synthetic cohort is written to (e.g., data/benchmark_sentences.csv)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="input_file")
+    parser.add_argument("--report_file",
+                        metavar="REPORT_FILE",
+                        help="the JSON file the benchmark results are written to (e.g., benchmark.json)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="report_file")
+
+    arguments = parser.parse_args()
+
+    # Without an input file, the synthetic cohort is written to a temporary file
+    input_file = arguments.input_file
+    if input_file is None:
+        fd, input_file = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+
+    generate_cohort(input_file, arguments.language,
+                    arguments.subjects, arguments.variables,
+                    arguments.reuse_rate, arguments.seed)
+
+    server = MockApiServer(latency=arguments.latency / 1000)
+    server.start()
+    use_mock_api(server.url)
+
+    start = time.perf_counter()
+    report = run_benchmark(input_file, arguments.language,
+                           arguments.fetch_workers)
+    report["total_seconds"] = time.perf_counter() - start
+
+    server.stop()
+
+    if arguments.input_file is None:
+        os.remove(input_file)
+
+    # ru_maxrss is reported in kilobytes on Linux
+    report["peak_memory_mb"] = resource.getrusage(
+        resource.RUSAGE_SELF).ru_maxrss / 1024
+    report["requests"] = server.requests
+
+    print("%-24s %10s" % ("stage", "seconds"))
+    for stage, seconds in report["timings"].items():
+        print("%-24s %10.3f" % (stage, seconds))
+
+    print("%-24s %10.3f" % ("TOTAL", report["total_seconds"]))
+    print("%d sentences, %.1f sentences per second, %.1f MB peak memory" %
+          (report["sentences"], report["sentences"] /
+           max(report["total_seconds"], 1e-9), report["peak_memory_mb"]))
+
+    for endpoint, count in report["requests"].items():
+        print("%s: %d requests" % (endpoint, count))
+
+    if arguments.report_file:
+        with open(arguments.report_file, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,375 @@
+import argparse
+import csv
+import mmap
+import os
+import struct
+import sys
+import zlib
+from collections.abc import Mapping
+
+from vocabulary import VocabularyStatistics
+
+# File layout: header (with the cohort-wide bounds), (groups + 1) group offsets, (groups + 1) entry starts,
+# (entries + 1) word offsets, entries word occurrences, the group blob and the word blob
+# The groups are the subjects followed by the variables, each sorted bytewise, the entries of a group are its words
+# sorted bytewise, so that every lookup is a binary search over the memory map
+STATISTICS_MAGIC = b"LCVS"
+STATISTICS_HEADER = struct.Struct("<4sIII4d")
+
+
+# The shard of a subject, all sentences of a subject are in the same shard so that a revised sentence
+# replaces the earlier one like in a single run
+def subject_shard(subject: str, shards: int):
+    return zlib.crc32(subject.encode("utf-8")) % shards
+
+
+def shard_file(shard_dir: str, shard: int):
+    return os.path.join(shard_dir, "shard-%03d.csv" % shard)
+
+
+# Split an input file by subject into `shards` input files with the same header
+def split_input(input_file: str, shard_dir: str, shards: int):
+    os.makedirs(shard_dir, exist_ok=True)
+
+    with open(input_file, "r") as f:
+        lines = csv.reader(f, delimiter=";")
+        header = next(lines)
+
+        shard_files = [
+            open(shard_file(shard_dir, shard), "w", newline="")
+            for shard in range(shards)
+        ]
+        writers = [csv.writer(f, delimiter=";") for f in shard_files]
+        for writer in writers:
+            writer.writerow(header)
+
+        for line in lines:
+            if line:
+                writers[subject_shard(line[0], shards)].writerow(line)
+
+        for f in shard_files:
+            f.close()
+
+
+# Map phase: Count the word occurrences per subject and variable of one shard
+def map_statistics(input_file: str):
+    # Imported only here, the scoring script reads the statistics without importing itself a second time
+    from language_creativity import group_sentences
+    from preprocessing import TokenTable
+
+    table = TokenTable(input_file)
+    vocabulary = VocabularyStatistics()
+
+    for subject, pairs in group_sentences(table.valid_sentences()).items():
+        for variable, sentence in pairs.items():
+            vocabulary.add(subject, variable, table.tokens[sentence])
+
+    vocabulary.finalize()
+
+    return vocabulary
+
+
+# Reduce phase: Merge the partial statistics of all shards into the statistics of the whole cohort
+def reduce_statistics(partial_files: list):
+    vocabulary = VocabularyStatistics()
+    subjects = set()
+    repeated_subjects = 0
+
+    for partial_file in partial_files:
+        statistics = CohortStatistics(partial_file)
+
+        for subject in statistics.subject_vocabulary:
+            if subject in subjects:
+                repeated_subjects += 1
+            subjects.add(subject)
+
+        vocabulary.merge(statistics)
+        statistics.close()
+
+    if repeated_subjects:
+        print("warning: %d subjects occur in several partial statistics, a revised sentence is counted twice if "
+              "its earlier version is in another shard (split the input by subject)" % repeated_subjects,
+              file=sys.stderr)
+
+    vocabulary.finalize()
+
+    return vocabulary
+
+
+# Write the word occurrences and the bounds of finalized vocabulary statistics
+def write_statistics(vocabulary: VocabularyStatistics, statistics_file: str):
+    groups = [
+        sorted((group.encode("utf-8"),
+                sorted((word.encode("utf-8"), count)
+                       for word, count in words.items()))
+               for group, words in vocabulary_groups.items())
+        for vocabulary_groups in (vocabulary.subject_vocabulary,
+                                  vocabulary.variable_vocabulary)
+    ]
+    groups = groups[0] + groups[1]
+    entries = [entry for _, words in groups for entry in words]
+
+    group_offsets, entry_starts = [0], [0]
+    for group, words in groups:
+        group_offsets.append(group_offsets[-1] + len(group))
+        entry_starts.append(entry_starts[-1] + len(words))
+
+    word_offsets = [0]
+    for word, _ in entries:
+        word_offsets.append(word_offsets[-1] + len(word))
+
+    # Write to a temporary file first, so that readers never see partially written statistics
+    temporary_file = statistics_file + ".tmp"
+    with open(temporary_file, "wb") as f:
+        f.write(STATISTICS_HEADER.pack(
+            STATISTICS_MAGIC, len(vocabulary.subject_vocabulary),
+            len(vocabulary.variable_vocabulary), len(entries),
+            vocabulary.max_subject_occurence, vocabulary.min_subject_occurence,
+            vocabulary.max_variable_occurence,
+            vocabulary.min_variable_occurence))
+        f.write(struct.pack("<%dI" % len(group_offsets), *group_offsets))
+        f.write(struct.pack("<%dI" % len(entry_starts), *entry_starts))
+        f.write(struct.pack("<%dI" % len(word_offsets), *word_offsets))
+        f.write(struct.pack("<%dI" % len(entries), *(count for _, count in entries)))
+        f.write(b"".join(group for group, _ in groups))
+        f.write(b"".join(word for word, _ in entries))
+
+    os.replace(temporary_file, statistics_file)
+
+
+# The words of one subject or variable and their number of occurrences
+class StatisticsWords(Mapping):
+
+    def __init__(self, statistics, start: int, end: int):
+        self.statistics = statistics
+        self.start = start
+        self.end = end
+
+    def __getitem__(self, word: str):
+        position = self.statistics.search(self.statistics.word,
+                                          word.encode("utf-8"), self.start,
+                                          self.end)
+        if position is None:
+            raise KeyError(word)
+
+        return self.statistics.counts[position]
+
+    def __iter__(self):
+        for position in range(self.start, self.end):
+            yield self.statistics.word(position).decode("utf-8")
+
+    def __len__(self):
+        return self.end - self.start
+
+    def items(self):
+        for position in range(self.start, self.end):
+            yield (self.statistics.word(position).decode("utf-8"),
+                   self.statistics.counts[position])
+
+
+# The subjects or variables of the statistics, each mapped to its words
+class StatisticsGroups(Mapping):
+
+    def __init__(self, statistics, start: int, end: int):
+        self.statistics = statistics
+        self.start = start
+        self.end = end
+
+    def words(self, position: int):
+        return StatisticsWords(self.statistics,
+                               self.statistics.entry_starts[position],
+                               self.statistics.entry_starts[position + 1])
+
+    def __getitem__(self, group: str):
+        position = self.statistics.search(self.statistics.group,
+                                          group.encode("utf-8"), self.start,
+                                          self.end)
+        if position is None:
+            raise KeyError(group)
+
+        return self.words(position)
+
+    def __iter__(self):
+        for position in range(self.start, self.end):
+            yield self.statistics.group(position).decode("utf-8")
+
+    def __len__(self):
+        return self.end - self.start
+
+    def items(self):
+        for position in range(self.start, self.end):
+            yield (self.statistics.group(position).decode("utf-8"),
+                   self.words(position))
+
+
+# Read-only, memory-mapped cohort statistics, which can be used in place of `VocabularyStatistics` to score
+# a shard of the cohort with the vocabularies and bounds of the whole cohort
+# Pickled statistics are reopened from their file, so that every worker process maps the same file
+class CohortStatistics:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, subjects, variables, self.size, self.max_subject_occurence,
+         self.min_subject_occurence, self.max_variable_occurence,
+         self.min_variable_occurence) = STATISTICS_HEADER.unpack_from(
+             self.map, 0)
+        if magic != STATISTICS_MAGIC:
+            raise ValueError("%s is not a cohort statistics file" % path)
+
+        groups = subjects + variables
+
+        start = STATISTICS_HEADER.size
+        self.group_offsets = memoryview(self.map)[start:start + 4 *
+                                                  (groups + 1)].cast("I")
+
+        start += 4 * (groups + 1)
+        self.entry_starts = memoryview(self.map)[start:start + 4 *
+                                                 (groups + 1)].cast("I")
+
+        start += 4 * (groups + 1)
+        self.word_offsets = memoryview(self.map)[start:start + 4 *
+                                                 (self.size + 1)].cast("I")
+
+        start += 4 * (self.size + 1)
+        self.counts = memoryview(self.map)[start:start +
+                                           4 * self.size].cast("I")
+
+        start += 4 * self.size
+        self.groups = start
+        self.words = start + self.group_offsets[groups]
+
+        self.subject_vocabulary = StatisticsGroups(self, 0, subjects)
+        self.variable_vocabulary = StatisticsGroups(self, subjects, groups)
+
+    def group(self, position: int):
+        return self.map[self.groups + self.group_offsets[position]:self.groups +
+                        self.group_offsets[position + 1]]
+
+    def word(self, position: int):
+        return self.map[self.words + self.word_offsets[position]:self.words +
+                        self.word_offsets[position + 1]]
+
+    # Return the position of a key in the sorted keys from low to high or None if it is not among them
+    def search(self, key_at, key: bytes, low: int, high: int):
+        end = high
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < end and key_at(low) == key:
+            return low
+
+        return None
+
+    def __getstate__(self):
+        return self.path
+
+    def __setstate__(self, path: str):
+        self.__init__(path)
+
+    def close(self):
+        # The memory views must be released before the memory map can be closed
+        for view in [self.group_offsets, self.entry_starts, self.word_offsets,
+                     self.counts]:
+            view.release()
+        self.map.close()
+        self.file.close()
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="compute the cohort-wide PARTICIPANT_SIMILARITY and SENTENCE_SIMILARITY statistics shard by shard",
+        formatter_class=lambda prog: argparse.RawTextHelpFormatter(
+            prog, max_help_position=120, width=99999))
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    split_parser = subparsers.add_parser(
+        "split", help="split an input file by subject into shards")
+    split_parser.add_argument("-i",
+                              "--input_file",
+                              metavar="INPUT_FILE",
+                              help="the input file (e.g., data/de_sentences.csv)",
+                              action="store",
+                              type=str,
+                              required=True,
+                              dest="input_file")
+    split_parser.add_argument("-d",
+                              "--shard_dir",
+                              metavar="SHARD_DIR",
+                              help="the directory of the input files of the shards (e.g., data/de_shards)",
+                              action="store",
+                              type=str,
+                              required=True,
+                              dest="shard_dir")
+    split_parser.add_argument("--shards",
+                              metavar="SHARDS",
+                              help="the number of shards (e.g., 4)",
+                              action="store",
+                              type=int,
+                              required=True,
+                              dest="shards")
+
+    map_parser = subparsers.add_parser(
+        "map", help="count the word occurrences of one shard")
+    map_parser.add_argument("-i",
+                            "--input_file",
+                            metavar="INPUT_FILE",
+                            help="the input file of the shard (e.g., data/de_shards/shard-000.csv)",
+                            action="store",
+                            type=str,
+                            required=True,
+                            dest="input_file")
+    map_parser.add_argument("-x",
+                            "--statistics_file",
+                            metavar="STATISTICS_FILE",
+                            help="the partial statistics file of the shard (e.g., data/de_shards/shard-000.statistics)",
+                            action="store",
+                            type=str,
+                            required=True,
+                            dest="statistics_file")
+
+    reduce_parser = subparsers.add_parser(
+        "reduce", help="merge the partial statistics of all shards")
+    reduce_parser.add_argument("-x",
+                               "--statistics_file",
+                               metavar="STATISTICS_FILE",
+                               help="the statistics file of the whole cohort (e.g., data/de.statistics)",
+                               action="store",
+                               type=str,
+                               required=True,
+                               dest="statistics_file")
+    reduce_parser.add_argument("partial_files",
+                               metavar="PARTIAL_FILE",
+                               help="the partial statistics files of all shards",
+                               nargs="+")
+
+    arguments = parser.parse_args()
+
+    if arguments.command == "split":
+        if arguments.shards < 1:
+            parser.error("--shards must be at least 1")
+
+        split_input(arguments.input_file, arguments.shard_dir,
+                    arguments.shards)
+    else:
+        if arguments.command == "map":
+            vocabulary = map_statistics(arguments.input_file)
+        else:
+            vocabulary = reduce_statistics(arguments.partial_files)
+
+        write_statistics(vocabulary, arguments.statistics_file)
+
+        print("%s: %d subjects, %d variables" %
+              (arguments.statistics_file, len(vocabulary.subject_vocabulary),
+               len(vocabulary.variable_vocabulary)),
+              file=sys.stderr)
@@ -0,0 +1,269 @@
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+
+from fetch_engine import FetchEngine
+
+# File layout: header, (count + 1) key offsets, count pair counts and the key blob
+# The keys are `kind first<TAB>second` (kind is `+` for consecutive and `*` for non-consecutive pairs),
+# UTF-8 encoded and sorted bytewise, so that a lookup is a binary search over the memory map
+STORE_MAGIC = b"LCNG"
+STORE_HEADER = struct.Struct("<4sQI")
+
+# Tokens of the corpus sentences, pairs are counted case-insensitively like web search results
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def novelty_class(num_results: int, num_classes: int, upper_bound: int):
+    while (num_results > upper_bound and num_classes > 1):
+        upper_bound *= 2
+        num_classes -= 1
+
+    return num_classes
+
+
+def fetch_context_class(fetch_engine: FetchEngine, context_novelty_api,
+                        query: str):
+    try:
+        # Obtain the CONTEXT_NOVELTY from the scaleserp.com endpoint
+        resp = fetch_engine.get(context_novelty_api(query))
+
+        # Process only successful request responses
+        if resp.status_code == 200:
+            response_json = resp.json()
+
+            # Determine the novelty score in the nested JSON response
+            # There are two preconditions for successful respones:
+            # 1) response_json["request_info"]["success"] == True
+            # 2) response_json["search_information"]["total_results"] != None
+            if response_json["request_info"]["success"] == True:
+                if "total_results" in response_json["search_information"]:
+                    # Map the number of google search results N to a score in [0, 20]
+                    # < 512 search results implies the best score of 20
+                    return novelty_class(
+                        int(response_json["search_information"]
+                            ["total_results"]), 20, 512)
+                else:
+                    # If there are 0 search results, the word is highly novel
+                    return 20
+    except Exception:
+        pass
+
+    # Failed lookups are reported as None
+    return None
+
+
+# Split a CONTEXT_NOVELTY query ("a + b" or "a * b") into its kind and word pair
+def parse_context_query(query: str):
+    first, kind, second = query.strip("\"").split(" ", 2)
+
+    return kind, first, second
+
+
+# Context count backends map the CONTEXT_NOVELTY queries to novelty classes in [1, 20] (None for failed lookups)
+class ContextBackend:
+
+    def resolve(self, queries):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# Count the search results of each query with the paid scaleserp.com API
+class ScaleserpBackend(ContextBackend):
+
+    def __init__(self, fetch_engine: FetchEngine, context_novelty_api):
+        self.fetch_engine = fetch_engine
+        self.context_novelty_api = context_novelty_api
+
+    def resolve(self, queries):
+        return self.fetch_engine.resolve(
+            queries, lambda query: fetch_context_class(
+                self.fetch_engine, self.context_novelty_api, query))
+
+
+# Count the word pairs of a corpus with one sentence per line (optionally preceded by a tab separated id)
+# Consecutive pairs are counted as `+` and pairs with 1 to max_gap words in between as `*`
+def count_pairs(corpus_file: str, max_gap: int = 3):
+    counts = {}
+
+    with open(corpus_file, "r", encoding="utf-8") as f:
+        for line in f:
+            tokens = TOKEN_PATTERN.findall(line.rsplit("\t", 1)[-1].lower())
+
+            for position, first in enumerate(tokens):
+                for gap, second in enumerate(
+                        tokens[position + 1:position + max_gap + 2]):
+                    key = "%s%s\t%s" % ("+" if gap == 0 else "*", first,
+                                        second)
+                    counts[key] = counts.get(key, 0) + 1
+
+    return counts
+
+
+# Write a pair count store of the given corpus and return the number of stored pairs
+# Pairs seen less than min_count times are dropped, they are looked up as 0 occurrences
+def build_count_store(corpus_file: str,
+                      store_file: str,
+                      max_gap: int = 3,
+                      min_count: int = 2):
+    entries = sorted((key.encode("utf-8"), count)
+                     for key, count in count_pairs(corpus_file,
+                                                   max_gap).items()
+                     if count >= min_count)
+
+    offsets = [0]
+    for key, _ in entries:
+        offsets.append(offsets[-1] + len(key))
+
+    # Write to a temporary file first, so that readers never see a partially written store
+    temporary_file = store_file + ".tmp"
+    with open(temporary_file, "wb") as f:
+        f.write(STORE_HEADER.pack(STORE_MAGIC, len(entries), max_gap))
+        f.write(struct.pack("<%dQ" % len(offsets), *offsets))
+        f.write(
+            struct.pack("<%dI" % len(entries),
+                        *(min(count, 0xFFFFFFFF) for _, count in entries)))
+        f.write(b"".join(key for key, _ in entries))
+
+    os.replace(temporary_file, store_file)
+
+    return len(entries)
+
+
+# Read-only, memory-mapped pair count store for offline CONTEXT_NOVELTY lookups
+# upper_bound := the number of occurrences up to which a pair is in the most novel class, each doubling
+# lowers the class by one (the scaleserp backend uses 512 search results)
+class NgramCountStore(ContextBackend):
+
+    def __init__(self, path: str, upper_bound: int = 1):
+        self.upper_bound = upper_bound
+
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.size, self.max_gap = STORE_HEADER.unpack_from(self.map, 0)
+        if magic != STORE_MAGIC:
+            raise ValueError("%s is not a pair count store" % path)
+
+        start = STORE_HEADER.size
+        self.offsets = memoryview(self.map)[start:start + 8 *
+                                            (self.size + 1)].cast("Q")
+
+        start += 8 * (self.size + 1)
+        self.counts = memoryview(self.map)[start:start +
+                                           4 * self.size].cast("I")
+        self.keys = start + 4 * self.size
+
+    def key(self, position: int):
+        return self.map[self.keys + self.offsets[position]:self.keys +
+                        self.offsets[position + 1]]
+
+    # Return the number of occurrences of a word pair of the given kind (`+` or `*`)
+    def count(self, kind: str, first: str, second: str):
+        key = ("%s%s\t%s" % (kind, first.lower(), second.lower())).encode("utf-8")
+
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self.size and self.key(low) == key:
+            return self.counts[low]
+
+        return 0
+
+    def resolve(self, queries):
+        return {
+            query: novelty_class(self.count(*parse_context_query(query)), 20,
+                                 self.upper_bound)
+            for query in queries
+        }
+
+    def close(self):
+        # The memory views must be released before the memory map can be closed
+        self.offsets.release()
+        self.counts.release()
+        self.map.close()
+        self.file.close()
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="build and query local pair count stores for CONTEXT_NOVELTY lookups",
+        formatter_class=lambda prog: argparse.RawTextHelpFormatter(
+            prog, max_help_position=120, width=99999))
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser(
+        "build", help="build a pair count store from a corpus of sentences")
+    build_parser.add_argument("-c",
+                              "--corpus_file",
+                              metavar="CORPUS_FILE",
+                              help="the sentences of the corpus, one per line (e.g., deu_news_2012_1M-sentences.txt)",
+                              action="store",
+                              type=str,
+                              required=True,
+                              dest="corpus_file")
+    build_parser.add_argument("-x",
+                              "--store_file",
+                              metavar="STORE_FILE",
+                              help="the pair count store file (e.g., data/deu_news_2012_1M.pairs)",
+                              action="store",
+                              type=str,
+                              required=True,
+                              dest="store_file")
+    build_parser.add_argument("--max_gap",
+                              metavar="MAX_GAP",
+                              help="the maximum number of words between the words of a non-consecutive pair (e.g., 3)",
+                              action="store",
+                              type=int,
+                              default=3,
+                              dest="max_gap")
+    build_parser.add_argument("--min_count",
+                              metavar="MIN_COUNT",
+                              help="the minimum number of occurrences of a stored pair (e.g., 2)",
+                              action="store",
+                              type=int,
+                              default=2,
+                              dest="min_count")
+
+    count_parser = subparsers.add_parser(
+        "count", help="print the occurrences of CONTEXT_NOVELTY queries")
+    count_parser.add_argument("-x",
+                              "--store_file",
+                              metavar="STORE_FILE",
+                              help="the pair count store file (e.g., data/deu_news_2012_1M.pairs)",
+                              action="store",
+                              type=str,
+                              required=True,
+                              dest="store_file")
+    count_parser.add_argument("queries",
+                              metavar="QUERY",
+                              help="the queries to count (e.g., \"Rosen + erfrischen\" or \"Rosen * Einwohner\")",
+                              nargs="+")
+
+    arguments = parser.parse_args()
+
+    if arguments.command == "build":
+        size = build_count_store(arguments.corpus_file, arguments.store_file,
+                                 arguments.max_gap, arguments.min_count)
+        print("%s: %d pairs stored" % (arguments.store_file, size),
+              file=sys.stderr)
+    else:
+        store = NgramCountStore(arguments.store_file)
+
+        for query in arguments.queries:
+            print("%s\t%d" % (query, store.count(*parse_context_query(query))))
+
+        store.close()
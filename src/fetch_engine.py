@@ -0,0 +1,308 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import random
+import threading
+import time
+import profiling
+
+
+class Failed:
+
+    # Pickled by reference, so that the marker keeps its identity in worker processes
+    def __reduce__(self):
+        return "FAILED"
+
+
+# Marks a lookup that failed after all retries, unlike None (e.g., an unknown word) it is neither cached nor persisted
+FAILED = Failed()
+
+
+# Raised when a request fails after all retries or is rejected by an open circuit breaker
+class FetchError(Exception):
+    pass
+
+
+# Token bucket that allows up to `rate` requests per second to one host on average and bursts of up to
+# `burst` requests
+class RateLimiter:
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+            # Take the token right away, a negative balance reserves the next token for this request
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Stops sending requests to a host after `failure_threshold` consecutive failed requests for `reset_timeout` seconds,
+# afterwards a single trial request decides whether the host is used again
+# A request counts as failed only once all its retries are used up, throttled requests (429) do not count at all
+# Once a trial request has failed as well, the host is considered down and requests fail immediately until the
+# next trial request
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = None
+        self.trial_failed = False
+        self.condition = threading.Condition()
+
+    # Wait until a request may be sent: while the circuit is open, until `reset_timeout` has passed and then
+    # until this thread's trial request or another one has succeeded
+    # Returns False if the circuit is opened again while waiting (i.e., the trial request failed as well) or the
+    # host is down
+    def acquire(self):
+        with self.condition:
+            opened_at = self.opened_at
+
+            while self.opened_at is not None:
+                if self.trial == threading.get_ident():
+                    return True
+
+                if self.opened_at != opened_at:
+                    return False
+
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining <= 0 and self.trial is None:
+                    # Half-open: let this request through and keep the others waiting until it has finished
+                    self.trial = threading.get_ident()
+                    return True
+
+                if self.trial_failed and remaining > 0:
+                    return False
+
+                self.condition.wait(remaining if remaining > 0 else None)
+
+            return True
+
+    def record_success(self):
+        with self.condition:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = None
+            self.trial_failed = False
+            self.condition.notify_all()
+
+    def record_failure(self):
+        with self.condition:
+            self.failures += 1
+            trial = self.trial == threading.get_ident()
+
+            if trial or (self.opened_at is None
+                         and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+
+            if trial:
+                self.trial = None
+                self.trial_failed = True
+
+            self.condition.notify_all()
+
+    # Release the trial request of this thread without an outcome (e.g., because it was throttled), so that
+    # another waiting request becomes the trial request
+    def release(self):
+        with self.condition:
+            if self.trial == threading.get_ident():
+                self.trial = None
+                self.condition.notify_all()
+
+
+# Parse per-host rate limits with optional bursts (e.g., api.scaleserp.com:5,api.corpora.uni-leipzig.de:20/40)
+def parse_rate_limits(rate_limits: str):
+    host_rates = {}
+
+    for host_and_rate in filter(None, rate_limits.split(",")):
+        host, rate = host_and_rate.rsplit(":", 1)
+        rate, _, burst = rate.partition("/")
+        host_rates[host] = (float(rate), int(burst) if burst else 1)
+
+    return host_rates
+
+
+# Collects every lookup key needed for scoring, so that each distinct key is requested exactly once
+class RequestPlanner:
+
+    def __init__(self):
+        # Distinct keys in the order of their first occurrence with their number of occurrences
+        self.counts = {}
+
+    def add(self, key):
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def keys(self):
+        return list(self.counts)
+
+    def requested(self):
+        return sum(self.counts.values())
+
+    def saved(self):
+        return self.requested() - len(self.counts)
+
+
+# Resolves lookups concurrently on a bounded thread pool, honoring the per-host rate limits
+# Requests time out after `timeout` seconds, failed requests (connection errors, timeouts, 429 and 5xx responses)
+# are retried up to `max_retries` times with jittered exponential backoff starting at `backoff` seconds
+class FetchEngine:
+
+    def __init__(self,
+                 max_workers: int = 8,
+                 host_rates: dict = None,
+                 timeout: float = 30.0,
+                 max_retries: int = 3,
+                 backoff: float = 0.5,
+                 max_backoff: float = 30.0,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.0):
+        self.max_workers = max_workers
+        self.rate_limiters = {
+            host: RateLimiter(*rate) if isinstance(rate, tuple) else
+            RateLimiter(rate)
+            for host, rate in (host_rates or {}).items()
+        }
+
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        # One pooled keep-alive session and circuit breaker per API host, the number of requests issued
+        # (including retries) and of requests that failed after all retries per host
+        self.sessions = {}
+        self.circuit_breakers = {}
+        self.issued = {}
+        self.retried = {}
+        self.failed = {}
+        self.lock = threading.Lock()
+
+    def session(self, host: str):
+        # requests is imported with the first session, runs without network lookups never load it
+        import requests
+        import requests.adapters
+
+        with self.lock:
+            if host not in self.sessions:
+                # Keep one connection per worker alive, so that concurrent requests do not reconnect
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1, pool_maxsize=max(1, self.max_workers))
+
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+
+                self.sessions[host] = session
+                self.issued[host] = 0
+
+            self.issued[host] += 1
+
+            return self.sessions[host]
+
+    def circuit_breaker(self, host: str):
+        with self.lock:
+            if host not in self.circuit_breakers:
+                self.circuit_breakers[host] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout)
+
+            return self.circuit_breakers[host]
+
+    def count(self, counts: dict, host: str):
+        with self.lock:
+            counts[host] = counts.get(host, 0) + 1
+
+    # Full jitter: a random delay up to the exponentially growing backoff, but at least the delay
+    # a 429 or 503 response asks for in its Retry-After header
+    def backoff_delay(self, attempt: int, resp):
+        delay = random.uniform(
+            0, min(self.max_backoff, self.backoff * 2**attempt))
+
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, min(self.max_backoff, float(retry_after)))
+
+        return delay
+
+    # Send a GET request once the rate limit of the URL's host allows it, retrying failed requests
+    # Waits while the host's circuit breaker is open, raises FetchError if the request still fails after all
+    # retries or the trial request of the circuit breaker failed while waiting
+    def get(self, url: str):
+        import requests
+
+        host = urlparse(url).hostname
+        circuit_breaker = self.circuit_breaker(host)
+        rate_limiter = self.rate_limiters.get(host)
+
+        error = None
+        throttled = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                if not circuit_breaker.acquire():
+                    error = FetchError("circuit breaker for %s is open" % host)
+                    break
+
+                if rate_limiter is not None:
+                    rate_limiter.wait()
+
+                resp = None
+                try:
+                    with profiling.timer("endpoint", host):
+                        resp = self.session(host).get(url, timeout=self.timeout)
+                except requests.RequestException as e:
+                    error = e
+                else:
+                    # Other responses (e.g., 404 for unknown words) are answers of the API and are not retried
+                    if resp.status_code != 429 and resp.status_code < 500:
+                        circuit_breaker.record_success()
+                        return resp
+
+                    error = FetchError("%s responded with status %d" %
+                                       (host, resp.status_code))
+
+                throttled = resp is not None and resp.status_code == 429
+
+                if attempt < self.max_retries:
+                    self.count(self.retried, host)
+                    time.sleep(self.backoff_delay(attempt, resp))
+            else:
+                # A host that only throttles is up, it does not open the circuit
+                if not throttled:
+                    circuit_breaker.record_failure()
+        finally:
+            circuit_breaker.release()
+
+        self.count(self.failed, host)
+
+        raise FetchError("GET %s failed: %s" % (host, error))
+
+    # Apply `fetch` to every key and return the mapping from key to result
+    # Exceptions raised by `fetch` are propagated to the caller
+    def resolve(self, keys, fetch):
+        keys = list(keys)
+
+        if self.max_workers <= 1 or len(keys) <= 1:
+            return {key: fetch(key) for key in keys}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(keys, executor.map(fetch, keys)))
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
@@ -0,0 +1,222 @@
+import argparse
+import math
+import mmap
+import os
+import struct
+import sys
+
+# File layout: header, corpus name, (count + 1) word offsets, count frequency classes and the word blob
+# The words are UTF-8 encoded and sorted bytewise, so that a lookup is a binary search over the memory map
+INDEX_MAGIC = b"LCFI"
+INDEX_HEADER = struct.Struct("<4sII")
+
+
+# Derive the corpus name from a Leipzig word list, e.g. deu_news_2012_1M-words.txt -> deu_news_2012_1M
+def corpus_name(corpus_file: str):
+    return os.path.basename(corpus_file).split("-words")[0].split(".")[0]
+
+
+# Read the surface forms and their frequencies from a Leipzig corpus word list
+# Each line holds tab separated columns `id word frequency` (the id column is optional)
+def read_word_frequencies(corpus_file: str):
+    frequencies = {}
+
+    with open(corpus_file, "r", encoding="utf-8") as f:
+        for line in f:
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) < 2 or not columns[-1].isdigit():
+                continue
+
+            word, frequency = columns[-2], int(columns[-1])
+            if word and frequency > 0:
+                frequencies[word] = frequencies.get(word, 0) + frequency
+
+    return frequencies
+
+
+# Classify words like the `frequencyClass` of api.corpora.uni-leipzig.de, the most frequent word is in class 0
+# and a word in class N is about 2^N times less frequent than the most frequent word
+def frequency_classes(frequencies: dict):
+    if not frequencies:
+        return {}
+
+    max_frequency = max(frequencies.values())
+
+    return {
+        word: int(math.floor(0.5 + math.log2(max_frequency / frequency)))
+        for word, frequency in frequencies.items()
+    }
+
+
+# Add the lowercase and capitalized variants of each surface form that are not surface forms themselves,
+# a variant gets the lowest (most frequent) class of the surface forms it is derived from
+def add_variants(classes: dict):
+    variants = {}
+
+    for word, frequency_class in classes.items():
+        for variant in (word.lower(), word.lower().capitalize()):
+            if variant not in classes:
+                variants[variant] = min(frequency_class,
+                                        variants.get(variant, frequency_class))
+
+    classes.update(variants)
+
+    return classes
+
+
+# Write a frequency class index of the given corpus word list and return the number of indexed words
+def build_index(corpus_file: str, index_file: str, corpus: str = None):
+    if corpus is None:
+        corpus = corpus_name(corpus_file)
+
+    classes = add_variants(
+        frequency_classes(read_word_frequencies(corpus_file)))
+
+    entries = sorted(
+        (word.encode("utf-8"), frequency_class)
+        for word, frequency_class in classes.items())
+
+    offsets = [0]
+    for word, _ in entries:
+        offsets.append(offsets[-1] + len(word))
+
+    encoded_corpus = corpus.encode("utf-8")
+
+    # Pad the corpus name so that the offsets are aligned to 4 bytes
+    padding = -(INDEX_HEADER.size + len(encoded_corpus)) % 4
+
+    # Write to a temporary file first, so that readers never see a partially written index
+    temporary_file = index_file + ".tmp"
+    with open(temporary_file, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(entries),
+                                  len(encoded_corpus)))
+        f.write(encoded_corpus + b"\0" * padding)
+        f.write(struct.pack("<%dI" % len(offsets), *offsets))
+        f.write(bytes(min(frequency_class, 255) for _, frequency_class in entries))
+        f.write(b"".join(word for word, _ in entries))
+
+    os.replace(temporary_file, index_file)
+
+    return len(entries)
+
+
+# Read-only, memory-mapped frequency class index for offline WORD_NOVELTY lookups
+class FrequencyIndex:
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.size, corpus_length = INDEX_HEADER.unpack_from(self.map, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError("%s is not a frequency class index" % path)
+
+        start = INDEX_HEADER.size
+        self.corpus = self.map[start:start + corpus_length].decode("utf-8")
+
+        start += corpus_length + (-(start + corpus_length) % 4)
+        self.offsets = memoryview(self.map)[start:start + 4 *
+                                            (self.size + 1)].cast("I")
+
+        start += 4 * (self.size + 1)
+        self.classes = start
+        self.words = start + self.size
+
+    def word(self, position: int):
+        return self.map[self.words + self.offsets[position]:self.words +
+                        self.offsets[position + 1]]
+
+    # Return the frequency class of a surface form or None if the corpus does not contain it
+    def lookup(self, word: str):
+        key = word.encode("utf-8")
+
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.word(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self.size and self.word(low) == key:
+            return self.map[self.classes + low]
+
+        return None
+
+    def get_many(self, words):
+        return {word: self.lookup(word) for word in words}
+
+    def close(self):
+        # The memory view of the offsets must be released before the memory map can be closed
+        self.offsets.release()
+        self.map.close()
+        self.file.close()
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="build and query local frequency class indexes for WORD_NOVELTY lookups",
+        formatter_class=lambda prog: argparse.RawTextHelpFormatter(
+            prog, max_help_position=120, width=99999))
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser(
+        "build", help="build an index from a corpus word frequency list")
+    build_parser.add_argument("-c",
+                              "--corpus_file",
+                              metavar="CORPUS_FILE",
+                              help="the word frequency list of the corpus (e.g., deu_news_2012_1M-words.txt)",
+                              action="store",
+                              type=str,
+                              required=True,
+                              dest="corpus_file")
+    build_parser.add_argument("-x",
+                              "--index_file",
+                              metavar="INDEX_FILE",
+                              help="the index file (e.g., data/deu_news_2012_1M.index)",
+                              action="store",
+                              type=str,
+                              required=True,
+                              dest="index_file")
+    build_parser.add_argument("--corpus",
+                              metavar="CORPUS",
+                              help="the name of the corpus, derived from the corpus file by default (e.g., deu_news_2012_1M)",
+                              action="store",
+                              type=str,
+                              default=None,
+                              dest="corpus")
+
+    lookup_parser = subparsers.add_parser(
+        "lookup", help="print the frequency classes of words")
+    lookup_parser.add_argument("-x",
+                               "--index_file",
+                               metavar="INDEX_FILE",
+                               help="the index file (e.g., data/deu_news_2012_1M.index)",
+                               action="store",
+                               type=str,
+                               required=True,
+                               dest="index_file")
+    lookup_parser.add_argument("words",
+                               metavar="WORD",
+                               help="the words to look up (e.g., Rosen)",
+                               nargs="+")
+
+    arguments = parser.parse_args()
+
+    if arguments.command == "build":
+        size = build_index(arguments.corpus_file, arguments.index_file,
+                           arguments.corpus)
+        print("%s: %d words indexed" % (arguments.index_file, size),
+              file=sys.stderr)
+    else:
+        index = FrequencyIndex(arguments.index_file)
+
+        for word in arguments.words:
+            frequency_class = index.lookup(word)
+            print("%s\t%s" % (word, "" if frequency_class is None else
+                              frequency_class))
+
+        index.close()
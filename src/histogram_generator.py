@@ -1,8 +1,8 @@
 import argparse
 import csv
-import requests
 import sys
 import pathlib
+import numpy
 import pandas
 
 # The possible creativity scores to create histogram data for
@@ -11,6 +11,136 @@ creativity_scores = [
     "SENTENCE_SIMILARITY", "RHYTHMIC_SCORE", "PHONETIC_SCORE", "TOTAL_SCORE"
 ]
 
+# The columns by which the histogram data can be split
+group_columns = ["subject", "variable"]
+
+
+def is_columnar(input_file: pathlib.Path):
+    return input_file.suffix in (".parquet", ".arrow", ".feather")
+
+
+# Return the names of all columns of a score file without reading its rows
+def read_columns(input_file: pathlib.Path):
+    if input_file.suffix == ".parquet":
+        import pyarrow.parquet
+
+        return pyarrow.parquet.read_schema(input_file).names
+
+    if is_columnar(input_file):
+        import pyarrow
+        import pyarrow.ipc
+
+        with pyarrow.memory_map(str(input_file)) as source:
+            return pyarrow.ipc.open_file(source).schema.names
+
+    return list(pandas.read_csv(input_file, header=0, nrows=0).columns)
+
+
+# Read the given columns of a score file in data frames of at most chunk_size rows
+# Parquet and Arrow IPC files (as written with --output_format) are memory-mapped, so that the other
+# columns are never read from disk
+def read_chunks(input_file: pathlib.Path, columns: list, chunk_size: int):
+    if input_file.suffix == ".parquet":
+        import pyarrow.parquet
+
+        parquet_file = pyarrow.parquet.ParquetFile(input_file, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size,
+                                               columns=columns):
+            yield batch.to_pandas()
+
+    elif is_columnar(input_file):
+        import pyarrow
+        import pyarrow.ipc
+
+        with pyarrow.memory_map(str(input_file)) as source:
+            reader = pyarrow.ipc.open_file(source)
+
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i).select(columns)
+
+                for offset in range(0, batch.num_rows, chunk_size):
+                    yield batch.slice(offset, chunk_size).to_pandas()
+
+    else:
+        # The subjects and variables are read as written (e.g., "00123" or "NA"), not as numbers or missing values
+        yield from pandas.read_csv(input_file,
+                                   header=0,
+                                   usecols=columns,
+                                   dtype={
+                                       column: str
+                                       for column in group_columns
+                                       if column in columns
+                                   },
+                                   keep_default_na=False,
+                                   chunksize=chunk_size)
+
+
+# Count how often a possible score rating has been given to a participant for all possible
+# score classes (from 0 to 20), for several creativity scores and optionally per group at once
+# Scores outside of [0, 20] (including missing and non-integer scores) are not counted but reported
+class ScoreHistograms:
+
+    def __init__(self, scores: list, group_by: str = None):
+        self.scores = scores
+        self.group_by = group_by
+
+        # Index of each group in the counts, in order of appearance
+        self.groups = {}
+
+        # counts[group, score, score class] := histogram data
+        self.counts = numpy.zeros((0 if group_by else 1, len(scores), 21),
+                                  dtype=numpy.int64)
+        self.out_of_range = numpy.zeros(len(scores), dtype=numpy.int64)
+
+    def add(self, data: pandas.DataFrame):
+        group_indexes = numpy.zeros(len(data), dtype=numpy.int64)
+
+        if self.group_by:
+            codes, uniques = pandas.factorize(data[self.group_by])
+
+            # Map the group codes of this chunk to the indexes of all groups so far
+            chunk_groups = numpy.array(
+                [self.groups.setdefault(group, len(self.groups))
+                 for group in uniques],
+                dtype=numpy.int64)
+            group_indexes = chunk_groups[codes]
+
+            if len(self.groups) > len(self.counts):
+                self.counts = numpy.concatenate([
+                    self.counts,
+                    numpy.zeros((len(self.groups) - len(self.counts),
+                                 len(self.scores), 21),
+                                dtype=numpy.int64)
+                ])
+
+        values = numpy.column_stack([
+            pandas.to_numeric(data[score], errors="coerce").to_numpy(
+                dtype=numpy.float64, na_value=numpy.nan)
+            for score in self.scores
+        ])
+
+        valid = (values >= 0) & (values <= 20) & (values == numpy.floor(values))
+        self.out_of_range += len(data) - valid.sum(axis=0)
+
+        # One bincount over all groups and scores, every (group, score, score class) has its own bin
+        bins = (group_indexes[:, None] * len(self.scores) +
+                numpy.arange(len(self.scores))) * 21 + numpy.where(
+                    valid, values, 0).astype(numpy.int64)
+
+        self.counts += numpy.bincount(bins[valid],
+                                      minlength=self.counts.size).reshape(
+                                          self.counts.shape)
+
+    # Yield the groups (sorted) and their histogram data with one row per score class and one column per score
+    def histograms(self):
+        if not self.group_by:
+            yield None, self.counts[0].T
+            return
+
+        for group in sorted(self.groups, key=str):
+            yield group, self.counts[self.groups[group]].T
+
+
 if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser(
@@ -21,7 +151,7 @@ if __name__ == "__main__":
     parser.add_argument("-i",
                         "--input_file",
                         metavar="INPUT_FILE",
-                        help="the input file (e.g., data/de_scores.csv)",
+                        help="the input file, a CSV, Parquet (.parquet) or Arrow IPC (.arrow) file (e.g., data/de_scores.csv)",
                         action="store",
                         type=str,
                         required=True,
@@ -37,36 +167,73 @@ if __name__ == "__main__":
     parser.add_argument("-c",
                         "--creativity_score",
                         metavar="CREATIVITY_SCORE",
-                        help="the creativity score (e.g., RHYTHMIC_SCORE)",
-                        action="store",
+                        help="the creativity scores, all scores of the input file by default (e.g., RHYTHMIC_SCORE TOTAL_SCORE)",
+                        nargs="+",
                         type=str,
-                        required=True,
+                        default=None,
                         choices=creativity_scores,
-                        dest="creativity_score")
+                        dest="creativity_scores")
+    parser.add_argument("-g",
+                        "--group_by",
+                        metavar="GROUP_BY",
+                        help="split the histogram data by subject or variable (e.g., subject)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        choices=group_columns,
+                        dest="group_by")
+    parser.add_argument("--chunk_size",
+                        metavar="CHUNK_SIZE",
+                        help="the number of rows that are read and counted at once (e.g., 1000000)",
+                        action="store",
+                        type=int,
+                        default=1000000,
+                        dest="chunk_size")
 
     arguments = parser.parse_args()
 
-    # Read the input file into a data frame
-    data = pandas.read_csv(pathlib.Path(arguments.input_file).resolve(),
-                           header=0)
+    input_file = pathlib.Path(arguments.input_file).resolve()
 
-    # Stores the relevant column (the one containing the ratings of all participants in the specified
-    # creativity score category, i.e. WORD_NOVELTY)
-    scores_by_category = data[arguments.creativity_score].tolist()
+    selected_scores = arguments.creativity_scores
+    if selected_scores is None:
+        columns = read_columns(input_file)
+        selected_scores = [
+            score for score in creativity_scores if score in columns
+        ]
 
-    # Count how often a possible score rating has been given to a participant for all possible
-    # score classes (from 0 to 20)
-    score_classes = []
-    for i in range(0, 21):
-        # Initialize score_classes with 0
-        score_classes.append(0)
+    # Read only the relevant columns (the ones containing the ratings of all participants in the specified
+    # creativity score categories, i.e. WORD_NOVELTY) chunk by chunk
+    score_histograms = ScoreHistograms(selected_scores, arguments.group_by)
+    for data in read_chunks(
+            input_file,
+        ([arguments.group_by] if arguments.group_by else []) +
+            selected_scores, arguments.chunk_size):
+        score_histograms.add(data)
 
-    for c in scores_by_category:
-        # For each score c that a participant received, count up the respective score class: aka histogram data
-        score_classes[c] += 1
+    for score, out_of_range in zip(selected_scores,
+                                   score_histograms.out_of_range):
+        if out_of_range:
+            print("%s: %d scores outside of [0, 20] not counted" %
+                  (score, out_of_range),
+                  file=sys.stderr)
 
     with open(arguments.output_file, mode='w') as wn_file:
         csv_writer = csv.writer(wn_file, delimiter=',')
 
-        for i in range(0, 21):
-            csv_writer.writerow([str(i), str(score_classes[i])])
+        # A single creativity score without groups is written as rows of score class and count,
+        # otherwise there is one count column per creativity score (and one row per group and score class)
+        if len(selected_scores) == 1 and not arguments.group_by:
+            _, score_classes = next(score_histograms.histograms())
+
+            for i in range(0, 21):
+                csv_writer.writerow([str(i), str(score_classes[i][0])])
+        else:
+            csv_writer.writerow(
+                ([arguments.group_by] if arguments.group_by else []) +
+                ["score"] + selected_scores)
+
+            for group, score_classes in score_histograms.histograms():
+                for i in range(0, 21):
+                    csv_writer.writerow(
+                        ([group] if arguments.group_by else []) + [str(i)] +
+                        [str(count) for count in score_classes[i]])
@@ -1,19 +1,29 @@
+from collections import deque
 from enum import Enum
-from itertools import tee
+from itertools import islice, repeat, tee
 
 import argparse
 import csv
-import pathlib
-import requests
 import sys
-import cologne_phonetics
-import phonetics
-import pylcs
 import termcolor
+import phonetic_cache
+import profiling
 
-# Define WORD_NOVELTY API endpoints
-WORD_NOVELTY_API_DE = "http://api.corpora.uni-leipzig.de/ws/words/deu_news_2012_1M/word/"
-WORD_NOVELTY_API_EN = "http://api.corpora.uni-leipzig.de/ws/words/eng_news_2013_3M/word/"
+from context_backend import ContextBackend, NgramCountStore, ScaleserpBackend
+from fetch_engine import FAILED, FetchEngine, FetchError, RequestPlanner, parse_rate_limits
+from frequency_index import FrequencyIndex
+from rhyme_engine import RhymeTrie
+from score_writer import OUTPUT_FORMATS, OUTPUT_MODES, ColumnarScoreWriter, ScoreWriter
+from scoring_state import ScoringState
+from vocabulary import VocabularyStatistics, relative_occurence
+from word_cache import FrequencyClassCache
+
+# Define WORD_NOVELTY corpora and API endpoints
+WORD_NOVELTY_CORPUS_DE = "deu_news_2012_1M"
+WORD_NOVELTY_CORPUS_EN = "eng_news_2013_3M"
+
+WORD_NOVELTY_API_DE = "http://api.corpora.uni-leipzig.de/ws/words/%s/word/" % WORD_NOVELTY_CORPUS_DE
+WORD_NOVELTY_API_EN = "http://api.corpora.uni-leipzig.de/ws/words/%s/word/" % WORD_NOVELTY_CORPUS_EN
 
 # TODO: To use the CONTEXT_NOVELTY score, replace `827FF4DDC28347C1A13FA45DA7289CE9` with a valid API key from `https://www.scaleserp.com/`
 SCALESERP_API_KEY = "827FF4DDC28347C1A13FA45DA7289CE9"
@@ -41,6 +51,18 @@ class Scores(Enum):
     TOTAL_SCORE = 7
 
 
+# Default creativity score weightings
+# first := weighting factor of individual to total score [0, 1]
+# second := is handled as bonus point {True, False}
+DEFAULT_SCORE_WEIGHT_MAP = {
+    Scores.WORD_NOVELTY: (0.4, False),
+    Scores.CONTEXT_NOVELTY: (0.4, False),
+    Scores.PARTICIPANT_SIMILARITY: (0.1, False),
+    Scores.SENTENCE_SIMILARITY: (0.1, False),
+    Scores.RHYTHMIC_SCORE: (0.1, True),
+    Scores.PHONETIC_SCORE: (0.1, True)
+}
+
 score_color_map = {
     Scores.WORD_NOVELTY: "yellow",
     Scores.CONTEXT_NOVELTY: "yellow",
@@ -59,12 +81,859 @@ def pairwise(iterable):
     return zip(f, s)
 
 
-def novelty_class(num_results: int, num_classes: int, upper_bound: int):
-    while (num_results > upper_bound and num_classes > 1):
-        upper_bound *= 2
-        num_classes -= 1
+# Parse creativity scores with weightings (e.g., WORD_NOVELTY:0.6,CONTEXT_NOVELTY:0.4,RHYTHMIC_SCORE:+0.1)
+# where the optional `+` indicates a bonus point score
+def parse_creativity_scores(creativity_scores: str):
+    # Keep the given order, so that the weighted scores are always accumulated (and rounded) the same way
+    scores_and_weights = dict.fromkeys(filter(None, creativity_scores.split(",")))
+
+    score_weight_map = {}
+
+    for scores_and_weight in scores_and_weights:
+        score, weight = scores_and_weight.split(":")
+
+        is_bonus = weight.startswith("+")
+        if is_bonus:
+            weight = weight[1:]
+
+        score_weight_map[Scores[score]] = (float(weight), is_bonus)
+
+    return score_weight_map
+
+
+# Select the WORD_NOVELTY corpus and API and the CONTEXT_NOVELTY API of a language (default is DE)
+def language_apis(language: str):
+    if language == "EN":
+        return WORD_NOVELTY_CORPUS_EN, WORD_NOVELTY_API_EN, CONTEXT_NOVELTY_API_EN
+
+    return WORD_NOVELTY_CORPUS_DE, WORD_NOVELTY_API_DE, CONTEXT_NOVELTY_API_DE
+
+
+# Determine the word pairs of a sentence that are looked up for the CONTEXT_NOVELTY score
+def context_queries(stripped_sentence: list):
+    # All pairs of consecutive words in the sentence
+    queries = [
+        "\"%s + %s\"" % (first, second)
+        for first, second in pairwise(stripped_sentence)
+    ]
+
+    # The word pairs that do not appear consecutively
+    for indices in [[0, 2], [0, 3], [1, 3]]:
+        queries.append("\"%s * %s\"" % (stripped_sentence[indices[0]],
+                                        stripped_sentence[indices[1]]))
+
+    return queries
+
+
+def fetch_frequency_class(fetch_engine: FetchEngine, word_novelty_api: str,
+                          word: str):
+    try:
+        resp = fetch_engine.get(word_novelty_api + word)
+
+        # Process only successful request responses, unknown words (404) are reported as None
+        if resp.status_code == 200:
+            # The response from api.corpora.uni-leipzig.de contains the key `frequencyClass`
+            # which classifies words based on how frequently they are used in the corpus
+            return resp.json()["frequencyClass"]
+
+        if resp.status_code == 404:
+            return None
+    except (FetchError, ValueError, KeyError):
+        pass
+
+    # Failed lookups (e.g., after all retries or with an invalid response) are reported as FAILED
+    return FAILED
+
+
+# Pre-processing step: Check if a participant's sentence is a valid solution
+def is_valid_sentence(variable: str, sentence: str):
+    stripped_sentence = strip_sentence(sentence)
+
+    # 1. Discard sentences that are not of length 4 (meaning sentences that do not contain exactly 4 words)
+    if len(stripped_sentence) != 4:
+        return False
+
+    # 2. Discard sentences that contain words which do not start with correct letter
+    # according to given variable (i.e. EKEL), regardless of case
+    letters = variable.lower()
+    for word in stripped_sentence:
+        if word[0] not in letters:
+            return False
+
+    return True
+
+
+# Read the input file containing subjects (anonymous participant id), variables (given four letter word),
+# and sentences (participants "creative" solution) and yield only the sentences that are valid solutions
+def read_sentences(input_file: str):
+    with open(input_file, "r") as f:
+        lines = csv.reader(f, delimiter=";")
+        next(lines)
+
+        for line in lines:
+            if len(line) >= 3 and is_valid_sentence(line[1], line[2]):
+                yield line[0], line[1], line[2]
+
+
+# Index pass of streaming mode: Map every pair of subject and variable to the number of its last valid sentence,
+# only the keys are kept in memory, also returns the number of valid sentences
+def last_sentences(input_file: str):
+    last_rows = {}
+    rows = 0
+
+    for subject, variable, _ in read_sentences(input_file):
+        last_rows[(subject, variable)] = rows
+        rows += 1
+
+    return last_rows, rows
+
+
+# Yield only the last sentence of every pair of subject and variable in the order of the input file, like in
+# `group_sentences` a later sentence replaces the earlier one
+def read_last_sentences(input_file: str, last_rows: dict):
+    for row, (subject, variable, sentence) in enumerate(
+            read_sentences(input_file)):
+        if last_rows[(subject, variable)] == row:
+            yield subject, variable, sentence
+
+
+# Group the sentences by subject in the order of their first occurrence, a later sentence of the same subject and
+# variable replaces the earlier one
+def group_sentences(sentences):
+    samples = {}
+
+    for subject, variable, sentence in sentences:
+        if subject not in samples:
+            samples[subject] = {}
+
+        samples[subject][variable] = sentence
+
+    return samples
+
+
+# Eliminate special characters in the beginning or end and split the sentence into lowered words
+def strip_sentence(sentence: str):
+    return sentence.strip(" ,;.:!?").lower().split()
+
+
+# Determine the WORD_NOVELTY score from the frequency classes of the lowered and capitalized words
+def word_novelty_score(stripped_sentence: list, frequency_classes: dict):
+    score = 0
+
+    # Determine the novelty of each word
+    for word in stripped_sentence:
+        lower_word = word.lower()
+        lower_score = sys.maxsize
+        lower_class = frequency_classes[lower_word]
+
+        if lower_class is not None and lower_class is not FAILED:
+            lower_score = min(20, lower_class + 1)
+
+        upper_word = lower_word.capitalize()
+        upper_score = sys.maxsize
+        upper_class = frequency_classes[upper_word]
+
+        if upper_class is not None and upper_class is not FAILED:
+            upper_score = min(20, upper_class + 1)
+
+        # Use the minimum score of both lowered and capitalized word
+        word_score = min(lower_score, upper_score)
+
+        if word_score != sys.maxsize:
+            score += word_score
+
+    # Calculate the arithmetic mean over all individual word frequency scores
+    return int(round(score / 4))
+
+
+# Determine the CONTEXT_NOVELTY score from the novelty classes of the word pairs
+def context_novelty_score(stripped_sentence: list, context_classes: dict):
+    score = 0
+
+    # Sum up the novelty of all consecutive and non-consecutive word pairs in the sentence,
+    # failed lookups do not contribute to the score
+    for query in context_queries(stripped_sentence):
+        if context_classes[query] is not None:
+            score += context_classes[query]
+
+    # Calculate the arithmetic mean over all individual word frequency scores
+    return int(round(score / 6))
+
+
+# Determine the scores of a sentence that are based on failed WORD_NOVELTY or CONTEXT_NOVELTY lookups,
+# failed lookups do not contribute to these scores
+def degraded_scores(stripped_sentence: list, score_weight_map: dict,
+                    frequency_classes: dict, context_classes: dict):
+    degraded = []
+
+    if Scores.WORD_NOVELTY in score_weight_map and any(
+            frequency_classes[form] is FAILED for word in stripped_sentence
+            for form in [word.lower(), word.lower().capitalize()]):
+        degraded.append(Scores.WORD_NOVELTY)
+
+    if Scores.CONTEXT_NOVELTY in score_weight_map and any(
+            context_classes[query] is None
+            for query in context_queries(stripped_sentence)):
+        degraded.append(Scores.CONTEXT_NOVELTY)
+
+    return degraded
+
+
+# Determine the PARTICIPANT_SIMILARITY or SENTENCE_SIMILARITY score
+# `words` is the vocabulary of the sentence's subject or variable, the bounds are the minimum and maximum relative
+# occurrences across all subjects or variables
+# With cohort-wide vocabularies, words the cohort has not seen occur 0 times and are at most as similar as the
+# least used word
+def similarity_score(stripped_sentence: list, words: dict,
+                     min_occurence: float, max_occurence: float):
+    score = 0
+    for word in stripped_sentence:
+        score += relative_occurence(words, word)
 
-    return num_classes
+    # Calculate average score over all 4 words of a sentence, taking the minimum and maximum occurence into account
+    score = 1 - (max(min_occurence, score / 4) - min_occurence) / \
+        max(1, (max_occurence - min_occurence))
+
+    return int(round(score * 20))
+
+
+# Compute the phonetic word representations as pairs of word and sound
+def phonetic_representation(sentence: str, language: str):
+    phonetic_result = []
+    # Eliminate all special characters on the left and right sides
+    stripped_sentence = sentence.strip(" ,;.:!?").lower()
+
+    # The words are encoded one at a time, so that every distinct word is encoded only once per cohort
+    if language == "DE":
+        # In German based on `cologne_phonetics`, which treats hyphens as word breaks
+        for word in stripped_sentence.replace("-", " ").split(" "):
+            phonetic_result.append(
+                phonetic_cache.cached_encode_word(language, word))
+    elif language == "EN":
+        # In English based on `phonetics`
+        for word in stripped_sentence.split(" "):
+            phonetic_result.append(
+                phonetic_cache.cached_encode_word(language, word))
+
+    return phonetic_result
+
+
+# Determine the RHYTHMIC_SCORE from the phonetic word representations
+def rhythmic_score(phonetic_result: list, language: str):
+    score = 0
+
+    # Find the groups of rhyming words and their longest common sound from a trie of the reversed sounds
+    rhyme_trie = RhymeTrie(language)
+    for word, sound in phonetic_result:
+        rhyme_trie.add(word, sound)
+
+    word_groups_to_sounds = rhyme_trie.rhyme_groups()
+
+    # Map the word groups' sounds to a discrete scale from 0 to 20
+    # For each found rhyme, the score consists of two parts:
+    # 1) the length of the rhyme (similar to the number of syllables of a rhyme),
+    # and 2) the number of words that rhyme
+    for word_group, sound in word_groups_to_sounds.items():
+        rhyme_length = len(sound)
+        score += min(20, (rhyme_length * 5) - 5)
+        num_words_in_rhyme = len(word_group)
+        score += min(20, (num_words_in_rhyme - 1) * 5)
+
+    score = min(20, score)
+
+    return int(round(score))
+
+
+# Determine the PHONETIC_SCORE from the phonetic word representations
+def phonetic_score(phonetic_result: list):
+    score = 0
+
+    total_combinations = 0
+    levenstein_score = 0
+    substring_score = 0
+
+    # Iterate over the phonetic word representations in pairs
+    for i in range(len(phonetic_result)):
+        for j in range(i + 1, len(phonetic_result)):
+            total_combinations += 1
+
+            (word1, sound1) = phonetic_result[i]
+            (word2, sound2) = phonetic_result[j]
+
+            # Compute the Levenshtein distance and the longest substring between the two representations
+            # Both are symmetric, so the pair of sounds is memoized in a fixed order
+            levenstein_distance, longest_substr_len = (
+                phonetic_cache.cached_sound_distances(min(sound1, sound2),
+                                                      max(sound1, sound2)))
+
+            # Normalize the Levenshtein distance score using the lenght of the longer representation
+            levenstein_score += levenstein_distance / max(
+                len(sound1), len(sound2))
+
+            # Normalize the longest substring score using the lenght of the shorter representation
+            substring_score += longest_substr_len / min(
+                len(sound1), len(sound2))
+
+    # Map both partial phonetic scores to a scale from 0 to 20
+    score += 0.5 * ((1 - (levenstein_score / total_combinations)) * 20)
+    score += 0.5 * ((substring_score / total_combinations) * 20)
+
+    return int(round(score))
+
+
+# Determine the TOTAL_SCORE from the individual scores of a sentence
+def total_score(sentence_scores: dict, score_weight_map: dict):
+    regular_total_score = 0.0
+    bonus_total_score = 0.0
+
+    # Consider all scores and whether they are provide bonus points
+    for score, weight_and_bonus in score_weight_map.items():
+        weight, is_bonus = weight_and_bonus
+
+        # Accumulate the partial total scores
+        if is_bonus:
+            bonus_total_score += weight * sentence_scores[score]
+        else:
+            regular_total_score += weight * sentence_scores[score]
+
+    # Calculate the total score with a maximum of 20
+    return min(20,
+               int(round(regular_total_score)) + int(round(bonus_total_score)))
+
+
+# Determine all selected creativity scores of a single sentence
+# frequency_classes and context_classes hold the resolved WORD_NOVELTY and CONTEXT_NOVELTY lookups,
+# similarity optionally holds the precomputed PARTICIPANT_SIMILARITY and SENTENCE_SIMILARITY scores
+def score_sentence(subject: str,
+                   variable: str,
+                   sentence: str,
+                   score_weight_map: dict,
+                   language: str,
+                   frequency_classes: dict,
+                   context_classes: dict,
+                   vocabulary: VocabularyStatistics,
+                   similarity: tuple = None,
+                   stripped_sentence: list = None):
+    sentence_scores = {}
+
+    if stripped_sentence is None:
+        stripped_sentence = strip_sentence(sentence)
+
+    if Scores.WORD_NOVELTY in score_weight_map:
+        with profiling.timer("score", Scores.WORD_NOVELTY.name):
+            sentence_scores[Scores.WORD_NOVELTY] = word_novelty_score(
+                stripped_sentence, frequency_classes)
+
+    if Scores.CONTEXT_NOVELTY in score_weight_map:
+        with profiling.timer("score", Scores.CONTEXT_NOVELTY.name):
+            sentence_scores[Scores.CONTEXT_NOVELTY] = context_novelty_score(
+                stripped_sentence, context_classes)
+
+    # Score is calculated based on how often the participant (subject) has used the same word
+    if Scores.PARTICIPANT_SIMILARITY in score_weight_map and similarity is not None:
+        sentence_scores[Scores.PARTICIPANT_SIMILARITY] = similarity[0]
+    elif Scores.PARTICIPANT_SIMILARITY in score_weight_map:
+        with profiling.timer("score", Scores.PARTICIPANT_SIMILARITY.name):
+            sentence_scores[Scores.PARTICIPANT_SIMILARITY] = similarity_score(
+                stripped_sentence, vocabulary.subject_vocabulary.get(subject, {}),
+                vocabulary.min_subject_occurence,
+                vocabulary.max_subject_occurence)
+
+    # Score is calculated based on how often other participants have used the same word as a solution
+    # to this specific four-letter word puzzle (variable)
+    if Scores.SENTENCE_SIMILARITY in score_weight_map and similarity is not None:
+        sentence_scores[Scores.SENTENCE_SIMILARITY] = similarity[1]
+    elif Scores.SENTENCE_SIMILARITY in score_weight_map:
+        with profiling.timer("score", Scores.SENTENCE_SIMILARITY.name):
+            sentence_scores[Scores.SENTENCE_SIMILARITY] = similarity_score(
+                stripped_sentence, vocabulary.variable_vocabulary.get(variable, {}),
+                vocabulary.min_variable_occurence,
+                vocabulary.max_variable_occurence)
+
+    if Scores.RHYTHMIC_SCORE in score_weight_map or Scores.PHONETIC_SCORE in score_weight_map:
+        # The phonetic word representations are shared by the RHYTHMIC_SCORE and PHONETIC_SCORE
+        with profiling.timer("stage", "phonetic_representation"):
+            phonetic_result = phonetic_representation(sentence, language)
+
+        if Scores.RHYTHMIC_SCORE in score_weight_map:
+            with profiling.timer("score", Scores.RHYTHMIC_SCORE.name):
+                sentence_scores[Scores.RHYTHMIC_SCORE] = rhythmic_score(
+                    phonetic_result, language)
+
+        if Scores.PHONETIC_SCORE in score_weight_map:
+            with profiling.timer("score", Scores.PHONETIC_SCORE.name):
+                sentence_scores[Scores.PHONETIC_SCORE] = phonetic_score(
+                    phonetic_result)
+
+    sentence_scores[Scores.TOTAL_SCORE] = total_score(sentence_scores,
+                                                      score_weight_map)
+
+    return sentence_scores
+
+
+# State shared with every scoring worker process once, instead of with every chunk of sentences
+worker_state = None
+
+
+def init_scoring_worker(phonetic_cache_size: int, profile: bool,
+                        state: tuple):
+    global worker_state
+    worker_state = state
+
+    phonetic_cache.configure_phonetic_caches(phonetic_cache_size)
+
+    if profile:
+        profiling.enable()
+
+
+# Score a chunk of sentences in a worker process and hand the recorded profiling metrics back to the parent
+def score_chunk(chunk: list):
+    chunk_scores = [
+        score_sentence(subject, variable, sentence, *worker_state, similarity,
+                       stripped_sentence)
+        for (subject, variable, sentence), similarity, stripped_sentence in chunk
+    ]
+
+    return chunk_scores, profiling.collect()
+
+
+# Second pass over the sentences: Determine the creativity scores of all sentences in order
+# Yields the scores of each sentence, with more than one worker the sentences are scored in chunks by a process pool
+# similarity optionally holds the precomputed similarity scores of each sentence in order and token_table the
+# words of each sentence (see `TokenTable`)
+def score_sentences(sentences,
+                    score_weight_map: dict,
+                    language: str,
+                    frequency_classes: dict,
+                    context_classes: dict,
+                    vocabulary: VocabularyStatistics,
+                    workers: int = 1,
+                    chunk_size: int = 256,
+                    similarity=None,
+                    token_table: dict = None):
+    state = (score_weight_map, language, frequency_classes, context_classes,
+             vocabulary)
+
+    sentences = ((sentence, similarity,
+                  token_table[sentence[2]] if token_table is not None else None)
+                 for sentence, similarity in zip(
+                     sentences,
+                     similarity if similarity is not None else repeat(None)))
+
+    if workers <= 1:
+        for (subject, variable,
+             sentence), similarity, stripped_sentence in sentences:
+            yield score_sentence(subject, variable, sentence, *state,
+                                 similarity, stripped_sentence)
+
+        return
+
+    # The workers memoize phonetic encodings and distances with the same cache size as this process
+    phonetic_cache_size = phonetic_cache.cached_encode_word.cache_parameters(
+    )["maxsize"]
+
+    # Imported only here, process pools are expensive to import and most runs use a single process
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=init_scoring_worker,
+                             initargs=(phonetic_cache_size,
+                                       profiling.enabled,
+                                       state)) as executor:
+        # Keep a bounded number of chunks in flight, so that streaming inputs are not read ahead completely
+        pending = deque()
+
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(sentences, chunk_size))
+                if not chunk:
+                    break
+
+                pending.append(executor.submit(score_chunk, chunk))
+
+            if not pending:
+                break
+
+            # Merge the results in the original order of the sentences
+            chunk_scores, metrics = pending.popleft().result()
+            profiling.merge(metrics)
+
+            yield from chunk_scores
+
+
+# First pass over the sentences: Build the vocabularies and collect all lookups of the WORD_NOVELTY and
+# CONTEXT_NOVELTY scores, every distinct lookup is requested only once and shared by all sentences that contain it
+# The vocabularies can be skipped if the similarity scores are computed by the vectorized similarity engine
+# token_table optionally holds the words of each sentence (see `TokenTable`)
+def collect_statistics(sentences,
+                       score_weight_map: dict,
+                       build_vocabulary: bool = True,
+                       token_table: dict = None):
+    vocabulary = VocabularyStatistics()
+    word_planner = RequestPlanner()
+    context_planner = RequestPlanner()
+
+    for subject, variable, sentence in sentences:
+        if token_table is not None:
+            stripped_sentence = token_table[sentence]
+        else:
+            stripped_sentence = strip_sentence(sentence)
+
+        if build_vocabulary:
+            vocabulary.add(subject, variable, stripped_sentence)
+
+        if Scores.WORD_NOVELTY in score_weight_map:
+            # Both the lowered and the capitalized form of every word are looked up
+            for word in stripped_sentence:
+                word_planner.add(word)
+                word_planner.add(word.capitalize())
+
+        if Scores.CONTEXT_NOVELTY in score_weight_map:
+            for query in context_queries(stripped_sentence):
+                context_planner.add(query)
+
+    vocabulary.finalize()
+
+    return vocabulary, word_planner, context_planner
+
+
+# Fetch step: Resolve all planned lookups concurrently before scoring
+# Returns the frequency classes of all words and the novelty classes of all word pairs
+def resolve_lookups(word_planner: RequestPlanner,
+                    context_planner: RequestPlanner,
+                    language: str,
+                    fetch_engine: FetchEngine,
+                    word_cache: FrequencyClassCache = None,
+                    frequency_index: FrequencyIndex = None,
+                    context_backend: ContextBackend = None):
+    word_novelty_corpus, word_novelty_api, context_novelty_api = language_apis(
+        language)
+
+    def fetch_frequency_classes(words):
+        return fetch_engine.resolve(
+            words, lambda word: fetch_frequency_class(fetch_engine,
+                                                      word_novelty_api, word))
+
+    # A local frequency class index answers all WORD_NOVELTY lookups without any requests
+    if frequency_index is not None:
+        frequency_classes = frequency_index.get_many(word_planner.keys())
+    elif word_cache is None:
+        frequency_classes = fetch_frequency_classes(word_planner.keys())
+    else:
+        frequency_classes = word_cache.get_many(word_novelty_corpus,
+                                                word_planner.keys(),
+                                                fetch_frequency_classes)
+
+    # The CONTEXT_NOVELTY queries are counted by scaleserp.com unless another context count backend is given
+    if context_backend is None:
+        context_backend = ScaleserpBackend(fetch_engine, context_novelty_api)
+
+    context_classes = context_backend.resolve(context_planner.keys())
+
+    return frequency_classes, context_classes
+
+
+# Resolve only the planned lookups that are not yet (successfully) in the known frequency and context classes
+# and add them
+# Returns the newly resolved frequency classes and context classes
+def resolve_missing_lookups(word_planner: RequestPlanner,
+                            context_planner: RequestPlanner,
+                            frequency_classes: dict,
+                            context_classes: dict,
+                            language: str,
+                            fetch_engine: FetchEngine,
+                            word_cache: FrequencyClassCache = None,
+                            frequency_index: FrequencyIndex = None,
+                            context_backend: ContextBackend = None):
+    # Failed lookups are retried
+    missing_word_planner = RequestPlanner()
+    for word in word_planner.keys():
+        if frequency_classes.get(word, FAILED) is FAILED:
+            missing_word_planner.add(word)
+
+    missing_context_planner = RequestPlanner()
+    for query in context_planner.keys():
+        if context_classes.get(query) is None:
+            missing_context_planner.add(query)
+
+    new_frequency_classes, new_context_classes = resolve_lookups(
+        missing_word_planner, missing_context_planner, language, fetch_engine,
+        word_cache, frequency_index, context_backend)
+
+    frequency_classes.update(new_frequency_classes)
+    context_classes.update(new_context_classes)
+
+    return new_frequency_classes, new_context_classes
+
+
+# Incremental scoring: Score only the new or revised sentences of a cohort with the scores, lookups and vocabularies
+# of the previous runs in the scoring state, the similarity scores of the other sentences are only recomputed if
+# the vocabulary of their subject or variable (or the bounds across all vocabularies) has changed
+# The (subject, variable) pairs must be unique, the result holds the scores of each sentence in order and the
+# number of scored, updated and reused sentences
+def score_incrementally(sentences,
+                        score_weight_map: dict,
+                        language: str,
+                        scoring_state: ScoringState,
+                        fetch_engine: FetchEngine,
+                        word_cache: FrequencyClassCache = None,
+                        frequency_index: FrequencyIndex = None,
+                        context_backend: ContextBackend = None,
+                        workers: int = 1,
+                        lookup_sources: dict = None):
+    sentences = list(sentences)
+
+    # The stored scores are only valid for the same creativity scores and the lookups for the same language and
+    # lookup sources (e.g., a frequency class index instead of the API)
+    settings = {
+        "language": language,
+        "scores": ",".join(sorted(score.name for score in score_weight_map))
+    }
+    for kind, source in (lookup_sources or {}).items():
+        settings["%s_lookups" % kind] = source
+
+    # The stored WORD_NOVELTY and CONTEXT_NOVELTY scores are based on the stored lookups, so that the sentences are
+    # scored again whenever the lookups are discarded
+    lookups_changed = any(
+        scoring_state.setting(key) != value
+        for key, value in settings.items() if key != "scores")
+    if lookups_changed:
+        scoring_state.clear_lookups()
+
+    if lookups_changed or scoring_state.setting("scores") != settings["scores"]:
+        scoring_state.clear_sentences()
+
+    previous_sentences = scoring_state.sentences()
+    vocabulary = scoring_state.vocabulary()
+    frequency_classes = scoring_state.lookups("word")
+    context_classes = scoring_state.lookups("context")
+
+    # Take back the revised and removed sentences and add the new and revised ones
+    current_sentences = {(subject, variable): sentence
+                         for subject, variable, sentence in sentences}
+    subjects = set()
+    variables = set()
+
+    # Sentences with degraded scores (based on failed lookups) are scored again like revised sentences
+    stale_sentences = set()
+    removed_sentences = []
+    for (subject, variable), (sentence, scores) in previous_sentences.items():
+        if current_sentences.get((subject, variable)) != sentence or "DEGRADED" in scores:
+            vocabulary.remove(subject, variable, strip_sentence(sentence))
+            subjects.add(subject)
+            variables.add(variable)
+            stale_sentences.add((subject, variable))
+
+            if (subject, variable) not in current_sentences:
+                removed_sentences.append((subject, variable))
+
+    new_sentences = [(subject, variable, sentence)
+                     for subject, variable, sentence in sentences
+                     if (subject, variable) not in previous_sentences
+                     or (subject, variable) in stale_sentences]
+
+    for subject, variable, sentence in new_sentences:
+        vocabulary.add(subject, variable, strip_sentence(sentence))
+        subjects.add(subject)
+        variables.add(variable)
+
+    subject_bounds = (vocabulary.max_subject_occurence,
+                      vocabulary.min_subject_occurence)
+    variable_bounds = (vocabulary.max_variable_occurence,
+                       vocabulary.min_variable_occurence)
+
+    vocabulary.finalize(subjects, variables)
+
+    # A change of the bounds affects the similarity scores of all sentences
+    all_subjects = subject_bounds != (vocabulary.max_subject_occurence,
+                                      vocabulary.min_subject_occurence)
+    all_variables = variable_bounds != (vocabulary.max_variable_occurence,
+                                        vocabulary.min_variable_occurence)
+
+    # Resolve only the lookups of the new sentences that are not known from the previous runs
+    _, word_planner, context_planner = collect_statistics(
+        new_sentences, score_weight_map, build_vocabulary=False)
+
+    new_frequency_classes, new_context_classes = resolve_missing_lookups(
+        word_planner, context_planner, frequency_classes, context_classes,
+        language, fetch_engine, word_cache, frequency_index, context_backend)
+
+    new_scores = dict(
+        zip(((subject, variable)
+             for subject, variable, _ in new_sentences),
+            score_sentences(new_sentences,
+                            score_weight_map,
+                            language,
+                            frequency_classes,
+                            context_classes,
+                            vocabulary,
+                            workers=workers)))
+
+    all_sentence_scores = []
+    changed_sentences = {}
+    statistics = {
+        "scored": len(new_sentences),
+        "updated": 0,
+        "reused": 0,
+        "degraded": {}
+    }
+
+    for subject, variable, sentence in sentences:
+        sentence_scores = new_scores.get((subject, variable))
+        degraded = []
+
+        if sentence_scores is not None:
+            degraded = degraded_scores(strip_sentence(sentence),
+                                       score_weight_map, frequency_classes,
+                                       context_classes)
+            if degraded:
+                statistics["degraded"][(subject, variable)] = degraded
+
+            updated = True
+        else:
+            sentence_scores = {
+                Scores[name]: value
+                for name, value in previous_sentences[(subject,
+                                                       variable)][1].items()
+            }
+            stripped_sentence = strip_sentence(sentence)
+            updated = False
+
+            if Scores.PARTICIPANT_SIMILARITY in score_weight_map and (
+                    all_subjects or subject in subjects):
+                sentence_scores[Scores.PARTICIPANT_SIMILARITY] = similarity_score(
+                    stripped_sentence, vocabulary.subject_vocabulary[subject],
+                    vocabulary.min_subject_occurence,
+                    vocabulary.max_subject_occurence)
+                updated = True
+
+            if Scores.SENTENCE_SIMILARITY in score_weight_map and (
+                    all_variables or variable in variables):
+                sentence_scores[Scores.SENTENCE_SIMILARITY] = similarity_score(
+                    stripped_sentence,
+                    vocabulary.variable_vocabulary[variable],
+                    vocabulary.min_variable_occurence,
+                    vocabulary.max_variable_occurence)
+                updated = True
+
+            # The weightings may have changed since the previous run
+            sentence_scores[Scores.TOTAL_SCORE] = total_score(
+                sentence_scores, score_weight_map)
+
+            statistics["updated" if updated else "reused"] += 1
+
+        all_sentence_scores.append(sentence_scores)
+
+        # Store the component scores of new sentences and of sentences with updated similarity scores,
+        # sentences with degraded scores are marked to be scored again in the next run
+        if updated:
+            stored_scores = {
+                score.name: value
+                for score, value in sentence_scores.items()
+                if score != Scores.TOTAL_SCORE
+            }
+            if degraded:
+                stored_scores["DEGRADED"] = [score.name for score in degraded]
+
+            changed_sentences[(subject, variable)] = (sentence, stored_scores)
+
+    scoring_state.save(
+        settings, {
+            "word": {
+                word: frequency_class
+                for word, frequency_class in new_frequency_classes.items()
+                if frequency_class is not FAILED
+            },
+            "context": {
+                query: context_class
+                for query, context_class in new_context_classes.items()
+                if context_class is not None
+            }
+        }, changed_sentences, removed_sentences, vocabulary, subjects,
+        variables)
+
+    return all_sentence_scores, statistics
+
+
+# Determine the creativity scores of a batch of (subject, variable, sentence) triples in memory
+# The similarity scores are relative to the vocabularies of the batch unless cohort-wide vocabulary statistics
+# are given, the result holds the scores of each sentence in order or None for sentences that are not valid solutions
+def score_batch(sentences,
+                weights=None,
+                language: str = "DE",
+                vocabulary: VocabularyStatistics = None,
+                fetch_engine: FetchEngine = None,
+                word_cache: FrequencyClassCache = None,
+                vectorized: bool = False,
+                frequency_index: FrequencyIndex = None,
+                context_backend: ContextBackend = None):
+    # The weights are either a map from score to (weight, is_bonus) or a string of creativity scores with weightings
+    score_weight_map = DEFAULT_SCORE_WEIGHT_MAP
+    if isinstance(weights, str):
+        score_weight_map = parse_creativity_scores(weights)
+    elif weights is not None:
+        score_weight_map = weights
+
+    sentences = list(sentences)
+    valid_sentences = [(subject, variable, sentence)
+                       for subject, variable, sentence in sentences
+                       if is_valid_sentence(variable, sentence)]
+
+    # Optionally, compute the similarity scores of the whole batch with array operations
+    similarity = None
+    if vectorized and vocabulary is None:
+        from similarity_engine import similarity_scores
+
+        similarity = iter(
+            similarity_scores((subject, variable, strip_sentence(sentence))
+                              for subject, variable, sentence in valid_sentences))
+
+    batch_vocabulary, word_planner, context_planner = collect_statistics(
+        valid_sentences, score_weight_map, build_vocabulary=similarity is None)
+
+    if vocabulary is None:
+        vocabulary = batch_vocabulary
+
+    # Long-lived callers pass their own fetch engine to reuse its pooled sessions across batches
+    own_fetch_engine = fetch_engine is None
+    if own_fetch_engine:
+        fetch_engine = FetchEngine()
+
+    frequency_classes, context_classes = resolve_lookups(
+        word_planner, context_planner, language, fetch_engine, word_cache,
+        frequency_index, context_backend)
+
+    if own_fetch_engine:
+        fetch_engine.close()
+
+    return [
+        score_sentence(subject, variable, sentence, score_weight_map, language,
+                       frequency_classes, context_classes, vocabulary,
+                       next(similarity) if similarity is not None else None)
+        if is_valid_sentence(variable, sentence) else None
+        for subject, variable, sentence in sentences
+    ]
+
+
+# Determine the creativity scores of a single sentence, see score_batch
+def score_one(subject: str,
+              variable: str,
+              sentence: str,
+              weights=None,
+              language: str = "DE",
+              vocabulary: VocabularyStatistics = None,
+              fetch_engine: FetchEngine = None,
+              word_cache: FrequencyClassCache = None,
+              frequency_index: FrequencyIndex = None,
+              context_backend: ContextBackend = None):
+    return score_batch([(subject, variable, sentence)],
+                       weights,
+                       language,
+                       vocabulary,
+                       fetch_engine,
+                       word_cache,
+                       frequency_index=frequency_index,
+                       context_backend=context_backend)[0]
 
 
 if __name__ == "__main__":
@@ -90,6 +959,13 @@ if __name__ == "__main__":
                         type=str,
                         default=None,
                         dest="output_file")
+    parser.add_argument("--rejects_file",
+                        metavar="REJECTS_FILE",
+                        help="the file the rows that are not valid solutions are written to with the reason (e.g., data/de_rejects.csv)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="rejects_file")
     parser.add_argument(
         "-s",
         "--creativity_scores",
@@ -100,6 +976,14 @@ if __name__ == "__main__":
         type=str,
         default=None,
         dest="creativity_scores")
+    parser.add_argument("-w",
+                        "--weight_profile",
+                        metavar="WEIGHT_PROFILE",
+                        help="a named profile of creativity scores with weightings with its own TOTAL_SCORE column, may be given several times (e.g., novelty=WORD_NOVELTY:0.5,CONTEXT_NOVELTY:0.5)",
+                        action="append",
+                        type=str,
+                        default=[],
+                        dest="weight_profiles")
     parser.add_argument("-l",
                         "--language",
                         metavar="LANGUAGE",
@@ -108,461 +992,547 @@ if __name__ == "__main__":
                         type=str,
                         default="DE",
                         dest="language")
+    parser.add_argument("--cache_file",
+                        metavar="CACHE_FILE",
+                        help="the persistent cache file for WORD_NOVELTY lookups (e.g., data/word_cache.sqlite)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="cache_file")
+    parser.add_argument("--cache_ttl",
+                        metavar="CACHE_TTL",
+                        help="the time-to-live of cached WORD_NOVELTY lookups in days (e.g., 30)",
+                        action="store",
+                        type=float,
+                        default=None,
+                        dest="cache_ttl")
+    parser.add_argument("--cache_size",
+                        metavar="CACHE_SIZE",
+                        help="the maximum number of cached WORD_NOVELTY lookups (e.g., 1000000)",
+                        action="store",
+                        type=int,
+                        default=1000000,
+                        dest="cache_size")
+    parser.add_argument("--offline",
+                        help="answer WORD_NOVELTY lookups from the cache file only",
+                        action="store_true",
+                        dest="offline")
+    parser.add_argument("--frequency_index",
+                        metavar="FREQUENCY_INDEX",
+                        help="the local frequency class index that answers all WORD_NOVELTY lookups (e.g., data/deu_news_2012_1M.index)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="frequency_index")
+    parser.add_argument("--context_counts",
+                        metavar="CONTEXT_COUNTS",
+                        help="the local pair count store that answers all CONTEXT_NOVELTY lookups instead of scaleserp.com (e.g., data/deu_news_2012_1M.pairs)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="context_counts")
+    parser.add_argument("--context_upper_bound",
+                        metavar="CONTEXT_UPPER_BOUND",
+                        help="the number of occurrences in the pair count store up to which a word pair is most novel (e.g., 1)",
+                        action="store",
+                        type=int,
+                        default=1,
+                        dest="context_upper_bound")
+    parser.add_argument("--state_file",
+                        metavar="STATE_FILE",
+                        help="the state file of incremental runs, only new or revised sentences are scored (e.g., data/de_state.sqlite)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="state_file")
+    parser.add_argument("--fetch_workers",
+                        metavar="FETCH_WORKERS",
+                        help="the number of concurrent WORD_NOVELTY and CONTEXT_NOVELTY lookups (e.g., 8)",
+                        action="store",
+                        type=int,
+                        default=8,
+                        dest="fetch_workers")
+    parser.add_argument("--rate_limits",
+                        metavar="RATE_LIMITS",
+                        help="the maximum requests per second per API host (e.g., api.scaleserp.com:5,api.corpora.uni-leipzig.de:20)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="rate_limits")
+    parser.add_argument("--timeout",
+                        metavar="TIMEOUT",
+                        help="the timeout of WORD_NOVELTY and CONTEXT_NOVELTY requests in seconds (e.g., 30)",
+                        action="store",
+                        type=float,
+                        default=30.0,
+                        dest="timeout")
+    parser.add_argument("--max_retries",
+                        metavar="MAX_RETRIES",
+                        help="the maximum number of retries of failed WORD_NOVELTY and CONTEXT_NOVELTY requests (e.g., 3)",
+                        action="store",
+                        type=int,
+                        default=3,
+                        dest="max_retries")
+    parser.add_argument("--degraded_column",
+                        help="add a DEGRADED_SCORES column with the scores of each sentence that are based on failed lookups",
+                        action="store_true",
+                        dest="degraded_column")
+    parser.add_argument("--streaming",
+                        help="read the input file once per pass instead of keeping it in memory and score one sentence at a time, in the order of the input file instead of grouped by subject",
+                        action="store_true",
+                        dest="streaming")
+    parser.add_argument("--output_mode",
+                        metavar="OUTPUT_MODE",
+                        help="how to open an existing output file (e.g., truncate)",
+                        action="store",
+                        type=str,
+                        default="truncate",
+                        choices=OUTPUT_MODES,
+                        dest="output_mode")
+    parser.add_argument("--output_format",
+                        metavar="OUTPUT_FORMAT",
+                        help="the format of the output file, parquet and arrow require pyarrow (e.g., parquet)",
+                        action="store",
+                        type=str,
+                        default="csv",
+                        choices=OUTPUT_FORMATS,
+                        dest="output_format")
+    parser.add_argument("--flush_interval",
+                        metavar="FLUSH_INTERVAL",
+                        help="flush the output file to disk after this many sentences (e.g., 1000)",
+                        action="store",
+                        type=int,
+                        default=0,
+                        dest="flush_interval")
+    parser.add_argument("--workers",
+                        metavar="WORKERS",
+                        help="the number of processes that compute the scores in parallel (e.g., 4)",
+                        action="store",
+                        type=int,
+                        default=1,
+                        dest="workers")
+    parser.add_argument("--phonetic_cache_size",
+                        metavar="PHONETIC_CACHE_SIZE",
+                        help="the maximum number of memoized phonetic encodings and distances (e.g., 100000)",
+                        action="store",
+                        type=int,
+                        default=100000,
+                        dest="phonetic_cache_size")
+    parser.add_argument("--vectorized_similarity",
+                        help="compute the PARTICIPANT_SIMILARITY and SENTENCE_SIMILARITY scores of all sentences with NumPy array operations",
+                        action="store_true",
+                        dest="vectorized_similarity")
+    parser.add_argument("--cohort_statistics",
+                        metavar="COHORT_STATISTICS",
+                        help="the statistics of the whole cohort (see cohort_statistics.py) if the input file holds one shard of it (e.g., data/de.statistics)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="cohort_statistics")
+    parser.add_argument("--profile",
+                        help="record wall times, call counts and latency histograms per stage, score and API endpoint",
+                        action="store_true",
+                        dest="profile")
+    parser.add_argument("--profile_format",
+                        metavar="PROFILE_FORMAT",
+                        help="the format of the profiling report (e.g., json)",
+                        action="store",
+                        type=str,
+                        default="json",
+                        choices=["json", "prometheus"],
+                        dest="profile_format")
+    parser.add_argument("--profile_file",
+                        metavar="PROFILE_FILE",
+                        help="the file the profiling report is written to (e.g., profile.json)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="profile_file")
 
     arguments = parser.parse_args()
 
-    # Create default creativity score weightings
-    # first := weighting factor of individual to total score [0, 1]
-    # second := is handled as bonus point {True, False}
-    score_weight_map = {
-        Scores.WORD_NOVELTY: (0.4, False),
-        Scores.CONTEXT_NOVELTY: (0.4, False),
-        Scores.PARTICIPANT_SIMILARITY: (0.1, False),
-        Scores.SENTENCE_SIMILARITY: (0.1, False),
-        Scores.RHYTHMIC_SCORE: (0.1, True),
-        Scores.PHONETIC_SCORE: (0.1, True)
-    }
-
-    # Set adjusted creativity score weightings if the user specified custom score weightings via command line interface
+    if arguments.offline and not arguments.cache_file:
+        parser.error("--offline requires --cache_file")
+
+    if arguments.vectorized_similarity and arguments.streaming:
+        parser.error("--vectorized_similarity cannot be combined with --streaming")
+
+    if arguments.rejects_file and arguments.streaming:
+        parser.error("--rejects_file cannot be combined with --streaming")
+
+    if arguments.state_file and (arguments.streaming
+                                 or arguments.vectorized_similarity):
+        parser.error(
+            "--state_file cannot be combined with --streaming or --vectorized_similarity"
+        )
+
+    if arguments.cohort_statistics and (arguments.state_file
+                                        or arguments.vectorized_similarity):
+        parser.error(
+            "--cohort_statistics cannot be combined with --state_file or --vectorized_similarity"
+        )
+
+    if arguments.output_format != "csv":
+        if not arguments.output_file:
+            parser.error("--output_format %s requires --output_file" %
+                         arguments.output_format)
+
+        if arguments.output_mode == "append":
+            parser.error("--output_format %s cannot be combined with --output_mode append" %
+                         arguments.output_format)
+
+    if arguments.frequency_index and arguments.cache_file:
+        parser.error("--frequency_index cannot be combined with --cache_file")
+
+    # Optionally, answer WORD_NOVELTY lookups from a persistent cache
+    word_cache = None
+    if arguments.cache_file:
+        word_cache = FrequencyClassCache(
+            arguments.cache_file,
+            ttl=arguments.cache_ttl * 86400
+            if arguments.cache_ttl is not None else None,
+            max_entries=arguments.cache_size,
+            offline=arguments.offline)
+
+    # Optionally, answer WORD_NOVELTY lookups from a local frequency class index
+    frequency_index = None
+    if arguments.frequency_index:
+        frequency_index = FrequencyIndex(arguments.frequency_index)
+
+        if frequency_index.corpus != language_apis(arguments.language)[0]:
+            print("warning: the frequency class index was built from %s" %
+                  frequency_index.corpus,
+                  file=sys.stderr)
+
+    # Optionally, count the CONTEXT_NOVELTY queries in a local pair count store
+    context_backend = None
+    if arguments.context_counts:
+        context_backend = NgramCountStore(
+            arguments.context_counts,
+            upper_bound=arguments.context_upper_bound)
+
+    # Optionally, use the precomputed vocabularies of the whole cohort, memory-mapped
+    cohort_statistics = None
+    if arguments.cohort_statistics:
+        from cohort_statistics import CohortStatistics
+
+        cohort_statistics = CohortStatistics(arguments.cohort_statistics)
+
+    # Optionally, keep the scores, lookups and vocabularies across runs
+    scoring_state = None
+    if arguments.state_file:
+        scoring_state = ScoringState(arguments.state_file)
+
+    phonetic_cache.configure_phonetic_caches(arguments.phonetic_cache_size)
+
+    if arguments.profile:
+        profiling.enable()
+
+    fetch_engine = FetchEngine(
+        max_workers=arguments.fetch_workers,
+        host_rates=parse_rate_limits(arguments.rate_limits)
+        if arguments.rate_limits else None,
+        timeout=arguments.timeout,
+        max_retries=arguments.max_retries)
+
+    # Use the default creativity score weightings unless the user specified custom score weightings
+    # via command line interface
+    score_weight_map = DEFAULT_SCORE_WEIGHT_MAP
     if arguments.creativity_scores:
-        scores_and_weights = set(
-            filter(None, arguments.creativity_scores.split(",")))
-
-        score_weight_map = {}
+        score_weight_map = parse_creativity_scores(arguments.creativity_scores)
 
-        for scores_and_weight in scores_and_weights:
-            score, weight = scores_and_weight.split(":")
+    # Optionally, derive the TOTAL_SCORE of further weight profiles from the same component scores
+    weight_profiles = {}
+    if arguments.weight_profiles:
+        from weight_profiles import parse_weight_profiles, profile_total_scores
 
-            is_bonus = weight.startswith("+")
-            if is_bonus:
-                weight = weight[1:]
+        weight_profiles = parse_weight_profiles(arguments.weight_profiles,
+                                                parse_creativity_scores)
 
-            score_weight_map[Scores[score]] = (float(weight), is_bonus)
-
-    # Read input file containing subjects (anonymous participant id), variables (given four letter word),
-    # and sentences (participants "creative" solution)
-    lines = csv.reader(open(arguments.input_file, "r"), delimiter=";")
-    next(lines)
+    # The component scores of all weight profiles are computed once
+    component_weight_map = dict(score_weight_map)
+    for profile in weight_profiles.values():
+        for score, weight_and_bonus in profile.items():
+            component_weight_map.setdefault(score, weight_and_bonus)
 
+    # Read the input file, either once into memory and split into words once or, in streaming mode, once per pass
     samples = {}
-    scores = {}
-
-    # Pre-processing step: Check if the participants' sentences are valid solutions
-    for line in lines:
-        stripped_sentence = line[2].strip(" ,;.:!?").upper().split()
+    token_table = None
+    if not arguments.streaming:
+        from preprocessing import TokenTable
+
+        with profiling.timer("stage", "preprocess"):
+            table = TokenTable(arguments.input_file)
+            samples = group_sentences(table.valid_sentences())
+            token_table = table.tokens
+
+        reject_counts = table.reject_counts()
+        if reject_counts:
+            print("%d rows rejected (%s)" %
+                  (sum(reject_counts.values()), ", ".join(
+                      "%s: %d" % (reason, count)
+                      for reason, count in reject_counts.items())),
+                  file=sys.stderr)
+
+        if arguments.rejects_file:
+            table.write_rejects(arguments.rejects_file)
+
+        # Only the grouped sentences and the token table are kept in memory
+        del table
+    else:
+        with profiling.timer("stage", "index"):
+            last_rows, rows = last_sentences(arguments.input_file)
+
+        if rows > len(last_rows):
+            print("%d sentences replaced by a later sentence of the same subject and variable" %
+                  (rows - len(last_rows)),
+                  file=sys.stderr)
+
+    def sentences():
+        if arguments.streaming:
+            return read_last_sentences(arguments.input_file, last_rows)
+
+        return ((subject, variable, sentence)
+                for subject, pairs in samples.items()
+                for variable, sentence in pairs.items())
+
+    # Incremental mode: Score only new or revised sentences and reuse the scores of the previous runs
+    if scoring_state is not None:
+        with profiling.timer("stage", "incremental"):
+            all_sentence_scores, statistics = score_incrementally(
+                sentences(),
+                component_weight_map,
+                arguments.language,
+                scoring_state,
+                fetch_engine,
+                word_cache,
+                frequency_index,
+                context_backend,
+                workers=arguments.workers,
+                lookup_sources={
+                    "word": arguments.frequency_index or "api",
+                    "context": arguments.context_counts or "scaleserp"
+                })
+
+        fetch_engine.close()
+
+        print("incremental: %d sentences scored, %d sentences with updated similarity scores, %d sentences reused" %
+              (statistics["scored"], statistics["updated"],
+               statistics["reused"]),
+              file=sys.stderr)
+    else:
+        # Optionally, compute the similarity scores of all sentences at once instead of building the vocabularies
+        similarity = None
+        if arguments.vectorized_similarity and (
+                Scores.PARTICIPANT_SIMILARITY in component_weight_map
+                or Scores.SENTENCE_SIMILARITY in component_weight_map):
+            from similarity_engine import similarity_scores
+
+            with profiling.timer("stage", "vectorized_similarity"):
+                similarity = similarity_scores(
+                    (subject, variable, token_table[sentence])
+                    for subject, variable, sentence in sentences())
+
+        with profiling.timer("stage", "collect"):
+            vocabulary, word_planner, context_planner = collect_statistics(
+                sentences(), component_weight_map,
+                build_vocabulary=similarity is None and cohort_statistics is None,
+                token_table=token_table)
+
+        # Optionally, score with the vocabularies and bounds of the whole cohort instead of the ones of the input file
+        if cohort_statistics is not None:
+            vocabulary = cohort_statistics
+
+        with profiling.timer("stage", "fetch"):
+            frequency_classes, context_classes = resolve_lookups(
+                word_planner, context_planner, arguments.language, fetch_engine,
+                word_cache, frequency_index, context_backend)
+
+        fetch_engine.close()
+
+        # Report how many requests were issued and how many were saved by deduplication
+        for score, planner in [(Scores.WORD_NOVELTY, word_planner),
+                               (Scores.CONTEXT_NOVELTY, context_planner)]:
+            if score in component_weight_map:
+                print("%s lookups: %d requested, %d saved by deduplication" %
+                      (score.name, planner.requested(), planner.saved()),
+                      file=sys.stderr)
+
+        all_sentence_scores = score_sentences(sentences(),
+                                              component_weight_map,
+                                              arguments.language,
+                                              frequency_classes,
+                                              context_classes,
+                                              vocabulary,
+                                              workers=arguments.workers,
+                                              similarity=similarity,
+                                              token_table=token_table)
+
+    for host, issued in fetch_engine.issued.items():
+        print("%s: %d requests issued, %d retried, %d failed" %
+              (host, issued, fetch_engine.retried.get(host, 0),
+               fetch_engine.failed.get(host, 0)),
+              file=sys.stderr)
+
+    # The scores of a sentence that are based on failed lookups
+    def degraded(subject, variable, sentence):
+        if scoring_state is not None:
+            return statistics["degraded"].get((subject, variable), [])
+
+        if token_table is not None:
+            stripped_sentence = token_table[sentence]
+        else:
+            stripped_sentence = strip_sentence(sentence)
+
+        return degraded_scores(stripped_sentence, component_weight_map,
+                               frequency_classes, context_classes)
+
+    degraded_counts = {}
+
+    # Columns of the output, only the selected creativity scores and the TOTAL_SCORE are written
+    output_scores = [
+        score for score in Scores
+        if score in score_weight_map or score == Scores.TOTAL_SCORE
+    ]
+
+    # Optionally, write the results to the output file
+    score_columns = [score.name for score in output_scores] + [
+        "%s_%s" % (Scores.TOTAL_SCORE.name, name) for name in weight_profiles
+    ]
+    header = ["subject", "variable", "sentence"] + score_columns + (
+        ["DEGRADED_SCORES"] if arguments.degraded_column else [])
+
+    score_writer = None
+    if arguments.output_file and arguments.output_format == "csv":
+        score_writer = ScoreWriter(arguments.output_file,
+                                   header,
+                                   mode=arguments.output_mode,
+                                   flush_interval=arguments.flush_interval)
+    elif arguments.output_file:
+        score_writer = ColumnarScoreWriter(
+            arguments.output_file,
+            header,
+            score_columns,
+            output_format=arguments.output_format,
+            mode=arguments.output_mode,
+            flush_interval=arguments.flush_interval)
+
+    # Print the header line, displays the title of each column for the following lines
+    colored_header = "\"subject\",\"variable\",\"sentence\""
+    for score in output_scores:
+        colored_header += ",%s" % (termcolor.colored(
+            "\"%s\"" % (score.name), score_color_map[score]))
+
+    for name in weight_profiles:
+        colored_header += ",%s" % (termcolor.colored(
+            "\"%s_%s\"" % (Scores.TOTAL_SCORE.name, name),
+            score_color_map[Scores.TOTAL_SCORE]))
+
+    if arguments.degraded_column:
+        colored_header += ",\"DEGRADED_SCORES\""
+
+    print(colored_header)
+
+    # Second pass: Determine creativity scores for all subjects and their variables
+    # The results are processed in chunks, so that the TOTAL_SCORE of every weight profile is derived from the
+    # component scores of a whole chunk at once
+    results = zip(sentences(), all_sentence_scores)
+    while True:
+        chunk = list(islice(results, 1024))
+        if not chunk:
+            break
+
+        chunk_profile_scores = repeat([])
+        if weight_profiles:
+            for _, sentence_scores in chunk:
+                sentence_scores[Scores.TOTAL_SCORE] = total_score(
+                    sentence_scores, score_weight_map)
+
+            chunk_profile_scores = profile_total_scores(
+                [sentence_scores for _, sentence_scores in chunk],
+                weight_profiles)
+
+        for ((subject, variable, sentence),
+             sentence_scores), profile_scores in zip(chunk,
+                                                     chunk_profile_scores):
 
-        # 1. Discard sentences that are not of length 4 (meaning sentences that do not contain exactly 4 words)
-        if len(stripped_sentence) != 4:
-            continue
-
-        # 2. Discard sentences that contain words which do not start with correct letter
-        # according to given variable (i.e. EKEL)
-        for word in stripped_sentence:
-            if word[0] not in line[1]:
-                continue
-
-        if line[0] not in samples:
-            samples[line[0]] = {}
-            scores[line[0]] = {}
-
-        samples[line[0]][line[1]] = line[2]
-        scores[line[0]][line[1]] = {}
-
-    subject_vocabulary = {}
-    variable_vocabulary = {}
-
-    for subject, pairs in samples.items():
-        if subject not in subject_vocabulary:
-            subject_vocabulary[subject] = {}
+            # Print the score line (in color for the console output)
+            colored_output = "\"%s\",\"%s\",\"%s\"" % (subject, variable,
+                                                       sentence)
 
-        for variable, sentence in pairs.items():
+            for score in output_scores:
+                colored_output += ",%s" % (termcolor.colored(
+                    sentence_scores[score], score_color_map[score]))
 
-            if variable not in variable_vocabulary:
-                variable_vocabulary[variable] = {}
+            for profile_score in profile_scores:
+                colored_output += ",%s" % (termcolor.colored(
+                    profile_score, score_color_map[Scores.TOTAL_SCORE]))
 
-            for word in sentence.strip(" ,;.:!?").lower().split():
-                if word not in subject_vocabulary[subject]:
-                    subject_vocabulary[subject][word] = 1
-                else:
-                    subject_vocabulary[subject][word] += 1
-
-                if word not in variable_vocabulary[variable]:
-                    variable_vocabulary[variable][word] = 1
-                else:
-                    variable_vocabulary[variable][word] += 1
-
-    # Calculate relative occurrences of words per variable or subject
-    for subject, pairs in subject_vocabulary.items():
-        for word, count in pairs.items():
-            subject_vocabulary[subject][word] /= len(
-                subject_vocabulary[subject])
-
-    for variable, pairs in variable_vocabulary.items():
-        for word, count in pairs.items():
-            variable_vocabulary[variable][word] /= len(
-                variable_vocabulary[variable])
-
-    max_subject_occurence = 0.0
-    min_subject_occurence = 1.0
-    for subject in subject_vocabulary.values():
-
-        if max(subject.values()) > max_subject_occurence:
-            max_subject_occurence = max(subject.values())
-
-        if min(subject.values()) < min_subject_occurence:
-            min_subject_occurence = min(subject.values())
-
-    max_variable_occurence = 0.0
-    min_variable_occurence = 1.0
-    for variable in variable_vocabulary.values():
-
-        if max(variable.values()) > max_variable_occurence:
-            max_variable_occurence = max(variable.values())
-
-        if min(variable.values()) < min_variable_occurence:
-            min_variable_occurence = min(variable.values())
-
-    # Determine creativity scores for all subjects and their variables
-    for subject_index, (subject, pairs) in enumerate(samples.items()):
-
-        for variable_index, (variable, sentence) in enumerate(pairs.items()):
-
-            # Eliminate special characters in the beginning or end
-            stripped_sentence = sentence.strip(" ,;.:!?").lower().split()
-
-            # Determine the WORD_NOVELTY score
-            if Scores.WORD_NOVELTY in score_weight_map:
-                score = 0
-
-                # Set desired WORD_NOVELTY API (default is DE)
-                word_novelty_api = WORD_NOVELTY_API_DE
-                if arguments.language == "EN":
-                    word_novelty_api = WORD_NOVELTY_API_EN
-
-                # Determine the novelty of each word
-                for word in stripped_sentence:
-                    lower_word = word.lower()
-                    lower_score = sys.maxsize
-                    lower_resp = requests.get(word_novelty_api + lower_word)
-
-                    # Process only successful request responses
-                    if lower_resp.status_code == 200:
-                        # The response from api.corpora.uni-leipzig.de contains the key `frequencyClass`
-                        # which classifies words based on how frequently they are used in the corpus
-                        lower_score = min(
-                            20,
-                            lower_resp.json()["frequencyClass"] + 1)
-
-                    upper_word = lower_word.capitalize()
-                    upper_score = sys.maxsize
-                    upper_resp = requests.get(word_novelty_api + upper_word)
-
-                    if upper_resp.status_code == 200:
-                        upper_score = min(
-                            20,
-                            upper_resp.json()["frequencyClass"] + 1)
-
-                    # Use the minimum score of both lowered and capitalized word
-                    word_score = min(lower_score, upper_score)
-
-                    if word_score != sys.maxsize:
-                        score += word_score
-
-                # Calculate the arithmetic mean over all individual word frequency scores
-                scores[subject][variable][Scores.WORD_NOVELTY] = int(
-                    round(score / 4))
-
-            # Determine the CONTEXT_NOVELTY score
-            if Scores.CONTEXT_NOVELTY in score_weight_map:
-                score = 0
-
-                # Set desired CONTEXT_NOVELTY API (default is DE)
-                context_novelty_api = CONTEXT_NOVELTY_API_DE
-                if arguments.language == "EN":
-                    context_novelty_api = CONTEXT_NOVELTY_API_EN
-
-                # Iterate over all possible pairs of words in the sentence
-                for first, second in pairwise(stripped_sentence):
-                    try:
-                        # Obtain the CONTEXT_NOVELTY from the scaleserp.com endpoint
-                        resp = requests.get(
-                            context_novelty_api("\"%s + %s\"" %
-                                                (first, second)))
-
-                        # Process only successful request responses
-                        if resp.status_code == 200:
-                            response_json = resp.json()
-
-                            # Determine the novelty score in the nested JSON response
-                            # There are two preconditions for successful respones:
-                            # 1) response_json["request_info"]["success"] == True
-                            # 2) response_json["search_information"]["total_results"] != None
-                            if response_json["request_info"][
-                                    "success"] == True:
-                                if "total_results" in response_json[
-                                        "search_information"]:
-                                    # Map the number of google search results N to a score in [0, 20]
-                                    # < 512 search results implies the best score of 20
-                                    score += novelty_class(
-                                        int(response_json["search_information"]
-                                            ["total_results"]), 20, 512)
-                                else:
-                                    # If there are 0 search results, the word is highly novel
-                                    score += 20
-                    except Exception:
-                        continue
-
-                # Perform the same CONTEXT_NOVELTY calculation for word pairs that do not appear consecutively
-                for indices in [[0, 2], [0, 3], [1, 3]]:
-                    try:
-                        resp = requests.get(
-                            context_novelty_api(
-                                "\"%s * %s\"" %
-                                (stripped_sentence[indices[0]],
-                                 stripped_sentence[indices[1]])))
-
-                        if resp.status_code == 200:
-                            response_json = resp.json()
-
-                            if response_json["request_info"][
-                                    "success"] == True:
-                                if "total_results" in response_json[
-                                        "search_information"]:
-                                    score += novelty_class(
-                                        int(response_json["search_information"]
-                                            ["total_results"]), 20, 512)
-                                else:
-                                    score += 20
-                    except Exception:
-                        continue
-
-                # Calculate the arithmetic mean over all individual word frequency scores
-                scores[subject][variable][Scores.CONTEXT_NOVELTY] = int(
-                    round(score / 6))
-
-            # Determine the PARTICIPANT_SIMILARITY score
-            if Scores.PARTICIPANT_SIMILARITY in score_weight_map:
-                score = 0
-                # Score is calculated based on how often the participant (subject) has used the same word
-                # These relative occurences of words per participant are given in the subject_vocabulary dictionary
-                for word in stripped_sentence:
-                    score += subject_vocabulary[subject][word]
-
-                # Calculate average score over all 4 words of a sentence, taking the minimum and maximum occurence
-                # across all participants into account
-                score = 1 - ((score/4) - min_subject_occurence) / \
-                    max(1, (max_subject_occurence - min_subject_occurence))
-                scores[subject][variable][Scores.PARTICIPANT_SIMILARITY] = int(
-                    round(score * 20))
-
-            # Determine the SENTENCE_SIMILARITY score
-            if Scores.SENTENCE_SIMILARITY in score_weight_map:
-                score = 0
-                # Score is calculated based on how often other participants have used the same word as a solution
-                # to this specific four-letter word puzzle (variable)
-                # These relative occurences of words per variable are given in the variable_vocabulary dictionary
-                for word in stripped_sentence:
-                    score += variable_vocabulary[variable][word]
-
-                # Calculate average score over all 4 words of a sentence, taking the minimum and maximum occurence
-                # across all sentences of a variable into account
-                score = 1 - ((score / 4) - min_variable_occurence) / \
-                    max(1, (max_variable_occurence - min_variable_occurence))
-                scores[subject][variable][Scores.SENTENCE_SIMILARITY] = int(
-                    round(score * 20))
-
-            # Determine RHYTHMIC_SCORE
-            if Scores.RHYTHMIC_SCORE in score_weight_map:
-                score = 0
-
-                phonetic_result = []
-                # Eliminate all special characters on the left and right sides
-                stripped_sentence = sentence.strip(" ,;.:!?").lower()
-
-                # Compute the phonetic word representations
-                if arguments.language == "DE":
-                    # In German based on `cologne_phonetics`
-                    # `encode` allows for passing the entire sentence
-                    phonetic_result = cologne_phonetics.encode(
-                        stripped_sentence)
-                elif arguments.language == "EN":
-                    # In German based on `phonetics`
-                    # `soundex` accepts only one word per call
-                    for word in stripped_sentence.split(" "):
-                        phonetic_result.append((word, phonetics.soundex(word)))
-
-                sounds_to_word_groups = {}
-
-                # Iterate over all phonetic word representations in pairs
-                for i in range(len(phonetic_result)):
-                    for j in range(i + 1, len(phonetic_result)):
-                        (word1, sound1) = phonetic_result[i]
-                        (word2, sound2) = phonetic_result[j]
-
-                        # Iterate over all characters in the shorter phonetic word representation
-                        for x in range(1, 1 + min(len(sound1), len(sound2))):
-
-                            # Consider identical sounds as rhymes but ignore identical words
-                            if ((sound1[-x:] == sound2[-x:])
-                                    and not (word1 == word2)):
-
-                                adj_word1 = word1
-                                adj_word2 = word2
-
-                                # For German, use d/t and s/z interchangeably
-                                if x > 1 and arguments.language == "DE":
-                                    if (adj_word1[-1:] == 'd'):
-                                        adj_word1 = adj_word1[:-1] + 't'
-                                    if (adj_word1[-1:] == 's'):
-                                        adj_word1 = adj_word1[:-1] + 'z'
-
-                                    if (adj_word2[-1:] == 'd'):
-                                        adj_word2 = adj_word2[:-1] + 't'
-                                    if (adj_word2[-1:] == 's'):
-                                        adj_word2 = adj_word2[:-1] + 'z'
-
-                                # Go to the next word representation if the next considered sound differs
-                                if not adj_word1[-(x + 1):] == adj_word2[-(
-                                        x + 1):]:
-                                    continue
-
-                                # Initialize word group if the sound is encountered for the first time
-                                if sound1[-x:] not in sounds_to_word_groups:
-                                    sounds_to_word_groups[sound1[-x:]] = set()
-
-                                # Update the sound-to-word-group mapping
-                                # sounds_to_word_groups maps a repeating sound to all the words that contain the sound
-                                sounds_to_word_groups[sound1[-x:]].add(word1)
-                                sounds_to_word_groups[sound1[-x:]].add(word2)
-                            else:
-                                break
-
-                word_groups_to_sounds = {}
-
-                # Freeze the word groups to make them hash-able and therefore usable as keys in the
-                # inverted map from word group --> sound
-                for sound, word_group in sounds_to_word_groups.items():
-                    sounds_to_word_groups[sound] = frozenset(word_group)
-
-                # Build inverted map from word group --> sound
-                # For every word group, choose the longest common sound
-                for sound, word_group in sounds_to_word_groups.items():
-                    if (not word_group
-                            in word_groups_to_sounds) or len(sound) > len(
-                                word_groups_to_sounds[word_group]):
-                        word_groups_to_sounds[word_group] = sound
-
-                # Map the word groups' sounds to a discrete scale from 0 to 20
-                # For each found rhyme, the score consists of two parts:
-                # 1) the length of the rhyme (similar to the number of syllables of a rhyme),
-                # and 2) the number of words that rhyme
-                for word_group, sound in word_groups_to_sounds.items():
-                    rhyme_length = len(sound)
-                    score += min(20, (rhyme_length * 5) - 5)
-                    num_words_in_rhyme = len(word_group)
-                    score += min(20, (num_words_in_rhyme - 1) * 5)
-
-                score = min(20, score)
-
-                scores[subject][variable][Scores.RHYTHMIC_SCORE] = int(
-                    round(score))
-
-            # Determine PHONETIC_SCORE
-            if Scores.PHONETIC_SCORE in score_weight_map:
-                score = 0
-
-                total_combinations = 0
-                levenstein_score = 0
-                substring_score = 0
-
-                # Iterate over the phonetic word representations in pairs
-                for i in range(len(phonetic_result)):
-                    for j in range(i + 1, len(phonetic_result)):
-                        total_combinations += 1
-
-                        (word1, sound1) = phonetic_result[i]
-                        (word2, sound2) = phonetic_result[j]
-
-                        # Compute the Levenshtein distance between the two representations
-                        levenstein_distance = pylcs.levenshtein_distance(
-                            sound1, sound2)
-                        # Compute the longest substring between the two representations
-                        longest_substr_len = pylcs.lcs2(sound1, sound2)
-
-                        # Normalize the Levenshtein distance score using the lenght of the longer representation
-                        levenstein_score += levenstein_distance / max(
-                            len(sound1), len(sound2))
-
-                        # Normalize the longest substring score using the lenght of the shorter representation
-                        substring_score += longest_substr_len / min(
-                            len(sound1), len(sound2))
-
-                # Map both partial phonetic scores to a scale from 0 to 20
-                score += 0.5 * ((1 -
-                                 (levenstein_score / total_combinations)) * 20)
-                score += 0.5 * ((substring_score / total_combinations) * 20)
-
-                scores[subject][variable][Scores.PHONETIC_SCORE] = int(
-                    round(score))
-
-            # Determine TOTAL_SCORE
-            regular_total_score = 0.0
-            bonus_total_score = 0.0
-
-            # Consider all scores and whether they are provide bonus points
-            for score, weight_and_bonus in score_weight_map.items():
-                weight, is_bonus = weight_and_bonus
-
-                # Accumulate the partial total scores
-                if is_bonus:
-                    bonus_total_score += weight * scores[subject][variable][
-                        score]
-                else:
-                    regular_total_score += weight * scores[subject][variable][
-                        score]
-
-            # Calculate the total score with a maximum of 20
-            scores[subject][variable][Scores.TOTAL_SCORE] = min(
-                20,
-                int(round(regular_total_score)) +
-                int(round(bonus_total_score)))
-
-            # Construct the CSV header rows
-            plain_header = ""
-            colored_header = ""
-
-            # Print the header line in the first iteration, displays the title of each column for the following lines
-            if subject_index == 0 and variable_index == 0:
-                plain_header = "\"subject\",\"variable\",\"sentence\""
-                colored_header = plain_header
-
-                for score in Scores:
-                    if score in score_weight_map or score == Scores.TOTAL_SCORE:
-                        plain_header += ",\"%s\"" % (score.name)
-                        colored_header += ",%s" % (termcolor.colored(
-                            "\"%s\"" % (score.name), score_color_map[score]))
-
-                plain_header += "\n"
-                colored_header += "\n"
+            degraded_sentence_scores = degraded(subject, variable, sentence)
+            for score in degraded_sentence_scores:
+                degraded_counts[score] = degraded_counts.get(score, 0) + 1
 
-            # Print the score line (in color for the console output)
-            plain_output = plain_header + "\"%s\",\"%s\",\"%s\"" % (
-                subject, variable, sentence)
-            colored_output = colored_header + "\"%s\",\"%s\",\"%s\"" % (
-                subject, variable, sentence)
-
-            for score in Scores:
-                if score in score_weight_map or score == Scores.TOTAL_SCORE:
-                    plain_output += ",%s" % (scores[subject][variable][score])
-                    colored_output += ",%s" % (termcolor.colored(
-                        scores[subject][variable][score],
-                        score_color_map[score]))
+            degraded_column = []
+            if arguments.degraded_column:
+                degraded_column = [
+                    ";".join(score.name for score in degraded_sentence_scores)
+                ]
+                colored_output += ",\"%s\"" % degraded_column[0]
 
             print(colored_output)
 
-            # Optionally, write the results to the output file
-            if arguments.output_file:
-                output_file = pathlib.Path(arguments.output_file).resolve()
-
-                with output_file.open("a") as f:
-                    f.write(plain_output + "\n")
+            if score_writer is not None:
+                with profiling.timer("stage", "output"):
+                    score_writer.write(
+                        [subject, variable, sentence] +
+                        [sentence_scores[score] for score in output_scores] +
+                        profile_scores + degraded_column)
+
+    if score_writer is not None:
+        score_writer.close()
+
+    # Report the scores that are based on failed lookups, failed lookups do not contribute to the scores
+    for score, count in degraded_counts.items():
+        print("%s: %d sentences with degraded scores due to failed lookups" %
+              (score.name, count),
+              file=sys.stderr)
+
+    # Report the hit rates of the memoized phonetic encodings and distances of this process
+    if arguments.workers <= 1:
+        for name, cache_info in phonetic_cache.phonetic_cache_info().items():
+            if cache_info.hits + cache_info.misses > 0:
+                print("phonetic %s: %d hits, %d misses (%.1f%% hit rate)" %
+                      (name, cache_info.hits, cache_info.misses,
+                       100.0 * cache_info.hits /
+                       (cache_info.hits + cache_info.misses)),
+                      file=sys.stderr)
+
+    if word_cache is not None:
+        print("WORD_NOVELTY cache: %d hits, %d misses" %
+              (word_cache.hits, word_cache.misses),
+              file=sys.stderr)
+        word_cache.close()
+
+    if frequency_index is not None:
+        frequency_index.close()
+
+    if context_backend is not None:
+        context_backend.close()
+
+    if cohort_statistics is not None:
+        cohort_statistics.close()
+
+    if scoring_state is not None:
+        scoring_state.close()
+
+    # Optionally, report the recorded profiling metrics
+    if arguments.profile:
+        report = profiling.report_json()
+        if arguments.profile_format == "prometheus":
+            report = profiling.report_prometheus()
+
+        if arguments.profile_file:
+            with open(arguments.profile_file, "w") as f:
+                f.write(report)
+        else:
+            print(report, file=sys.stderr)
@@ -0,0 +1,111 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import hashlib
+import json
+import threading
+import time
+
+
+# Deterministic pseudo-random number for a lookup, so that repeated runs see the same responses
+def stable_hash(text: str):
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body are sent separately, without TCP_NODELAY every keep-alive response waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.count(self.path)
+
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+        url = urlparse(self.path)
+
+        # Stand-in for api.corpora.uni-leipzig.de/ws/words/<corpus>/word/<word>
+        # Every third word is unknown to the corpus
+        if url.path.startswith("/ws/words/"):
+            word = unquote(url.path.rsplit("/", 1)[1])
+            value = stable_hash(word)
+
+            if value % 3 == 0:
+                return self.respond(404, {})
+
+            return self.respond(200, {
+                "word": word,
+                "frequencyClass": value % 25
+            })
+
+        # Stand-in for api.scaleserp.com/search, every seventh query has no results
+        if url.path == "/search":
+            query = parse_qs(url.query).get("q", [""])[0]
+            value = stable_hash(query)
+
+            if value % 7 == 0:
+                return self.respond(200, {
+                    "request_info": {
+                        "success": True
+                    },
+                    "search_information": {}
+                })
+
+            return self.respond(
+                200, {
+                    "request_info": {
+                        "success": True
+                    },
+                    "search_information": {
+                        "total_results": value % 2000000
+                    }
+                })
+
+        self.respond(404, {})
+
+    def respond(self, status: int, body: dict):
+        content = json.dumps(body).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+# Local stand-in for the WORD_NOVELTY and CONTEXT_NOVELTY APIs with a configurable latency per request
+class MockApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0):
+        super().__init__(("127.0.0.1", port), MockApiHandler)
+
+        # latency := seconds to wait before answering each request
+        self.latency = latency
+        self.requests = {"word_novelty": 0, "context_novelty": 0}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+    def count(self, path: str):
+        with self.lock:
+            if path.startswith("/ws/words/"):
+                self.requests["word_novelty"] += 1
+            elif path.startswith("/search"):
+                self.requests["context_novelty"] += 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
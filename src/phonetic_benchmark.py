@@ -0,0 +1,374 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from importlib import metadata
+
+import language_creativity
+import phonetic_cache
+
+from benchmark import BENCHMARK_SYLLABLES, BENCHMARK_VARIABLES
+
+# The phonetic libraries whose versions are recorded with the results, a change of them explains a regression
+PHONETIC_LIBRARIES = ["cologne_phonetics", "phonetics", "pylcs"]
+
+# Metrics for which a higher value is better, a lower value is better for all other metrics
+HIGHER_IS_BETTER = {"sentences_per_second"}
+
+
+# Generate a synthetic vocabulary of distinct words (starting with the letters of the benchmark variables) and
+# sentences of the given length drawn from it
+def generate_sentences(language: str, sentence_length: int,
+                       vocabulary_size: int, sentences: int, seed: int):
+    generator = random.Random(seed)
+
+    syllables = BENCHMARK_SYLLABLES[language]
+    letters = sorted(set("".join(BENCHMARK_VARIABLES[language])))
+
+    vocabulary = set()
+    while len(vocabulary) < vocabulary_size:
+        vocabulary.add(
+            generator.choice(letters).lower() + "".join(
+                generator.choice(syllables)
+                for _ in range(generator.randint(1, 4))))
+    vocabulary = sorted(vocabulary)
+
+    return vocabulary, [
+        " ".join(generator.choice(vocabulary)
+                 for _ in range(sentence_length)).capitalize()
+        for _ in range(sentences)
+    ]
+
+
+# Micro benchmark: the time per call of the phonetic engines without memoization in microseconds
+def measure_engines(language: str, vocabulary: list, pairs: int, seed: int):
+    generator = random.Random(seed)
+
+    start = time.perf_counter()
+    sounds = [
+        phonetic_cache.encode_word(language, word)[1] for word in vocabulary
+    ]
+    encode_seconds = time.perf_counter() - start
+
+    sound_pairs = [(generator.choice(sounds), generator.choice(sounds))
+                   for _ in range(pairs)]
+
+    start = time.perf_counter()
+    for sound1, sound2 in sound_pairs:
+        phonetic_cache.sound_distances(sound1, sound2)
+    distance_seconds = time.perf_counter() - start
+
+    return {
+        "encode_word_us": 1e6 * encode_seconds / len(vocabulary),
+        "sound_distances_us": 1e6 * distance_seconds / len(sound_pairs)
+    }
+
+
+# Macro benchmark: score all sentences like the scorer does, starting with empty phonetic caches of the given size
+# Returns the throughput, the latency percentiles per sentence and the mean time per step in microseconds
+def measure_scoring(language: str, sentences: list, phonetic_cache_size: int):
+    phonetic_cache.configure_phonetic_caches(phonetic_cache_size)
+
+    step_seconds = {
+        "phonetic_representation": 0.0,
+        "rhythmic_score": 0.0,
+        "phonetic_score": 0.0
+    }
+    latencies = []
+
+    for sentence in sentences:
+        start = time.perf_counter()
+        phonetic_result = language_creativity.phonetic_representation(
+            sentence, language)
+        encoded = time.perf_counter()
+        language_creativity.rhythmic_score(phonetic_result, language)
+        rhymed = time.perf_counter()
+        language_creativity.phonetic_score(phonetic_result)
+        end = time.perf_counter()
+
+        step_seconds["phonetic_representation"] += encoded - start
+        step_seconds["rhythmic_score"] += rhymed - encoded
+        step_seconds["phonetic_score"] += end - rhymed
+        latencies.append(end - start)
+
+    latencies.sort()
+
+    result = {
+        "sentences_per_second": len(sentences) / sum(latencies),
+        "sentence_p50_us": 1e6 * latencies[len(latencies) // 2],
+        "sentence_p95_us": 1e6 * latencies[int(0.95 * (len(latencies) - 1))]
+    }
+    for step, seconds in step_seconds.items():
+        result["%s_us" % step] = 1e6 * seconds / len(sentences)
+
+    return result
+
+
+def case_name(language: str, sentence_length: int, vocabulary_size: int):
+    return "%s words=%d vocabulary=%d" % (language, sentence_length,
+                                          vocabulary_size)
+
+
+# Run the micro and macro benchmarks of every combination of language, sentence length and vocabulary size
+# Every case is repeated and the median of each metric is reported, so that single outliers do not count
+def run_benchmarks(settings: dict):
+    results = {}
+
+    for language in settings["languages"]:
+        for sentence_length in settings["sentence_lengths"]:
+            for vocabulary_size in settings["vocabulary_sizes"]:
+                vocabulary, sentences = generate_sentences(
+                    language, sentence_length, vocabulary_size,
+                    settings["sentences"], settings["seed"])
+
+                # The first run loads the phonetic libraries and is not measured
+                measure_scoring(language, sentences[:10],
+                                settings["phonetic_cache_size"])
+
+                repeats = [{
+                    **measure_engines(language, vocabulary,
+                                      settings["sentences"], settings["seed"]),
+                    **measure_scoring(language, sentences,
+                                      settings["phonetic_cache_size"])
+                } for _ in range(settings["repeats"])]
+
+                name = case_name(language, sentence_length, vocabulary_size)
+                results[name] = {
+                    metric: statistics.median(
+                        repeat[metric] for repeat in repeats)
+                    for metric in repeats[0]
+                }
+
+                print("%s: %.0f sentences per second" %
+                      (name, results[name]["sentences_per_second"]),
+                      file=sys.stderr)
+
+    return results
+
+
+# The interpreter, machine and phonetic library versions the results were measured with
+def environment():
+    versions = {}
+    for library in PHONETIC_LIBRARIES:
+        try:
+            versions[library] = metadata.version(library)
+        except metadata.PackageNotFoundError:
+            versions[library] = None
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "libraries": versions
+    }
+
+
+# Compare the results with the ones of a baseline, a metric regresses if it is worse by more than threshold
+# (e.g., 0.2 for 20%), returns one row per case and metric with the relative change and whether it regressed
+def compare_results(baseline: dict, results: dict, threshold: float):
+    comparison = []
+
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            baseline_value = baseline.get(name, {}).get(metric)
+            if not baseline_value:
+                continue
+
+            change = value / baseline_value - 1
+            if metric in HIGHER_IS_BETTER:
+                regressed = value * (1 + threshold) < baseline_value
+            else:
+                regressed = change > threshold
+
+            comparison.append((name, metric, baseline_value, value, change,
+                               regressed))
+
+    return comparison
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="benchmark the RHYTHMIC_SCORE and PHONETIC_SCORE and compare them with a baseline",
+        formatter_class=lambda prog: argparse.RawTextHelpFormatter(
+            prog, max_help_position=120, width=99999))
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser(
+        "record", help="run the benchmarks and record the results as a baseline")
+    record_parser.add_argument("-b",
+                               "--baseline_file",
+                               metavar="BASELINE_FILE",
+                               help="the JSON file the settings and results are written to (e.g., phonetic_baseline.json)",
+                               action="store",
+                               type=str,
+                               required=True,
+                               dest="baseline_file")
+    record_parser.add_argument("-l",
+                               "--languages",
+                               metavar="LANGUAGE",
+                               help="the languages (e.g., DE EN)",
+                               nargs="+",
+                               type=str,
+                               default=["DE", "EN"],
+                               choices=["DE", "EN"],
+                               dest="languages")
+    record_parser.add_argument("--sentence_lengths",
+                               metavar="SENTENCE_LENGTH",
+                               help="the numbers of words per sentence, at least 2 (e.g., 4 8 16)",
+                               nargs="+",
+                               type=int,
+                               default=[4, 8, 16],
+                               dest="sentence_lengths")
+    record_parser.add_argument("--vocabulary_sizes",
+                               metavar="VOCABULARY_SIZE",
+                               help="the numbers of distinct words the sentences are drawn from (e.g., 100 10000)",
+                               nargs="+",
+                               type=int,
+                               default=[100, 10000],
+                               dest="vocabulary_sizes")
+    record_parser.add_argument("--sentences",
+                               metavar="SENTENCES",
+                               help="the number of sentences per case (e.g., 1000)",
+                               action="store",
+                               type=int,
+                               default=1000,
+                               dest="sentences")
+    record_parser.add_argument("--repeats",
+                               metavar="REPEATS",
+                               help="the number of runs per case, the median of each metric is recorded (e.g., 5)",
+                               action="store",
+                               type=int,
+                               default=5,
+                               dest="repeats")
+    record_parser.add_argument("--phonetic_cache_size",
+                               metavar="PHONETIC_CACHE_SIZE",
+                               help="the size of the phonetic caches of the scoring benchmark, 0 disables memoization (e.g., 100000)",
+                               action="store",
+                               type=int,
+                               default=100000,
+                               dest="phonetic_cache_size")
+    record_parser.add_argument("--seed",
+                               metavar="SEED",
+                               help="the seed of the synthetic sentences (e.g., 0)",
+                               action="store",
+                               type=int,
+                               default=0,
+                               dest="seed")
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="run the benchmarks of a baseline again and flag regressions")
+    compare_parser.add_argument("-b",
+                                "--baseline_file",
+                                metavar="BASELINE_FILE",
+                                help="the JSON file of a recorded baseline (e.g., phonetic_baseline.json)",
+                                action="store",
+                                type=str,
+                                required=True,
+                                dest="baseline_file")
+    compare_parser.add_argument("--threshold",
+                                metavar="THRESHOLD",
+                                help="the relative slowdown of a metric that counts as a regression (e.g., 0.2)",
+                                action="store",
+                                type=float,
+                                default=0.2,
+                                dest="threshold")
+    compare_parser.add_argument("--report_file",
+                                metavar="REPORT_FILE",
+                                help="the JSON file the results and the comparison are written to (e.g., phonetic_report.json)",
+                                action="store",
+                                type=str,
+                                default=None,
+                                dest="report_file")
+
+    arguments = parser.parse_args()
+
+    if arguments.command == "record":
+        # The PHONETIC_SCORE compares all pairs of words of a sentence
+        if min(arguments.sentence_lengths) < 2:
+            parser.error("--sentence_lengths must be at least 2")
+
+        if min(arguments.vocabulary_sizes) < 1:
+            parser.error("--vocabulary_sizes must be positive")
+
+        if arguments.sentences < 1 or arguments.repeats < 1:
+            parser.error("--sentences and --repeats must be positive")
+
+        settings = {
+            "languages": arguments.languages,
+            "sentence_lengths": arguments.sentence_lengths,
+            "vocabulary_sizes": arguments.vocabulary_sizes,
+            "sentences": arguments.sentences,
+            "repeats": arguments.repeats,
+            "phonetic_cache_size": arguments.phonetic_cache_size,
+            "seed": arguments.seed
+        }
+
+        results = run_benchmarks(settings)
+
+        with open(arguments.baseline_file, "w") as f:
+            json.dump(
+                {
+                    "settings": settings,
+                    "environment": environment(),
+                    "results": results
+                },
+                f,
+                indent=2)
+
+        print("%-32s %12s %12s %12s %12s" %
+              ("case", "sentences/s", "p50 us", "p95 us", "encode us"))
+        for name, metrics in results.items():
+            print("%-32s %12.0f %12.1f %12.1f %12.2f" %
+                  (name, metrics["sentences_per_second"],
+                   metrics["sentence_p50_us"], metrics["sentence_p95_us"],
+                   metrics["encode_word_us"]))
+    else:
+        with open(arguments.baseline_file) as f:
+            baseline = json.load(f)
+
+        # The results are only comparable if measured the same way
+        current_environment = environment()
+        if current_environment != baseline["environment"]:
+            print("warning: the baseline was recorded in another environment (%s)" %
+                  json.dumps(baseline["environment"]),
+                  file=sys.stderr)
+
+        results = run_benchmarks(baseline["settings"])
+        comparison = compare_results(baseline["results"], results,
+                                     arguments.threshold)
+
+        print("%-32s %-28s %12s %12s %8s" %
+              ("case", "metric", "baseline", "current", "change"))
+        for name, metric, baseline_value, value, change, regressed in comparison:
+            print("%-32s %-28s %12.2f %12.2f %+7.1f%%%s" %
+                  (name, metric, baseline_value, value, 100 * change,
+                   "  REGRESSION" if regressed else ""))
+
+        regressions = [row for row in comparison if row[5]]
+        print("%d of %d metrics regressed by more than %.0f%%" %
+              (len(regressions), len(comparison), 100 * arguments.threshold),
+              file=sys.stderr)
+
+        if arguments.report_file:
+            with open(arguments.report_file, "w") as f:
+                json.dump(
+                    {
+                        "environment": current_environment,
+                        "results": results,
+                        "regressions": [{
+                            "case": name,
+                            "metric": metric,
+                            "baseline": baseline_value,
+                            "current": value,
+                            "change": change
+                        } for name, metric, baseline_value, value, change, _ in
+                                        regressions]
+                    },
+                    f,
+                    indent=2)
+
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,50 @@
+import functools
+import profiling
+
+
+# Compute the phonetic representation of a single word as a pair of word and sound
+# The phonetic libraries are imported on first use, so that each run only loads the one of its language
+def encode_word(language: str, word: str):
+    with profiling.timer("phonetic", "encoding"):
+        if language == "DE":
+            import cologne_phonetics
+
+            # In German based on `cologne_phonetics`, which returns the sanitized word along with its sound
+            return cologne_phonetics.encode(word)[0]
+
+        import phonetics
+
+        # In English based on `phonetics`
+        return (word, phonetics.soundex(word))
+
+
+# Compute the Levenshtein distance and the longest common substring of two sounds
+def sound_distances(sound1: str, sound2: str):
+    with profiling.timer("phonetic", "distance"):
+        import pylcs
+
+        return pylcs.levenshtein_distance(sound1,
+                                          sound2), pylcs.lcs2(sound1, sound2)
+
+
+# Memoized versions of the functions above, the vocabulary of a cohort is small and very repetitive
+# Encodings are keyed by (language, word) and distances by (sound1, sound2)
+cached_encode_word = functools.lru_cache(maxsize=100000)(encode_word)
+cached_sound_distances = functools.lru_cache(maxsize=100000)(sound_distances)
+
+
+# Replace the memoized functions with ones of the given size (0 disables memoization)
+def configure_phonetic_caches(max_size: int):
+    global cached_encode_word, cached_sound_distances
+
+    cached_encode_word = functools.lru_cache(maxsize=max_size)(encode_word)
+    cached_sound_distances = functools.lru_cache(
+        maxsize=max_size)(sound_distances)
+
+
+# Report the hits and misses of the memoized functions
+def phonetic_cache_info():
+    return {
+        "encodings": cached_encode_word.cache_info(),
+        "distances": cached_sound_distances.cache_info()
+    }
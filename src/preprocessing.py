@@ -0,0 +1,121 @@
+import csv
+import gc
+from contextlib import contextmanager
+
+# The characters stripped from the beginning and end of a sentence, like by `strip_sentence`
+STRIP_CHARACTERS = " ,;.:!?"
+
+# The reasons for rejecting a row of the input file, in the order the rules are checked
+MISSING_COLUMNS = "missing_columns"
+WORD_COUNT = "word_count"
+FIRST_LETTER = "first_letter"
+
+
+# Pause the cyclic garbage collector while objects without reference cycles are created in bulk, otherwise
+# it repeatedly traverses the growing table
+@contextmanager
+def paused_garbage_collection():
+    enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# Pre-processing stage: Load the whole input file at once, split every sentence into words exactly once and
+# apply the validation rules to whole columns
+# `tokens` is the shared token table, it maps every valid sentence to its lowered words (like `strip_sentence`),
+# so that the vocabulary pass and the scores do not split the sentence again
+# The columns and words are kept in tuples of strings instead of lists, which the garbage collector does not need
+# to track
+class TokenTable:
+
+    def __init__(self, input_file: str):
+        with paused_garbage_collection():
+            self.build(input_file)
+
+    def build(self, input_file: str):
+        with open(input_file, "r") as f:
+            lines = csv.reader(f, delimiter=";")
+            self.header = next(lines)
+            rows = list(lines)
+
+        # Split all rows into columns at once, rows without a sentence are padded with empty columns
+        has_columns = [len(row) >= 3 for row in rows]
+        self.columns = list(
+            zip(*(row if complete else row + [""] * 3
+                  for row, complete in zip(rows, has_columns)))) or [(), (), ()]
+        self.subjects, self.variables, self.sentences = self.columns[:3]
+        del rows
+
+        words = [
+            tuple(sentence.strip(STRIP_CHARACTERS).lower().split())
+            for sentence in self.sentences
+        ]
+
+        # 1. Discard sentences that are not of length 4 (meaning sentences that do not contain exactly 4 words)
+        has_four_words = [len(sentence_words) == 4 for sentence_words in words]
+
+        # 2. Discard sentences that contain words which do not start with a letter of the given variable
+        # (i.e. EKEL), regardless of case (only checked for sentences of length 4)
+        letters = [variable.lower() for variable in self.variables]
+        has_first_letters = [
+            four_words and sentence_words[0][0] in variable_letters
+            and sentence_words[1][0] in variable_letters
+            and sentence_words[2][0] in variable_letters
+            and sentence_words[3][0] in variable_letters
+            for variable_letters, sentence_words, four_words in zip(
+                letters, words, has_four_words)
+        ]
+
+        # The reason each row is rejected for, or None for valid sentences
+        self.reasons = [
+            MISSING_COLUMNS if not complete else
+            WORD_COUNT if not four_words else
+            FIRST_LETTER if not first_letters else None
+            for complete, four_words, first_letters in zip(
+                has_columns, has_four_words, has_first_letters)
+        ]
+
+        self.tokens = {
+            sentence: sentence_words
+            for sentence, sentence_words, reason in zip(
+                self.sentences, words, self.reasons) if reason is None
+        }
+
+        # The rejected rows with their row number in the input file (without the header)
+        self.rejects = [(row_number + 1,
+                         [column[row_number] for column in self.columns], reason)
+                        for row_number, reason in enumerate(self.reasons)
+                        if reason is not None]
+
+    # Yield the subjects, variables and sentences of the valid rows in order, like `read_sentences`
+    def valid_sentences(self):
+        for subject, variable, sentence, reason in zip(self.subjects,
+                                                       self.variables,
+                                                       self.sentences,
+                                                       self.reasons):
+            if reason is None:
+                yield subject, variable, sentence
+
+    # Return the number of rejected rows per reason
+    def reject_counts(self):
+        counts = {}
+
+        for _, _, reason in self.rejects:
+            counts[reason] = counts.get(reason, 0) + 1
+
+        return counts
+
+    # Write the rejected rows with their row number and the reason they were rejected for
+    def write_rejects(self, rejects_file: str):
+        with open(rejects_file, "w", newline="") as f:
+            csv_writer = csv.writer(f, delimiter=";", quoting=csv.QUOTE_ALL)
+            csv_writer.writerow(["row"] + self.header[:len(self.columns)] +
+                                ["reason"])
+
+            for row_number, row, reason in self.rejects:
+                csv_writer.writerow([row_number] + row + [reason])
@@ -0,0 +1,132 @@
+from contextlib import contextmanager, nullcontext
+
+import bisect
+import json
+import threading
+import time
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = [
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0
+]
+
+# Recorded metrics per (kind, name), e.g. ("score", "WORD_NOVELTY") or ("endpoint", "api.scaleserp.com")
+# Each metric holds the call count, the total wall time and the (non-cumulative) bucket counts
+metrics = {}
+hooks = []
+enabled = False
+lock = threading.Lock()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+# Register a hook that is called as hook(kind, name, seconds) for every observation, so that an embedding
+# service can forward the measurements to its own metrics, registering a hook enables profiling
+def add_hook(hook):
+    hooks.append(hook)
+    enable()
+
+
+def observe(kind: str, name: str, seconds: float):
+    with lock:
+        metric = metrics.get((kind, name))
+        if metric is None:
+            metric = metrics[(kind, name)] = {
+                "count": 0,
+                "sum": 0.0,
+                "buckets": [0] * (len(BUCKETS) + 1)
+            }
+
+        metric["count"] += 1
+        metric["sum"] += seconds
+        metric["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    for hook in hooks:
+        hook(kind, name, seconds)
+
+
+@contextmanager
+def measure(kind: str, name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(kind, name, time.perf_counter() - start)
+
+
+# Measure the wall time of a block, without any bookkeeping unless profiling is enabled
+def timer(kind: str, name: str):
+    if not enabled:
+        return nullcontext()
+
+    return measure(kind, name)
+
+
+# Return and reset the metrics recorded so far (e.g., to send them from a worker process to its parent)
+def collect():
+    global metrics
+
+    with lock:
+        collected, metrics = metrics, {}
+
+    return collected
+
+
+# Add metrics collected in another process
+def merge(collected: dict):
+    with lock:
+        for key, other in collected.items():
+            metric = metrics.get(key)
+            if metric is None:
+                metrics[key] = other
+                continue
+
+            metric["count"] += other["count"]
+            metric["sum"] += other["sum"]
+            metric["buckets"] = [
+                count + other_count for count, other_count in zip(
+                    metric["buckets"], other["buckets"])
+            ]
+
+
+def report_json():
+    report = {}
+
+    for (kind, name), metric in sorted(metrics.items()):
+        report.setdefault(kind, {})[name] = {
+            "count": metric["count"],
+            "seconds": metric["sum"],
+            "histogram": {
+                str(bound): count
+                for bound, count in zip(BUCKETS + ["+Inf"], metric["buckets"])
+            }
+        }
+
+    return json.dumps(report, indent=2)
+
+
+# Report the metrics in the Prometheus text exposition format with cumulative buckets
+def report_prometheus():
+    lines = [
+        "# HELP language_creativity_seconds Wall time per stage, score and API endpoint",
+        "# TYPE language_creativity_seconds histogram"
+    ]
+
+    for (kind, name), metric in sorted(metrics.items()):
+        labels = "kind=\"%s\",name=\"%s\"" % (kind, name)
+
+        cumulative_count = 0
+        for bound, count in zip(BUCKETS + ["+Inf"], metric["buckets"]):
+            cumulative_count += count
+            lines.append("language_creativity_seconds_bucket{%s,le=\"%s\"} %d" %
+                         (labels, bound, cumulative_count))
+
+        lines.append("language_creativity_seconds_sum{%s} %f" %
+                     (labels, metric["sum"]))
+        lines.append("language_creativity_seconds_count{%s} %d" %
+                     (labels, metric["count"]))
+
+    return "\n".join(lines) + "\n"
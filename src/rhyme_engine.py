@@ -0,0 +1,68 @@
+# Trie of reversed phonetic word representations, every node is a sound suffix and holds the words whose
+# sound ends with it, so that the rhymes of a sentence (or of a whole cohort) are read directly from the
+# shared suffixes instead of comparing all pairs of words
+class RhymeTrie:
+
+    def __init__(self, language: str):
+        self.language = language
+
+        # A node is a pair of children (by preceding sound character) and the set of words below it
+        self.root = ({}, set())
+
+    def add(self, word: str, sound: str):
+        node = self.root
+
+        for character in reversed(sound):
+            child = node[0].get(character)
+            if child is None:
+                child = node[0][character] = ({}, set())
+
+            child[1].add(word)
+            node = child
+
+    # For German, use d/t and s/z interchangeably at the end of a word (for rhymes longer than one sound)
+    def normalize(self, word: str, rhyme_length: int):
+        if rhyme_length > 1 and self.language == "DE":
+            if word[-1:] == "d":
+                return word[:-1] + "t"
+            if word[-1:] == "s":
+                return word[:-1] + "z"
+
+        return word
+
+    # Return the map from each group of rhyming words to their longest common sound
+    # Words sharing a sound suffix of length x rhyme if they also share their last x + 1 (normalized) characters
+    def rhyme_groups(self):
+        word_groups_to_sounds = {}
+
+        # Depth-first, so that a deeper (longer) sound of the same word group replaces a shorter one
+        stack = [(child, character)
+                 for character, child in self.root[0].items()]
+        while stack:
+            (children, words), sound = stack.pop()
+
+            # A rhyme needs at least two different words, which no deeper node has either
+            if len(words) < 2:
+                continue
+
+            rhyme_length = len(sound)
+            words_by_ending = {}
+            for word in words:
+                words_by_ending.setdefault(
+                    self.normalize(word, rhyme_length)[-(rhyme_length + 1):],
+                    []).append(word)
+
+            word_group = frozenset(word
+                                   for ending_words in words_by_ending.values()
+                                   if len(ending_words) > 1
+                                   for word in ending_words)
+
+            if word_group and (word_group not in word_groups_to_sounds or
+                               rhyme_length > len(
+                                   word_groups_to_sounds[word_group])):
+                word_groups_to_sounds[word_group] = sound
+
+            stack.extend((child, character + sound)
+                         for character, child in children.items())
+
+        return word_groups_to_sounds
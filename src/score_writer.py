@@ -0,0 +1,147 @@
+import csv
+import os
+import pathlib
+import tempfile
+
+# The supported ways of opening the output file
+# truncate := overwrite an existing output file
+# append := append to an existing output file, the header is only written to an empty file
+# replace := write to a temporary file that atomically replaces the output file once all rows are written
+OUTPUT_MODES = ["truncate", "append", "replace"]
+
+
+# Writes score rows to a CSV file that is opened only once, strings are quoted and scores are not
+class ScoreWriter:
+
+    def __init__(self,
+                 output_file: str,
+                 header: list,
+                 mode: str = "truncate",
+                 flush_interval: int = 0):
+        # flush_interval := flush the written rows to disk after this many rows (0 means only on close)
+        self.output_file = pathlib.Path(output_file).resolve()
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self.rows = 0
+
+        if mode == "replace":
+            fd, self.temporary_file = tempfile.mkstemp(
+                dir=self.output_file.parent,
+                prefix=".%s." % self.output_file.name)
+            self.file = os.fdopen(fd, "w", newline="")
+        elif mode == "append":
+            self.file = self.output_file.open("a", newline="")
+        else:
+            self.file = self.output_file.open("w", newline="")
+
+        self.writer = csv.writer(self.file,
+                                 quoting=csv.QUOTE_NONNUMERIC,
+                                 lineterminator="\n")
+
+        if self.file.tell() == 0:
+            self.writer.writerow(header)
+
+    def write(self, row: list):
+        self.writer.writerow(row)
+        self.rows += 1
+
+        if self.flush_interval and self.rows % self.flush_interval == 0:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+        if self.mode == "replace":
+            os.chmod(self.temporary_file, 0o644)
+            os.replace(self.temporary_file, self.output_file)
+
+
+# The supported formats of the output file
+# csv := quoted CSV rows
+# parquet := Parquet file with min/max statistics per column and row group
+# arrow := Arrow IPC file, which can be read memory-mapped
+OUTPUT_FORMATS = ["csv", "parquet", "arrow"]
+
+
+# Writes score rows to a columnar (Parquet or Arrow IPC) file, requires pyarrow
+# The score columns are stored as uint8 (all scores are in [0, 20]) and the rows are written in row groups
+# (record batches) of flush_interval rows (65536 if 0)
+class ColumnarScoreWriter:
+
+    def __init__(self,
+                 output_file: str,
+                 header: list,
+                 score_columns: list,
+                 output_format: str = "parquet",
+                 mode: str = "truncate",
+                 flush_interval: int = 0):
+        import pyarrow
+
+        if mode == "append":
+            raise ValueError("%s output cannot be appended to" %
+                             output_format)
+
+        self.pyarrow = pyarrow
+        self.output_file = pathlib.Path(output_file).resolve()
+        self.mode = mode
+        self.header = header
+        self.row_group_size = flush_interval or 65536
+        self.columns = [[] for _ in header]
+        self.rows = 0
+
+        self.schema = pyarrow.schema([
+            (name,
+             pyarrow.uint8() if name in score_columns else pyarrow.string())
+            for name in header
+        ])
+
+        self.path = str(self.output_file)
+        if mode == "replace":
+            fd, self.temporary_file = tempfile.mkstemp(
+                dir=self.output_file.parent,
+                prefix=".%s." % self.output_file.name)
+            os.close(fd)
+            self.path = self.temporary_file
+
+        if output_format == "parquet":
+            import pyarrow.parquet
+
+            self.writer = pyarrow.parquet.ParquetWriter(self.path,
+                                                        self.schema,
+                                                        write_statistics=True)
+        else:
+            import pyarrow.ipc
+
+            self.writer = pyarrow.ipc.new_file(self.path, self.schema)
+
+    def write(self, row: list):
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        self.rows += 1
+
+        if self.rows % self.row_group_size == 0:
+            self.flush()
+
+    def flush(self):
+        if self.columns[0]:
+            self.writer.write_table(
+                self.pyarrow.table([
+                    self.pyarrow.array(column, type=field.type)
+                    for column, field in zip(self.columns, self.schema)
+                ],
+                                   schema=self.schema))
+
+            self.columns = [[] for _ in self.header]
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+        if self.mode == "replace":
+            os.chmod(self.temporary_file, 0o644)
+            os.replace(self.temporary_file, self.output_file)
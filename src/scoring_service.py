@@ -0,0 +1,510 @@
+import argparse
+import json
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import phonetic_cache
+import profiling
+
+from context_backend import ContextBackend, NgramCountStore
+from fetch_engine import FetchEngine, parse_rate_limits
+from frequency_index import FrequencyIndex
+from language_creativity import DEFAULT_SCORE_WEIGHT_MAP, collect_statistics, degraded_scores, is_valid_sentence, parse_creativity_scores, read_sentences, resolve_missing_lookups, score_sentence, strip_sentence
+from vocabulary import VocabularyStatistics
+from word_cache import FrequencyClassCache
+
+
+# Long-running scorer that keeps the resolved lookups, the phonetic caches and the cohort vocabularies warm
+# Concurrent submissions are combined into micro-batches of up to max_batch_size sentences, a batch is scored
+# once it is full or max_wait seconds after its first submission, so that their lookups are deduplicated and
+# resolved concurrently
+class ScoringService:
+
+    def __init__(self,
+                 score_weight_map: dict,
+                 language: str,
+                 fetch_engine: FetchEngine,
+                 word_cache: FrequencyClassCache = None,
+                 frequency_index: FrequencyIndex = None,
+                 context_backend: ContextBackend = None,
+                 max_batch_size: int = 64,
+                 max_wait: float = 0.002):
+        self.score_weight_map = score_weight_map
+        self.language = language
+        self.fetch_engine = fetch_engine
+        self.word_cache = word_cache
+        self.frequency_index = frequency_index
+        self.context_backend = context_backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        # All sentences seen so far by (subject, variable), the similarity scores are relative to their vocabularies
+        self.sentences = {}
+        self.vocabulary = VocabularyStatistics()
+
+        self.frequency_classes = {}
+        self.context_classes = {}
+
+        self.batches = 0
+        self.scored = 0
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    # Add the sentences of an existing cohort to the vocabularies without scoring them
+    def add_cohort(self, sentences):
+        for subject, variable, sentence in sentences:
+            if is_valid_sentence(variable, sentence):
+                self.add_sentence(subject, variable, sentence)
+
+        self.vocabulary.finalize()
+
+    def add_sentence(self, subject: str, variable: str, sentence: str):
+        previous_sentence = self.sentences.get((subject, variable))
+        if previous_sentence == sentence:
+            return False
+
+        # A revised sentence replaces the previous sentence of the participant for the same variable
+        if previous_sentence is not None:
+            self.vocabulary.remove(subject, variable,
+                                   strip_sentence(previous_sentence))
+
+        self.vocabulary.add(subject, variable, strip_sentence(sentence))
+        self.sentences[(subject, variable)] = sentence
+
+        return True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    # Submit (subject, variable, sentence) triples, the returned future resolves to the pairs of their scores and
+    # the scores based on failed lookups in order (None for sentences that are not valid solutions)
+    def submit(self, sentences: list):
+        future = Future()
+        self.queue.put((sentences, future))
+
+        return future
+
+    def run(self):
+        while True:
+            submission = self.queue.get()
+            if submission is None:
+                return
+
+            submissions = [submission]
+            size = len(submission[0])
+            deadline = time.perf_counter() + self.max_wait
+
+            # Collect further submissions until the batch is full or the first submission has waited long enough
+            while size < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+
+                try:
+                    submission = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+                if submission is None:
+                    self.queue.put(None)
+                    break
+
+                submissions.append(submission)
+                size += len(submission[0])
+
+            self.score_submissions(submissions)
+
+    def score_submissions(self, submissions: list):
+        try:
+            with profiling.timer("stage", "batch"):
+                batch_scores = self.score_batch([
+                    sentence for sentences, _ in submissions
+                    for sentence in sentences
+                ])
+        except Exception as e:
+            for _, future in submissions:
+                future.set_exception(e)
+
+            return
+
+        start = 0
+        for sentences, future in submissions:
+            future.set_result(batch_scores[start:start + len(sentences)])
+            start += len(sentences)
+
+    def score_batch(self, sentences: list):
+        valid_sentences = [(subject, variable, sentence)
+                           for subject, variable, sentence in sentences
+                           if is_valid_sentence(variable, sentence)]
+
+        # Update only the vocabularies of the subjects and variables with new or revised sentences
+        subjects = set()
+        variables = set()
+        for subject, variable, sentence in valid_sentences:
+            if self.add_sentence(subject, variable, sentence):
+                subjects.add(subject)
+                variables.add(variable)
+
+        self.vocabulary.finalize(subjects, variables)
+
+        # Resolve only the lookups that are not known from previous batches
+        _, word_planner, context_planner = collect_statistics(
+            valid_sentences, self.score_weight_map, build_vocabulary=False)
+
+        resolve_missing_lookups(word_planner, context_planner,
+                                self.frequency_classes, self.context_classes,
+                                self.language, self.fetch_engine,
+                                self.word_cache, self.frequency_index,
+                                self.context_backend)
+
+        self.batches += 1
+        self.scored += len(sentences)
+
+        return [(score_sentence(subject, variable, sentence,
+                                self.score_weight_map, self.language,
+                                self.frequency_classes, self.context_classes,
+                                self.vocabulary),
+                 degraded_scores(strip_sentence(sentence),
+                                 self.score_weight_map,
+                                 self.frequency_classes,
+                                 self.context_classes))
+                if is_valid_sentence(variable, sentence) else None
+                for subject, variable, sentence in sentences]
+
+    def statistics(self):
+        return {
+            "batches": self.batches,
+            "sentences": self.scored,
+            "subjects": len(self.vocabulary.subject_vocabulary),
+            "frequency_classes": len(self.frequency_classes),
+            "context_classes": len(self.context_classes)
+        }
+
+
+# POST /score with {"sentences": [{"subject": ..., "variable": ..., "sentence": ...}, ...]} returns
+# {"scores": [{"WORD_NOVELTY": ..., ..., "TOTAL_SCORE": ..., "DEGRADED_SCORES": [...]} or null, ...]}, where
+# DEGRADED_SCORES lists the scores based on failed lookups, GET /stats reports the service state
+class ScoringHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body are sent separately, without TCP_NODELAY every keep-alive response waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self.respond(200, self.server.service.statistics())
+
+        self.respond(404, {"error": "unknown path"})
+
+    def do_POST(self):
+        if self.path != "/score":
+            return self.respond(404, {"error": "unknown path"})
+
+        try:
+            request = json.loads(
+                self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            sentences = [(str(item["subject"]), str(item["variable"]),
+                          str(item["sentence"]))
+                         for item in request["sentences"]]
+        except (ValueError, KeyError, TypeError):
+            return self.respond(
+                400, {"error": "expected {\"sentences\": [{\"subject\", \"variable\", \"sentence\"}]}"})
+
+        try:
+            batch_scores = self.server.service.submit(sentences).result()
+        except Exception as e:
+            return self.respond(500, {"error": str(e)})
+
+        scores = []
+        for result in batch_scores:
+            if result is None:
+                scores.append(None)
+                continue
+
+            sentence_scores, degraded = result
+            scores.append({
+                score.name: value
+                for score, value in sentence_scores.items()
+            })
+            scores[-1]["DEGRADED_SCORES"] = [score.name for score in degraded]
+
+        self.respond(200, {"scores": scores})
+
+    def respond(self, status: int, body: dict):
+        content = json.dumps(body).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service: ScoringService, port: int = 0):
+        super().__init__(("127.0.0.1", port), ScoringHandler)
+        self.service = service
+
+
+class UnixScoringHandler(ScoringHandler):
+    # TCP_NODELAY does not apply to Unix domain sockets
+    disable_nagle_algorithm = False
+
+
+# The same HTTP interface on a Unix domain socket, e.g. for a web application on the same host
+class UnixScoringServer(socketserver.ThreadingMixIn,
+                        socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, service: ScoringService, path: str):
+        super().__init__(path, UnixScoringHandler)
+        self.service = service
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="serve language creativity scores over HTTP",
+        formatter_class=lambda prog: argparse.RawTextHelpFormatter(
+            prog, max_help_position=120, width=99999))
+
+    parser.add_argument("-p",
+                        "--port",
+                        metavar="PORT",
+                        help="the local port of the service (e.g., 8080)",
+                        action="store",
+                        type=int,
+                        default=8080,
+                        dest="port")
+    parser.add_argument("--socket",
+                        metavar="SOCKET",
+                        help="the Unix domain socket of the service instead of a port (e.g., /tmp/language_creativity.sock)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="socket")
+    parser.add_argument("-i",
+                        "--input_file",
+                        metavar="INPUT_FILE",
+                        help="the sentences of the cohort so far, only added to the vocabularies (e.g., data/de_sentences.csv)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="input_file")
+    parser.add_argument(
+        "-s",
+        "--creativity_scores",
+        metavar="CREATIVITY_SCORES",
+        help=
+        "the creativity scores with weightings (e.g., WORD_NOVELTY:0.6,CONTEXT_NOVELTY:0.4)",
+        action="store",
+        type=str,
+        default=None,
+        dest="creativity_scores")
+    parser.add_argument("-l",
+                        "--language",
+                        metavar="LANGUAGE",
+                        help="the language (e.g., DE)",
+                        action="store",
+                        type=str,
+                        default="DE",
+                        dest="language")
+    parser.add_argument("--max_batch_size",
+                        metavar="MAX_BATCH_SIZE",
+                        help="the maximum number of sentences scored together (e.g., 64)",
+                        action="store",
+                        type=int,
+                        default=64,
+                        dest="max_batch_size")
+    parser.add_argument("--max_wait",
+                        metavar="MAX_WAIT",
+                        help="the maximum time a submission waits for further submissions in milliseconds (e.g., 2)",
+                        action="store",
+                        type=float,
+                        default=2.0,
+                        dest="max_wait")
+    parser.add_argument("--cache_file",
+                        metavar="CACHE_FILE",
+                        help="the persistent cache file for WORD_NOVELTY lookups (e.g., data/word_cache.sqlite)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="cache_file")
+    parser.add_argument("--cache_ttl",
+                        metavar="CACHE_TTL",
+                        help="the time-to-live of cached WORD_NOVELTY lookups in days (e.g., 30)",
+                        action="store",
+                        type=float,
+                        default=None,
+                        dest="cache_ttl")
+    parser.add_argument("--cache_size",
+                        metavar="CACHE_SIZE",
+                        help="the maximum number of cached WORD_NOVELTY lookups (e.g., 1000000)",
+                        action="store",
+                        type=int,
+                        default=1000000,
+                        dest="cache_size")
+    parser.add_argument("--offline",
+                        help="answer WORD_NOVELTY lookups from the cache file only",
+                        action="store_true",
+                        dest="offline")
+    parser.add_argument("--frequency_index",
+                        metavar="FREQUENCY_INDEX",
+                        help="the local frequency class index that answers all WORD_NOVELTY lookups (e.g., data/deu_news_2012_1M.index)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="frequency_index")
+    parser.add_argument("--context_counts",
+                        metavar="CONTEXT_COUNTS",
+                        help="the local pair count store that answers all CONTEXT_NOVELTY lookups instead of scaleserp.com (e.g., data/deu_news_2012_1M.pairs)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="context_counts")
+    parser.add_argument("--context_upper_bound",
+                        metavar="CONTEXT_UPPER_BOUND",
+                        help="the number of occurrences in the pair count store up to which a word pair is most novel (e.g., 1)",
+                        action="store",
+                        type=int,
+                        default=1,
+                        dest="context_upper_bound")
+    parser.add_argument("--fetch_workers",
+                        metavar="FETCH_WORKERS",
+                        help="the number of concurrent WORD_NOVELTY and CONTEXT_NOVELTY lookups (e.g., 8)",
+                        action="store",
+                        type=int,
+                        default=8,
+                        dest="fetch_workers")
+    parser.add_argument("--rate_limits",
+                        metavar="RATE_LIMITS",
+                        help="the maximum requests per second per API host (e.g., api.scaleserp.com:5,api.corpora.uni-leipzig.de:20)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="rate_limits")
+    parser.add_argument("--timeout",
+                        metavar="TIMEOUT",
+                        help="the timeout of WORD_NOVELTY and CONTEXT_NOVELTY requests in seconds (e.g., 30)",
+                        action="store",
+                        type=float,
+                        default=30.0,
+                        dest="timeout")
+    parser.add_argument("--max_retries",
+                        metavar="MAX_RETRIES",
+                        help="the maximum number of retries of failed WORD_NOVELTY and CONTEXT_NOVELTY requests (e.g., 3)",
+                        action="store",
+                        type=int,
+                        default=3,
+                        dest="max_retries")
+    parser.add_argument("--phonetic_cache_size",
+                        metavar="PHONETIC_CACHE_SIZE",
+                        help="the maximum number of memoized phonetic encodings and distances (e.g., 100000)",
+                        action="store",
+                        type=int,
+                        default=100000,
+                        dest="phonetic_cache_size")
+
+    arguments = parser.parse_args()
+
+    if arguments.offline and not arguments.cache_file:
+        parser.error("--offline requires --cache_file")
+
+    if arguments.frequency_index and arguments.cache_file:
+        parser.error("--frequency_index cannot be combined with --cache_file")
+
+    score_weight_map = DEFAULT_SCORE_WEIGHT_MAP
+    if arguments.creativity_scores:
+        score_weight_map = parse_creativity_scores(arguments.creativity_scores)
+
+    phonetic_cache.configure_phonetic_caches(arguments.phonetic_cache_size)
+
+    # The lookup sources are shared by all batches and live as long as the service
+    word_cache = None
+    if arguments.cache_file:
+        word_cache = FrequencyClassCache(
+            arguments.cache_file,
+            ttl=arguments.cache_ttl * 86400
+            if arguments.cache_ttl is not None else None,
+            max_entries=arguments.cache_size,
+            offline=arguments.offline)
+
+    frequency_index = None
+    if arguments.frequency_index:
+        frequency_index = FrequencyIndex(arguments.frequency_index)
+
+    context_backend = None
+    if arguments.context_counts:
+        context_backend = NgramCountStore(
+            arguments.context_counts,
+            upper_bound=arguments.context_upper_bound)
+
+    fetch_engine = FetchEngine(
+        max_workers=arguments.fetch_workers,
+        host_rates=parse_rate_limits(arguments.rate_limits)
+        if arguments.rate_limits else None,
+        timeout=arguments.timeout,
+        max_retries=arguments.max_retries)
+
+    service = ScoringService(score_weight_map,
+                             arguments.language,
+                             fetch_engine,
+                             word_cache,
+                             frequency_index,
+                             context_backend,
+                             max_batch_size=arguments.max_batch_size,
+                             max_wait=arguments.max_wait / 1000)
+
+    if arguments.input_file:
+        service.add_cohort(read_sentences(arguments.input_file))
+
+    service.start()
+
+    if arguments.socket:
+        if os.path.exists(arguments.socket):
+            os.remove(arguments.socket)
+
+        server = UnixScoringServer(service, arguments.socket)
+        print("serving on %s" % arguments.socket, file=sys.stderr)
+    else:
+        server = ScoringServer(service, arguments.port)
+        print("serving on http://127.0.0.1:%d" % server.server_address[1],
+              file=sys.stderr)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    server.server_close()
+    service.stop()
+    fetch_engine.close()
+
+    if word_cache is not None:
+        word_cache.close()
+
+    if frequency_index is not None:
+        frequency_index.close()
+
+    if context_backend is not None:
+        context_backend.close()
+
+    if arguments.socket:
+        os.remove(arguments.socket)
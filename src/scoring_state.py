@@ -0,0 +1,115 @@
+import json
+
+from vocabulary import VocabularyStatistics
+
+
+# Persistent SQLite state of a scored cohort for incremental re-scoring
+# Holds the component scores of every sentence, the resolved WORD_NOVELTY and CONTEXT_NOVELTY lookups and the
+# word occurrences per subject and variable, so that a later run only scores new or revised sentences
+class ScoringState:
+
+    def __init__(self, path: str):
+        import sqlite3
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS settings ("
+                                "key TEXT PRIMARY KEY, "
+                                "value TEXT NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS sentences ("
+                                "subject TEXT NOT NULL, "
+                                "variable TEXT NOT NULL, "
+                                "sentence TEXT NOT NULL, "
+                                "scores TEXT NOT NULL, "
+                                "PRIMARY KEY (subject, variable))")
+        # A NULL class records an unknown word, failed lookups are not stored so that their sentences are retried
+        self.connection.execute("CREATE TABLE IF NOT EXISTS lookups ("
+                                "kind TEXT NOT NULL, "
+                                "key TEXT NOT NULL, "
+                                "class INTEGER, "
+                                "PRIMARY KEY (kind, key))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS vocabulary ("
+                                "kind TEXT NOT NULL, "
+                                "grp TEXT NOT NULL, "
+                                "word TEXT NOT NULL, "
+                                "count INTEGER NOT NULL, "
+                                "PRIMARY KEY (kind, grp, word))")
+        self.connection.commit()
+
+    def setting(self, key: str):
+        row = self.connection.execute(
+            "SELECT value FROM settings WHERE key = ?", (key, )).fetchone()
+
+        return row[0] if row is not None else None
+
+    # Return the previously scored sentences as a map from (subject, variable) to (sentence, scores by name)
+    def sentences(self):
+        return {(subject, variable): (sentence, json.loads(scores))
+                for subject, variable, sentence, scores in
+                self.connection.execute("SELECT * FROM sentences")}
+
+    # Return the resolved lookups of a kind (`word` or `context`) as a map from key to class
+    def lookups(self, kind: str):
+        return dict(
+            self.connection.execute(
+                "SELECT key, class FROM lookups WHERE kind = ?", (kind, )))
+
+    def vocabulary(self):
+        vocabulary = VocabularyStatistics()
+
+        for kind, group, word, count in self.connection.execute(
+                "SELECT * FROM vocabulary"):
+            words = vocabulary.subject_vocabulary if kind == "subject" else vocabulary.variable_vocabulary
+            words.setdefault(group, {})[word] = count
+
+        vocabulary.finalize()
+
+        return vocabulary
+
+    # Drop all sentences and vocabularies (e.g., when the selected creativity scores have changed)
+    def clear_sentences(self):
+        self.connection.execute("DELETE FROM sentences")
+        self.connection.execute("DELETE FROM vocabulary")
+
+    def clear_lookups(self):
+        self.connection.execute("DELETE FROM lookups")
+
+    # Store the settings, new lookups, (re)scored or removed sentences and the vocabularies of the given subjects
+    # and variables, all in one transaction
+    def save(self, settings: dict, lookups: dict, sentences: dict,
+             removed_sentences, vocabulary: VocabularyStatistics, subjects,
+             variables):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO settings VALUES (?, ?)",
+                settings.items())
+
+            for kind, classes in lookups.items():
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO lookups VALUES (?, ?, ?)",
+                    ((kind, key, value) for key, value in classes.items()))
+
+            self.connection.executemany(
+                "DELETE FROM sentences WHERE subject = ? AND variable = ?",
+                removed_sentences)
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO sentences VALUES (?, ?, ?, ?)",
+                ((subject, variable, sentence, json.dumps(scores))
+                 for (subject, variable), (sentence,
+                                           scores) in sentences.items()))
+
+            for kind, words, groups in [
+                ("subject", vocabulary.subject_vocabulary, subjects),
+                ("variable", vocabulary.variable_vocabulary, variables)
+            ]:
+                for group in groups:
+                    self.connection.execute(
+                        "DELETE FROM vocabulary WHERE kind = ? AND grp = ?",
+                        (kind, group))
+                    self.connection.executemany(
+                        "INSERT INTO vocabulary VALUES (?, ?, ?, ?)",
+                        ((kind, group, word, count)
+                         for word, count in words.get(group, {}).items()))
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,63 @@
+import numpy
+
+
+# Determine the PARTICIPANT_SIMILARITY or SENTENCE_SIMILARITY scores of all sentences at once
+# `groups` holds the subject or variable id of each sentence and `tokens` the four word ids of each sentence
+def group_similarity_scores(groups, tokens, num_words: int):
+    # Count the occurrences of each (group, word) pair
+    keys = (groups[:, None] * num_words + tokens).ravel()
+    unique_keys, inverse, counts = numpy.unique(keys,
+                                                return_inverse=True,
+                                                return_counts=True)
+
+    # The relative occurrence of a word is its number of occurrences divided by the size of the group's vocabulary
+    unique_groups = unique_keys // num_words
+    vocabulary_sizes = numpy.bincount(unique_groups)
+    relative_occurences = counts / vocabulary_sizes[unique_groups]
+
+    # Take the minimum and maximum relative occurrences across all groups into account
+    max_occurence = max(0.0, float(relative_occurences.max()))
+    min_occurence = min(1.0, float(relative_occurences.min()))
+
+    # Sum up the relative occurrences of the four words of each sentence in order
+    occurences = relative_occurences[inverse.reshape(tokens.shape)]
+    score = occurences[:, 0] + occurences[:, 1] + occurences[:, 2] + occurences[:, 3]
+
+    # Calculate average score over all 4 words of a sentence
+    score = 1 - ((score / 4) - min_occurence) / \
+        max(1, (max_occurence - min_occurence))
+
+    return numpy.round(score * 20).astype(numpy.int64).tolist()
+
+
+# Determine the PARTICIPANT_SIMILARITY and SENTENCE_SIMILARITY scores of a cohort with array operations
+# instead of per-sentence dictionary lookups, the words, subjects and variables are interned to integer ids
+# Returns the pair of both scores for each sentence in order
+def similarity_scores(sentences):
+    word_ids = {}
+    subject_ids = {}
+    variable_ids = {}
+
+    tokens = []
+    subjects = []
+    variables = []
+
+    for subject, variable, stripped_sentence in sentences:
+        subjects.append(subject_ids.setdefault(subject, len(subject_ids)))
+        variables.append(variable_ids.setdefault(variable, len(variable_ids)))
+        tokens.append([
+            word_ids.setdefault(word, len(word_ids))
+            for word in stripped_sentence
+        ])
+
+    if not tokens:
+        return []
+
+    tokens = numpy.array(tokens, dtype=numpy.int64)
+
+    return list(
+        zip(
+            group_similarity_scores(numpy.array(subjects, dtype=numpy.int64),
+                                    tokens, len(word_ids)),
+            group_similarity_scores(numpy.array(variables, dtype=numpy.int64),
+                                    tokens, len(word_ids))))
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark import generate_cohort
+
+# The directory of the scripts, which are run the way batch orchestrators call them
+SCRIPT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Dependencies whose import dominates the startup time, reported if a run loads them
+HEAVY_MODULES = [
+    "requests", "cologne_phonetics", "phonetics", "pylcs", "sqlite3",
+    "concurrent.futures.process", "numpy", "pandas", "pyarrow"
+]
+
+
+# Parse the output of `python -X importtime` into a map from module to its cumulative import time in seconds
+def parse_import_times(output: str):
+    import_times = {}
+
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            import_times[module.strip()] = int(cumulative) / 1e6
+
+    return import_times
+
+
+# Run a command `runs` times and measure its wall time, then once more with -X importtime to see which
+# modules it loads
+def measure_startup(command: list, runs: int):
+    timings = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command,
+                       cwd=SCRIPT_DIRECTORY,
+                       stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL,
+                       check=True)
+        timings.append(time.perf_counter() - start)
+
+    result = subprocess.run([command[0], "-X", "importtime"] + command[1:],
+                            cwd=SCRIPT_DIRECTORY,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE,
+                            text=True,
+                            check=True)
+    import_times = parse_import_times(result.stderr)
+
+    return {
+        "median_seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+        "modules": len(import_times),
+        "heavy_modules": {
+            module: import_times[module]
+            for module in HEAVY_MODULES if module in import_times
+        }
+    }
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="benchmark the startup time of the language creativity tools on tiny inputs",
+        formatter_class=lambda prog: argparse.RawTextHelpFormatter(
+            prog, max_help_position=120, width=99999))
+
+    parser.add_argument("--runs",
+                        metavar="RUNS",
+                        help="the number of runs per scenario (e.g., 10)",
+                        action="store",
+                        type=int,
+                        default=10,
+                        dest="runs")
+    parser.add_argument("--report_file",
+                        metavar="REPORT_FILE",
+                        help="the JSON file the benchmark results are written to (e.g., startup.json)",
+                        action="store",
+                        type=str,
+                        default=None,
+                        dest="report_file")
+
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_files = {}
+        for language in ["DE", "EN"]:
+            input_files[language] = os.path.join(directory,
+                                                 "%s.csv" % language.lower())
+            generate_cohort(input_files[language], language, 5, 2, 0.5)
+
+        # The scenarios need no network lookups, so that only the startup and a few sentences are measured
+        scenarios = {}
+        for language in ["DE", "EN"]:
+            scenarios["language_creativity %s phonetic scores" % language] = [
+                sys.executable, "language_creativity.py", "-i",
+                input_files[language], "-l", language, "-s",
+                "RHYTHMIC_SCORE:+0.5,PHONETIC_SCORE:+0.5"
+            ]
+
+        scores_file = os.path.join(directory, "scores.csv")
+        subprocess.run(scenarios["language_creativity EN phonetic scores"] +
+                       ["-o", scores_file],
+                       cwd=SCRIPT_DIRECTORY,
+                       stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL,
+                       check=True)
+
+        scenarios["histogram_generator"] = [
+            sys.executable, "histogram_generator.py", "-i", scores_file, "-o",
+            os.path.join(directory, "histogram.csv")
+        ]
+        scenarios["python"] = [sys.executable, "-c", "pass"]
+
+        report = {
+            name: measure_startup(command, arguments.runs)
+            for name, command in scenarios.items()
+        }
+
+    print("%-40s %10s %10s %8s  %s" %
+          ("scenario", "median ms", "min ms", "modules", "heavy modules (ms)"))
+    for name, result in report.items():
+        print("%-40s %10.1f %10.1f %8d  %s" %
+              (name, 1000 * result["median_seconds"],
+               1000 * result["min_seconds"], result["modules"], ", ".join(
+                   "%s %.1f" % (module, 1000 * seconds)
+                   for module, seconds in result["heavy_modules"].items())))
+
+    if arguments.report_file:
+        with open(arguments.report_file, "w") as f:
+            json.dump(report, f, indent=2)
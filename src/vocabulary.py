@@ -0,0 +1,99 @@
+# Word occurrences per subject (anonymous participant id) and per variable (given four letter word)
+# These are the cohort-wide statistics of the PARTICIPANT_SIMILARITY and SENTENCE_SIMILARITY scores
+class VocabularyStatistics:
+
+    def __init__(self):
+        # subject_vocabulary maps a subject to the number of occurrences of each of its words,
+        # variable_vocabulary does the same for all sentences of a variable
+        self.subject_vocabulary = {}
+        self.variable_vocabulary = {}
+
+        # The maximum and minimum relative occurrences of each subject and variable
+        self.subject_bounds = {}
+        self.variable_bounds = {}
+
+        self.max_subject_occurence = 0.0
+        self.min_subject_occurence = 1.0
+        self.max_variable_occurence = 0.0
+        self.min_variable_occurence = 1.0
+
+    def add(self, subject: str, variable: str, stripped_sentence: list):
+        if subject not in self.subject_vocabulary:
+            self.subject_vocabulary[subject] = {}
+
+        if variable not in self.variable_vocabulary:
+            self.variable_vocabulary[variable] = {}
+
+        subject_words = self.subject_vocabulary[subject]
+        variable_words = self.variable_vocabulary[variable]
+
+        for word in stripped_sentence:
+            subject_words[word] = subject_words.get(word, 0) + 1
+            variable_words[word] = variable_words.get(word, 0) + 1
+
+    # Take back a sentence that was added before (e.g., because a participant revised it)
+    def remove(self, subject: str, variable: str, stripped_sentence: list):
+        for vocabulary, group in [(self.subject_vocabulary, subject),
+                                  (self.variable_vocabulary, variable)]:
+            words = vocabulary[group]
+
+            for word in stripped_sentence:
+                words[word] -= 1
+                if words[word] == 0:
+                    del words[word]
+
+            if not words:
+                del vocabulary[group]
+
+    # Add the word occurrences of other statistics (e.g., of another shard of the cohort), the occurrences are
+    # additive, so that merging the statistics of all shards yields the statistics of the whole cohort
+    # Like after `add`, `finalize` must be called once all statistics have been merged
+    def merge(self, other):
+        for vocabulary, other_vocabulary in [
+            (self.subject_vocabulary, other.subject_vocabulary),
+            (self.variable_vocabulary, other.variable_vocabulary)
+        ]:
+            for group, other_words in other_vocabulary.items():
+                words = vocabulary.setdefault(group, {})
+
+                for word, count in other_words.items():
+                    words[word] = words.get(word, 0) + count
+
+    # Determine the minimum and maximum relative occurrences of words across all subjects and variables
+    # Must be called once all sentences have been added, after incremental updates only the bounds of the
+    # given (added to or removed from) subjects and variables are recomputed
+    def finalize(self, subjects=None, variables=None):
+        for vocabulary, bounds, groups in [
+            (self.subject_vocabulary, self.subject_bounds, subjects),
+            (self.variable_vocabulary, self.variable_bounds, variables)
+        ]:
+            if groups is None:
+                bounds.clear()
+                groups = vocabulary.keys()
+
+            for group in groups:
+                words = vocabulary.get(group)
+
+                if words:
+                    bounds[group] = (max(words.values()) / len(words),
+                                     min(words.values()) / len(words))
+                else:
+                    bounds.pop(group, None)
+
+        self.max_subject_occurence = max(
+            [0.0] + [bound[0] for bound in self.subject_bounds.values()])
+        self.min_subject_occurence = min(
+            [1.0] + [bound[1] for bound in self.subject_bounds.values()])
+
+        self.max_variable_occurence = max(
+            [0.0] + [bound[0] for bound in self.variable_bounds.values()])
+        self.min_variable_occurence = min(
+            [1.0] + [bound[1] for bound in self.variable_bounds.values()])
+
+
+# The relative occurrence of a word is its number of occurrences divided by the size of the vocabulary,
+# words that are not in the vocabulary (e.g., of a subject the cohort-wide statistics have not seen) occur 0 times
+def relative_occurence(words: dict, word: str):
+    count = words.get(word, 0)
+
+    return count / len(words) if count else 0.0
@@ -0,0 +1,46 @@
+import numpy
+
+
+# Parse named weight profiles (e.g., novelty=WORD_NOVELTY:0.5,CONTEXT_NOVELTY:0.5) into a map from name to
+# creativity scores with weightings, `parse_creativity_scores` parses the weightings of a single profile
+def parse_weight_profiles(weight_profiles: list, parse_creativity_scores):
+    profiles = {}
+
+    for weight_profile in weight_profiles:
+        name, _, creativity_scores = weight_profile.partition("=")
+        profiles[name] = parse_creativity_scores(creativity_scores)
+
+    return profiles
+
+
+# Determine the TOTAL_SCORE of every weight profile for a chunk of sentences at once
+# `component_scores` holds one map from score to component score per sentence, the result holds the total score
+# of each profile (in order) per sentence
+# The weighted scores are accumulated in the same order as by `total_score`, so that the rounding is identical
+def profile_total_scores(component_scores: list, weight_profiles: dict):
+    columns = {}
+    totals = []
+
+    for profile in weight_profiles.values():
+        regular_total_scores = numpy.zeros(len(component_scores))
+        bonus_total_scores = numpy.zeros(len(component_scores))
+
+        for score, (weight, is_bonus) in profile.items():
+            if score not in columns:
+                columns[score] = numpy.array(
+                    [sentence_scores[score] for sentence_scores in component_scores],
+                    dtype=numpy.float64)
+
+            if is_bonus:
+                bonus_total_scores += weight * columns[score]
+            else:
+                regular_total_scores += weight * columns[score]
+
+        # Calculate the total score with a maximum of 20
+        totals.append(
+            numpy.minimum(
+                20,
+                numpy.round(regular_total_scores) +
+                numpy.round(bonus_total_scores)).astype(numpy.int64))
+
+    return numpy.stack(totals, axis=1).tolist()
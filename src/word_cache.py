@@ -0,0 +1,125 @@
+import time
+
+from fetch_engine import FAILED
+
+# Marks a lookup that could not be answered from the cache
+MISS = object()
+
+
+# Persistent SQLite cache for the `frequencyClass` values of the WORD_NOVELTY endpoint
+# Entries are keyed by (corpus, surface form), a NULL frequency class records a known miss (non-200 response)
+class FrequencyClassCache:
+
+    def __init__(self,
+                 path: str,
+                 ttl: float = None,
+                 max_entries: int = 1000000,
+                 offline: bool = False):
+        # ttl := maximum age of an entry in seconds (None means entries never expire)
+        # max_entries := size cap, the least recently used entries are evicted first
+        # offline := answer lookups from the cache only and never fetch, expired entries are still answered
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.offline = offline
+
+        self.hits = 0
+        self.misses = 0
+
+        # The cache may be created by one thread and used by another (e.g., the batch thread of the scoring
+        # service), but it is never used by several threads at once
+        import sqlite3
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS frequency_classes ("
+                                "corpus TEXT NOT NULL, "
+                                "word TEXT NOT NULL, "
+                                "frequency_class INTEGER, "
+                                "fetched_at REAL NOT NULL, "
+                                "accessed_at REAL NOT NULL, "
+                                "PRIMARY KEY (corpus, word))")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS frequency_classes_accessed_at "
+            "ON frequency_classes (accessed_at)")
+        self.connection.commit()
+
+        self.size = self.connection.execute(
+            "SELECT COUNT(*) FROM frequency_classes").fetchone()[0]
+
+    # Return the cached frequency class (None for a known miss) or MISS if the key is absent or expired
+    # In offline mode, expired entries cannot be fetched again and are returned like fresh ones
+    def lookup(self, corpus: str, word: str):
+        row = self.connection.execute(
+            "SELECT frequency_class, fetched_at FROM frequency_classes "
+            "WHERE corpus = ? AND word = ?", (corpus, word)).fetchone()
+
+        now = time.time()
+
+        if row is None or (self.ttl is not None and not self.offline
+                           and now - row[1] > self.ttl):
+            self.misses += 1
+            return MISS
+
+        self.hits += 1
+
+        # Refresh the access time for the LRU eviction
+        self.connection.execute(
+            "UPDATE frequency_classes SET accessed_at = ? "
+            "WHERE corpus = ? AND word = ?", (now, corpus, word))
+
+        return row[0]
+
+    # Store a frequency class (or None for a known miss) and evict the least recently used entries
+    def store(self, corpus: str, word: str, frequency_class):
+        now = time.time()
+
+        exists = self.connection.execute(
+            "SELECT 1 FROM frequency_classes WHERE corpus = ? AND word = ?",
+            (corpus, word)).fetchone()
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO frequency_classes VALUES (?, ?, ?, ?, ?)",
+            (corpus, word, frequency_class, now, now))
+
+        if not exists:
+            self.size += 1
+
+        if self.size > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM frequency_classes WHERE rowid IN ("
+                "SELECT rowid FROM frequency_classes ORDER BY accessed_at LIMIT ?)",
+                (self.size - self.max_entries, ))
+            self.size = self.max_entries
+
+        self.connection.commit()
+
+    # Resolve lookups through the cache, calling `fetch_many(words)` only for the missing words
+    # `fetch_many` returns a mapping from word to frequency class (None if the endpoint does not know the word,
+    # FAILED if the lookup failed)
+    def get_many(self, corpus: str, words, fetch_many):
+        frequency_classes = {}
+        missing_words = []
+
+        for word in words:
+            frequency_class = self.lookup(corpus, word)
+
+            if frequency_class is not MISS:
+                frequency_classes[word] = frequency_class
+            elif self.offline:
+                # In offline mode, unknown words are treated like known misses but are not recorded
+                frequency_classes[word] = None
+            else:
+                missing_words.append(word)
+
+        if missing_words:
+            for word, frequency_class in fetch_many(missing_words).items():
+                # Failed lookups are not cached, so that they are retried in the next run
+                if frequency_class is not FAILED:
+                    self.store(corpus, word, frequency_class)
+
+                frequency_classes[word] = frequency_class
+
+        return frequency_classes
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import language_creativity
+from context_backend import ContextBackend
+from fetch_engine import FetchEngine
+from language_creativity import Scores
+from scoring_state import ScoringState
+
+COHORT = [("AAAAA", "ERDE", "Rosen erfrischen die Einwohner"),
+          ("BBBBB", "ERDE", "Eulen rufen dem Echo")]
+
+
+# Answers every CONTEXT_NOVELTY query with the same class
+class FixedContextBackend(ContextBackend):
+
+    def __init__(self, novelty_class: int):
+        self.novelty_class = novelty_class
+
+    def resolve(self, queries):
+        return {query: self.novelty_class for query in queries}
+
+
+# A changed lookup source must score the stored sentences again instead of reusing their scores
+class LookupSourceTest(unittest.TestCase):
+
+    def score(self, state_file, novelty_class):
+        scoring_state = ScoringState(state_file)
+        fetch_engine = FetchEngine()
+
+        try:
+            return language_creativity.score_incrementally(
+                COHORT,
+                language_creativity.parse_creativity_scores(
+                    "CONTEXT_NOVELTY:1"),
+                "DE",
+                scoring_state,
+                fetch_engine,
+                context_backend=FixedContextBackend(novelty_class),
+                lookup_sources={
+                    "word": "api",
+                    "context": "counts-%d" % novelty_class
+                })
+        finally:
+            fetch_engine.close()
+            scoring_state.close()
+
+    def test_switched_context_source(self):
+        with tempfile.TemporaryDirectory() as directory:
+            state_file = os.path.join(directory, "state.sqlite")
+
+            scores, statistics = self.score(state_file, 5)
+            self.assertEqual([s[Scores.CONTEXT_NOVELTY] for s in scores],
+                             [5, 5])
+
+            # The same source reuses the stored scores
+            scores, statistics = self.score(state_file, 5)
+            self.assertEqual(statistics["reused"], len(COHORT))
+
+            scores, statistics = self.score(state_file, 18)
+            self.assertEqual(statistics["scored"], len(COHORT))
+            self.assertEqual([s[Scores.CONTEXT_NOVELTY] for s in scores],
+                             [18, 18])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import language_creativity
+from cohort_statistics import CohortStatistics, write_statistics
+from language_creativity import Scores
+
+SIMILARITY_SCORES = "PARTICIPANT_SIMILARITY:0.5,SENTENCE_SIMILARITY:0.5"
+
+COHORT = [("AAAAA", "ERDE", "Rosen erfrischen die Einwohner"),
+          ("AAAAA", "ERDE", "Elche rennen durch Eis"),
+          ("BBBBB", "ERDE", "Eulen rufen dem Echo")]
+
+
+# Scoring against cohort-wide statistics must not fail for subjects and words the cohort has not seen
+class UnseenVocabularyTest(unittest.TestCase):
+
+    def setUp(self):
+        score_weight_map = language_creativity.parse_creativity_scores(
+            SIMILARITY_SCORES)
+        self.vocabulary = language_creativity.collect_statistics(
+            COHORT, score_weight_map)[0]
+
+    def score(self, subject, variable, sentence, vocabulary):
+        return language_creativity.score_one(subject,
+                                             variable,
+                                             sentence,
+                                             SIMILARITY_SCORES,
+                                             vocabulary=vocabulary)
+
+    def assert_unseen_scores(self, vocabulary):
+        # Unseen words are the most novel ones
+        scores = self.score("ZZZZZ", "EDEL", "Dicke Enten lachen erneut",
+                            vocabulary)
+        self.assertEqual(scores[Scores.PARTICIPANT_SIMILARITY], 20)
+        self.assertEqual(scores[Scores.SENTENCE_SIMILARITY], 20)
+
+        # Known subjects with unseen words score at least as high as with seen words
+        unseen = self.score("AAAAA", "ERDE", "Rote Enten dösen erneut",
+                            vocabulary)
+        seen = self.score("AAAAA", "ERDE", "Rosen erfrischen die Einwohner",
+                          vocabulary)
+        for score in [Scores.PARTICIPANT_SIMILARITY, Scores.SENTENCE_SIMILARITY]:
+            self.assertGreaterEqual(unseen[score], seen[score])
+            self.assertLessEqual(unseen[score], 20)
+
+    def test_vocabulary_statistics(self):
+        self.assert_unseen_scores(self.vocabulary)
+
+    def test_cohort_statistics(self):
+        with tempfile.TemporaryDirectory() as directory:
+            statistics_file = os.path.join(directory, "cohort.statistics")
+            write_statistics(self.vocabulary, statistics_file)
+
+            statistics = CohortStatistics(statistics_file)
+            try:
+                self.assert_unseen_scores(statistics)
+            finally:
+                statistics.close()
+
+
+if __name__ == "__main__":
+    unittest.main()